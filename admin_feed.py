@@ -0,0 +1,75 @@
+"""
+Zdarzenia na żywo dla paneli administratora (WebSocket /ws/admin).
+
+Zdarzenia pochodzą z pętli gry i endpointów admina, a nie z zapytań do bazy:
+- spin: wynik rundy z podsumowaniem rozliczenia (zakłady, stawki, wypłaty),
+- balance / balances: zmiana salda przez admina (pojedyncza / paczka),
+- players: liczba graczy połączonych ze stołami - każdy proces wysyła
+  własną co PLAYERS_INTERVAL sekund, panel sumuje je po pid.
+Zdarzenie trafia przez coordinator do wszystkich procesów, a każdy proces
+rozsyła je swoim panelom przez ConnectionManager. Kolejny otwarty panel to
+tylko kolejna kolejka w pamięci, bez dodatkowych zapytań do bazy.
+"""
+import asyncio
+import os
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+from cluster import coordinator
+from connection_manager import ConnectionManager
+from frames import encode_frame, now_ms
+from stats import spin_stats
+
+# Liczba ostatnich wyników wysyłanych nowemu panelowi
+RECENT_SPINS = 50
+# Co ile sekund proces wysyła liczbę połączonych graczy
+PLAYERS_INTERVAL = 5.0
+
+
+class AdminFeed:
+    """Rozsyłanie zdarzeń do paneli administratora podłączonych do procesu"""
+    def __init__(self):
+        self.manager = ConnectionManager()
+        self.recent: Deque[dict] = deque(maxlen=RECENT_SPINS)
+        self.players: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def publish(self, event_type: str, **fields):
+        """
+        Wysyła zdarzenie do paneli we wszystkich procesach.
+        Można wywołać z wątku puli (synchroniczne endpointy).
+        """
+        coordinator.publish_admin({"type": event_type, "time": now_ms(), **fields})
+
+    async def dispatch(self, event: dict):
+        """Zdarzenie odebrane od coordinatora - do paneli tego procesu"""
+        if event["type"] == "spin":
+            self.recent.append(event)
+        if self.manager.active_connections:
+            await self.manager.broadcast_frame(encode_frame(event))
+
+    def snapshot(self) -> str:
+        """Ramka startowa nowego panelu: ostatnie wyniki i liczniki z pamięci"""
+        return encode_frame({
+            "type": "init",
+            "pid": os.getpid(),
+            "players": self.players,
+            "recent": list(self.recent),
+            "total_spins": spin_stats.total,
+            "statistics": spin_stats.colors,
+        })
+
+    def start(self, count_players: Callable[[], Dict[str, int]]):
+        """Uruchamia okresowe wysyłanie liczby graczy tego procesu"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._report_players(count_players))
+
+    async def _report_players(self, count_players: Callable[[], Dict[str, int]]):
+        pid = os.getpid()
+        while True:
+            self.players = count_players()
+            self.publish("players", pid=pid, tables=self.players)
+            await asyncio.sleep(PLAYERS_INTERVAL)
+
+
+admin_feed = AdminFeed()
@@ -0,0 +1,68 @@
+"""
+Kontrola przyjmowania połączeń WebSocket do stołów.
+
+Po restarcie serwera wszyscy klienci łączą się naraz, a każde połączenie to
+ramka startowa i praca dla bazy. Proces przyjmuje więc najwyżej
+ACCEPT_RATE połączeń na sekundę (chwilowo ACCEPT_BURST) i najwyżej
+MAX_CONNECTIONS jednocześnie. Odrzucony klient dostaje zamknięcie 1013
+z powodem "retry=<ms>" - czasem, po którym ma spróbować ponownie.
+Czasy są losowane z okna, które rośnie z liczbą odesłanych klientów,
+więc ponowne połączenia rozkładają się w tempie, w jakim serwer je przyjmie.
+"""
+import os
+import random
+import time
+from typing import Callable, Optional
+
+from intake import RateLimiter
+from metrics import WS_REJECTED
+
+MAX_CONNECTIONS = int(os.getenv("ROULETTE_MAX_CONNECTIONS", "10000"))
+ACCEPT_RATE = float(os.getenv("ROULETTE_ACCEPT_RATE", "500"))
+ACCEPT_BURST = float(os.getenv("ROULETTE_ACCEPT_BURST", "1000"))
+
+# Najkrótsza sugerowana przerwa przed ponowieniem (sekundy)
+MIN_RETRY = 1.0
+# Przerwa, gdy serwer ma komplet połączeń (losowana z tego zakresu)
+FULL_RETRY = (10.0, 30.0)
+
+# Kod zamknięcia WebSocket "Try Again Later"
+RETRY_CLOSE_CODE = 1013
+
+_REJECTED_FULL = WS_REJECTED.labels("full")
+_REJECTED_RATE = WS_REJECTED.labels("rate")
+
+
+class AdmissionControl:
+    """Decyzja o przyjęciu połączenia; używana tylko z pętli asyncio"""
+    def __init__(self, max_connections: int = MAX_CONNECTIONS, rate: float = ACCEPT_RATE,
+                 burst: float = ACCEPT_BURST, clock: Callable[[], float] = time.monotonic):
+        self.max_connections = max_connections
+        self.rate = rate
+        self.limiter = RateLimiter(rate, burst, clock)
+        self.clock = clock
+        # Szacowana liczba odesłanych klientów, którzy jeszcze wrócą
+        self._waiting = 0.0
+        self._updated = clock()
+
+    def admit(self, connections: int) -> Optional[float]:
+        """
+        None, gdy połączenie można przyjąć; inaczej sugerowana przerwa
+        (sekundy) przed ponowieniem. connections - otwarte połączenia procesu.
+        """
+        now = self.clock()
+        # Odesłani klienci wracają w tempie przyjmowania
+        self._waiting = max(0.0, self._waiting - (now - self._updated) * self.rate)
+        self._updated = now
+
+        if connections >= self.max_connections:
+            _REJECTED_FULL.inc()
+            return random.uniform(*FULL_RETRY)
+        if self.limiter.allow(0):
+            return None
+        _REJECTED_RATE.inc()
+        self._waiting += 1
+        return MIN_RETRY + random.uniform(0, self._waiting / self.rate)
+
+
+admission = AdmissionControl()
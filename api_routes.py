@@ -1,31 +1,63 @@
 """
 Endpointy HTTP API
 """
+import time
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Request, Header
+from fastapi import APIRouter, Depends, HTTPException, Request, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import or_, and_, select
 
 from database import get_db, SessionLocal
-from models import User, SpinHistory
-from schemas import UserAuth, TokenResponse, UserResponse, FundOperation
-from security import get_password_hash, verify_password, create_access_token, verify_token
+from models import User, SpinHistory, Bet
+from schemas import UserAuth, TokenResponse, UserResponse, FundOperation, BulkFundOperation, UserPage, BetPage
+from admin_feed import admin_feed
+from bets import apply_fund_operations
+from cluster import coordinator
+from export import EXPORT_KINDS, EXPORT_FORMATS, stream_export
+from retention import color_counts, range_counts
+from cache import token_cache, user_cache, UserSnapshot
+from stats import spin_stats
+from security import create_access_token, verify_token, password_hasher, HashPoolSaturated
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
 
-def get_current_user(
-    authorization: Optional[str] = Header(None), 
-    db: Session = Depends(get_db)
-) -> User:
-    """Weryfikuje token JWT i zwraca użytkownika"""
+def load_user_snapshot(user_id: int) -> Optional[UserSnapshot]:
+    """Wczytuje użytkownika z bazy do cache"""
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            return None
+        snapshot = UserSnapshot(user.id, user.username, user.balance, user.is_admin)
+    finally:
+        db.close()
+    user_cache.set(user_id, snapshot)
+    return snapshot
+
+
+def get_current_user(authorization: Optional[str] = Header(None)) -> UserSnapshot:
+    """
+    Weryfikuje token JWT i zwraca użytkownika.
+    Zdekodowany token i dane użytkownika są brane z cache, jeśli to możliwe.
+    """
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Brak tokenu autoryzacyjnego")
     
     token = authorization.replace("Bearer ", "")
-    payload = verify_token(token)
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = verify_token(token)
+        if payload:
+            # Wpis nie może przeżyć ważności tokenu
+            expires_at = time.monotonic() + (payload.get("exp", 0) - time.time())
+            token_cache.set(token, payload, expires_at)
     
     if not payload:
         raise HTTPException(status_code=401, detail="Nieprawidłowy token")
@@ -34,7 +66,7 @@ def get_current_user(
     if not user_id:
         raise HTTPException(status_code=401, detail="Nieprawidłowy token")
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = user_cache.get(user_id) or load_user_snapshot(user_id)
     if not user:
         raise HTTPException(status_code=401, detail="Użytkownik nie istnieje")
     
@@ -57,19 +89,51 @@ def read_admin(request: Request):
 
 # Logowanie / rejestracja
 
+def find_user_by_name(username: str) -> Optional[User]:
+    db = SessionLocal()
+    try:
+        return db.query(User).filter(User.username == username).first()
+    finally:
+        db.close()
+
+
+def create_user(username: str, hashed_pwd: str) -> User:
+    db = SessionLocal()
+    try:
+        new_user = User(username=username, password=hashed_pwd)
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
+        return new_user
+    finally:
+        db.close()
+
+
+async def run_hasher(method, *args):
+    """Wywołuje bcrypt w puli procesów, przy przepełnieniu zwraca 429"""
+    try:
+        return await method(*args)
+    except HashPoolSaturated:
+        raise HTTPException(
+            status_code=429,
+            detail="Serwer jest przeciążony, spróbuj ponownie",
+            headers={"Retry-After": "1"}
+        )
+
+
 @router.post("/register", response_model=TokenResponse)
-def register(user_data: UserAuth, db: Session = Depends(get_db)):
+async def register(user_data: UserAuth):
     """Rejestracja nowego użytkownika"""
     try:
-        db_user = db.query(User).filter(User.username == user_data.username).first()
+        db_user = await run_in_threadpool(find_user_by_name, user_data.username)
         if db_user:
             raise HTTPException(status_code=400, detail="Uzytkownik istnieje")
         
-        hashed_pwd = get_password_hash(user_data.password)
-        new_user = User(username=user_data.username, password=hashed_pwd)
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        hashed_pwd = await run_hasher(password_hasher.hash, user_data.password)
+        try:
+            new_user = await run_in_threadpool(create_user, user_data.username, hashed_pwd)
+        except IntegrityError:
+            raise HTTPException(status_code=400, detail="Uzytkownik istnieje")
         
         access_token = create_access_token(
             data={"user_id": new_user.id, "username": new_user.username}
@@ -79,15 +143,17 @@ def register(user_data: UserAuth, db: Session = Depends(get_db)):
             "token_type": "bearer",
             "user": new_user
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(user_data: UserAuth, db: Session = Depends(get_db)):
+async def login(user_data: UserAuth):
     """Logowanie użytkownika"""
-    user = db.query(User).filter(User.username == user_data.username).first()
-    if not user or not verify_password(user_data.password, user.password):
+    user = await run_in_threadpool(find_user_by_name, user_data.username)
+    if not user or not await run_hasher(password_hasher.verify, user_data.password, user.password):
         raise HTTPException(status_code=401, detail="Bledne dane")
     
     access_token = create_access_token(
@@ -101,82 +167,182 @@ def login(user_data: UserAuth, db: Session = Depends(get_db)):
 
 
 @router.get("/api/me", response_model=UserResponse)
-def get_current_user_data(current_user: User = Depends(get_current_user)):
+def get_current_user_data(current_user: UserSnapshot = Depends(get_current_user)):
     """Pobiera dane zalogowanego użytkownika"""
     return current_user
 
 
+@router.get("/api/me/bets", response_model=BetPage)
+def get_my_bets(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Historia zakładów zalogowanego użytkownika, od najnowszych.
+    Stronicowanie kursorem "spin_id:id" - bez OFFSET, korzysta z indeksu (user_id, spin_id).
+    """
+    limit = max(1, min(limit, 200))
+    query = db.query(Bet).filter(Bet.user_id == current_user.id)
+
+    if cursor:
+        try:
+            spin_id, bet_id = (int(part) for part in cursor.split(":"))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Nieprawidłowy kursor")
+        query = query.filter(or_(
+            Bet.spin_id < spin_id,
+            and_(Bet.spin_id == spin_id, Bet.id < bet_id)
+        ))
+
+    bets = query.order_by(Bet.spin_id.desc(), Bet.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(bets) > limit:
+        bets = bets[:limit]
+        next_cursor = f"{bets[-1].spin_id}:{bets[-1].id}"
+
+    return {"items": bets, "next_cursor": next_cursor}
+
+
 # Endpointy admina
 
-@router.get("/api/users", response_model=List[UserResponse])
-def get_all_users(current_user: User = Depends(get_current_user)):
-    """Pobiera wszystkich użytkowników"""
+@router.get("/api/users", response_model=UserPage)
+def get_all_users(
+    limit: int = 100,
+    prefix: Optional[str] = None,
+    cursor: Optional[str] = None,
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """
+    Lista użytkowników posortowana po nazwie, stronami.
+    prefix zawęża listę do nazw zaczynających się od podanego tekstu,
+    kolejne strony: cursor = next_cursor z poprzedniej odpowiedzi.
+    Oba filtry to zakresy na indeksie username - bez OFFSET i LIKE.
+    """
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Brak uprawnień")
     
+    limit = max(1, min(limit, 500))
+    query = select(User.id, User.username, User.balance, User.is_admin)
+    if prefix:
+        query = query.where(User.username >= prefix)
+        if ord(prefix[-1]) < 0x10FFFF:
+            query = query.where(User.username < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    if cursor is not None:
+        query = query.where(User.username > cursor)
+    
     db = SessionLocal()
     try:
-        users = db.query(User).all()
-        return users
+        rows = db.execute(query.order_by(User.username).limit(limit)).all()
     finally:
         db.close()
+    
+    return UserPage(
+        items=[UserResponse(id=uid, username=name, balance=balance, is_admin=bool(is_admin))
+               for uid, name, balance, is_admin in rows],
+        next_cursor=rows[-1].username if len(rows) == limit else None,
+    )
 
 
 @router.post("/api/admin/funds")
-def manage_funds(op: FundOperation, current_user: User = Depends(get_current_user)):
+def manage_funds(op: FundOperation, current_user: UserSnapshot = Depends(get_current_user)):
     """Zarządzanie środkami: dodaj, usuń, ustaw"""
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Brak uprawnień")
     
+    if op.operation not in ("add", "remove", "set"):
+        raise HTTPException(status_code=400, detail="Unknown operation")
+
+    # Jedno zapytanie UPDATE zamiast odczytu i zapisu salda - nie nadpisuje
+    # stawek pobranych w międzyczasie przez pętlę gry
     db = SessionLocal()
     try:
-        user = db.query(User).filter(User.id == op.user_id).first()
-        if not user:
+        if apply_fund_operations(db, [(op.user_id, op.operation, op.amount)]):
             raise HTTPException(status_code=404, detail="User not found")
-        
-        if op.operation == 'add':
-            user.balance += op.amount
-        elif op.operation == 'remove':
-            user.balance -= op.amount
-            if user.balance < 0:
-                user.balance = 0.0
-        elif op.operation == 'set':
-            user.balance = op.amount
-        else:
-            raise HTTPException(status_code=400, detail="Unknown operation")
+        db.commit()
+        username, balance = db.execute(
+            select(User.username, User.balance).where(User.id == op.user_id)
+        ).one()
+    finally:
+        db.close()
 
+    coordinator.notify_balance_change(op.user_id)
+    admin_feed.publish("balance", user_id=op.user_id, username=username, balance=balance)
+    return {
+        "message": "Success",
+        "new_balance": balance,
+        "username": username
+    }
+
+
+@router.post("/api/admin/funds/bulk")
+def manage_funds_bulk(bulk: BulkFundOperation, current_user: UserSnapshot = Depends(get_current_user)):
+    """
+    Wiele operacji na saldach (np. promocja dla wszystkich graczy) w jednej
+    transakcji. Operacje na tym samym graczu są wykonywane po kolei.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Brak uprawnień")
+    if any(op.operation not in ("add", "remove", "set") for op in bulk.operations):
+        raise HTTPException(status_code=400, detail="Unknown operation")
+    
+    operations = [(op.user_id, op.operation, op.amount) for op in bulk.operations]
+    db = SessionLocal()
+    try:
+        missing = apply_fund_operations(db, operations)
         db.commit()
-        return {
-            "message": "Success",
-            "new_balance": user.balance,
-            "username": user.username
-        }
     finally:
         db.close()
+    
+    skipped = set(missing)
+    updated = {uid for uid, _, _ in operations if uid not in skipped}
+    coordinator.notify_balance_changes(updated)
+    admin_feed.publish("balances", updated=len(updated))
+    return {
+        "message": "Success",
+        "updated": len(updated),
+        "missing": missing,
+    }
+
+
+@router.get("/api/admin/auth-stats")
+def get_auth_stats(current_user: UserSnapshot = Depends(get_current_user)):
+    """Stan puli haszowania haseł (kolejka, odrzucone żądania)"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Brak uprawnień")
+    return password_hasher.stats()
 
 
 @router.get("/api/admin/history")
-def get_spin_history(limit: int = 100, current_user: User = Depends(get_current_user)):
-    """Pobiera historię losowań z bazy danych"""
+def get_spin_history(
+    limit: int = 100,
+    before_id: Optional[int] = None,
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """
+    Pobiera historię losowań z bazy danych.
+    Kolejne strony: before_id = next_before_id z poprzedniej odpowiedzi.
+    """
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Brak uprawnień")
     
     db = SessionLocal()
     try:
-        history = db.query(SpinHistory).order_by(
-            SpinHistory.id.desc()
-        ).limit(limit).all()
+        query = db.query(SpinHistory)
+        if before_id is not None:
+            query = query.filter(SpinHistory.id < before_id)
+        history = query.order_by(SpinHistory.id.desc()).limit(limit).all()
         
-        # Statystyki
-        total = db.query(SpinHistory).count()
-        color_stats = db.query(
-            SpinHistory.color,
-            func.count(SpinHistory.id).label('count')
-        ).group_by(SpinHistory.color).all()
+        # Statystyki z liczników w pamięci zamiast skanowania tabeli
+        if not spin_stats.loaded:
+            spin_stats.load(db)
         
         return {
-            "total_spins": total,
-            "statistics": {c: count for c, count in color_stats},
+            "total_spins": spin_stats.total,
+            "statistics": dict(spin_stats.colors),
+            "numbers": list(spin_stats.numbers),
+            "next_before_id": history[-1].id if len(history) == limit else None,
             "history": [
                 {
                     "id": h.id,
@@ -189,3 +355,56 @@ def get_spin_history(limit: int = 100, current_user: User = Depends(get_current_
         }
     finally:
         db.close()
+
+
+@router.get("/api/admin/stats")
+def get_range_stats(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """
+    Statystyki losowań z zakresu dat (date_from włącznie, date_to wyłącznie).
+    Starsze okresy są liczone z zestawień godzinowych i dziennych, więc
+    obejmują też losowania przeniesione już do archiwum.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Brak uprawnień")
+
+    db = SessionLocal()
+    try:
+        numbers = range_counts(db, date_from, date_to)
+    finally:
+        db.close()
+    return {
+        "total_spins": sum(numbers),
+        "statistics": color_counts(numbers),
+        "numbers": numbers,
+    }
+
+
+@router.get("/api/admin/export")
+def export_history(
+    kind: str = "spins",
+    fmt: str = Query("ndjson", alias="format"),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """
+    Eksport historii losowań (kind=spins) albo zakładów (kind=bets)
+    jako NDJSON lub CSV. Odpowiedź jest wysyłana strumieniowo w trakcie
+    czytania z bazy. Zakres dat: date_from włącznie, date_to wyłącznie.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Brak uprawnień")
+    if kind not in EXPORT_KINDS:
+        raise HTTPException(status_code=400, detail="Nieznany rodzaj eksportu")
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Nieznany format eksportu")
+
+    return StreamingResponse(
+        stream_export(kind, fmt, date_from, date_to),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{fmt}"'},
+    )
@@ -0,0 +1,338 @@
+"""
+Portfel graczy, księga zakładów rundy i rozliczanie rund.
+
+Stawki są rezerwowane w pamięci procesu (sprawdzenie środków bez zapytania
+do bazy), a pobierane z salda w bazie w tej samej transakcji, w której zakłady
+trafiają do dziennika rund - zanim gracz dostanie potwierdzenie. Saldo w bazie
+nie zawiera więc nigdy stawek, które są już w grze, i operacje admina nie mogą
+wydać tych samych pieniędzy drugi raz. Rozliczenie rundy dopisuje wygrane
+jedną transakcją.
+Funkcje synchroniczne wywołujemy z pętli asyncio przez run_in_db.
+"""
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, case, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from cache import user_cache
+from database import SessionLocal, db_writer, run_in_db
+from game_engine import EncodedBet, RouletteEngine, SpinResult
+from models import User, SpinHistory, Bet, Round, JournalBet
+
+users_table = User.__table__
+
+# Jedno zapytanie wykonywane przez executemany dla wszystkich graczy rundy
+_apply_delta = (
+    users_table.update()
+    .where(users_table.c.id == bindparam("uid"))
+    .values(balance=users_table.c.balance + bindparam("delta"))
+)
+
+# Pobranie stawki - tylko gdy saldo w bazie ją pokrywa
+_take_stake = (
+    users_table.update()
+    .where(users_table.c.id == bindparam("uid"))
+    .where(users_table.c.balance >= bindparam("stake"))
+    .values(balance=users_table.c.balance - bindparam("stake"))
+)
+
+# Saldo w bazie razem ze stawkami pobranymi w rundach jeszcze nierozliczonych
+# (wpisy dziennika) - stawki w portfelu są liczone osobno jako rezerwacje.
+# Oba składniki są zmieniane w tych samych transakcjach, więc odczyt jest spójny.
+_balance_with_stakes = users_table.c.balance + func.coalesce(
+    select(func.sum(JournalBet.amount))
+    .where(JournalBet.user_id == users_table.c.id)
+    .scalar_subquery(),
+    0.0,
+)
+
+# Operacja admina na saldzie (add / remove - nie poniżej zera / set),
+# jedno zapytanie wykonywane przez executemany dla całej paczki operacji.
+# Saldo w bazie nie zawiera stawek rund w toku, więc remove ich nie sięga.
+_apply_fund_operation = (
+    users_table.update()
+    .where(users_table.c.id == bindparam("uid"))
+    .values(balance=case(
+        (bindparam("op") == "add", users_table.c.balance + bindparam("amount")),
+        (bindparam("op") == "remove", case(
+            (users_table.c.balance > bindparam("amount"), users_table.c.balance - bindparam("amount")),
+            else_=0.0,
+        )),
+        else_=bindparam("amount"),
+    ))
+)
+
+# Rozliczona runda dziennika wskazuje zapisane losowanie
+_mark_settled = (
+    Round.__table__.update()
+    .where(Round.__table__.c.id == bindparam("rid"))
+    .values(status="settled", spin_id=bindparam("sid"))
+)
+
+
+def load_balances(user_ids: List[int]) -> Dict[int, float]:
+    """
+    Pobiera salda wielu graczy jednym zapytaniem (bez nieistniejących),
+    razem ze stawkami rund jeszcze nierozliczonych - jak WalletEntry.loaded
+    """
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(users_table.c.id, _balance_with_stakes).where(users_table.c.id.in_(user_ids))
+        )
+        return {uid: balance for uid, balance in rows}
+    finally:
+        db.close()
+
+
+def take_stakes(db: Session, stakes: Dict[int, float]) -> Set[int]:
+    """
+    Pobiera z sald sumy stawek graczy (gracz -> kwota), nigdy poniżej zera.
+    Zwraca graczy, których saldo w bazie nie pokrywa stawek - ich stawki
+    nie są pobierane. Commit należy do wywołującego.
+    """
+    rows = db.execute(select(User.id, User.balance).where(User.id.in_(list(stakes))))
+    covered = {uid for uid, balance in rows if balance >= stakes[uid]}
+    params = [{"uid": uid, "stake": stakes[uid]} for uid in covered]
+    if params and db.get_bind().dialect.supports_sane_multi_rowcount:
+        if db.execute(_take_stake, params).rowcount != len(params):
+            # Saldo zmienił w międzyczasie inny proces - transakcja jest wycofywana
+            raise RuntimeError("Saldo zmieniło się podczas pobierania stawek")
+    else:
+        for param in params:
+            if db.execute(_take_stake, param).rowcount != 1:
+                covered.discard(param["uid"])
+    return set(stakes) - covered
+
+
+def credit_balances(db: Session, amounts: Dict[int, float]):
+    """Dopisuje kwoty do sald (gracz -> kwota) jednym executemany"""
+    if amounts:
+        db.execute(_apply_delta, [
+            {"uid": uid, "delta": amount} for uid, amount in amounts.items()
+        ])
+
+
+def apply_fund_operations(db: Session, operations: List[Tuple[int, str, float]]) -> List[int]:
+    """
+    Wykonuje operacje (gracz, operacja, kwota) jednym executemany, w kolejności
+    z listy. Operacje na nieistniejących graczach są pomijane; zwraca ich id.
+    Commit należy do wywołującego.
+    """
+    user_ids = {uid for uid, _, _ in operations}
+    existing = set(db.execute(select(User.id).where(User.id.in_(user_ids))).scalars())
+    params = [
+        {"uid": uid, "op": op, "amount": amount}
+        for uid, op, amount in operations if uid in existing
+    ]
+    if params:
+        db.execute(_apply_fund_operation, params)
+    return sorted(user_ids - existing)
+
+
+def write_round_result(db: Session, result: SpinResult, winnings: Dict[int, float],
+                       bet_rows: List[dict], round_id: Optional[int] = None) -> int:
+    """
+    Zapisuje wynik losowania, zakłady rundy i wygrane wszystkich graczy
+    (executemany zamiast zapytania na gracza i zakład) - stawki zostały
+    pobrane z sald przy zapisie zakładów w dzienniku. Commit robi db_writer,
+    więc rozliczenia kilku rund mogą trafić do jednej transakcji.
+    Runda z dziennika jest oznaczana jako rozliczona w tej samej transakcji.
+    Zwraca id zapisanego losowania.
+    """
+    spin = SpinHistory(winning_number=result.number, color=result.color)
+    db.add(spin)
+    db.flush()
+    if bet_rows:
+        db.execute(insert(Bet), [dict(row, spin_id=spin.id) for row in bet_rows])
+    credit_balances(db, winnings)
+    if round_id is not None:
+        db.execute(_mark_settled, {"rid": round_id, "sid": spin.id})
+        db.execute(delete(JournalBet).where(JournalBet.round_id == round_id))
+    return spin.id
+
+
+class WalletEntry:
+    """
+    Saldo gracza wczytane z bazy (razem ze stawkami rund nierozliczonych)
+    i suma stawek zarezerwowanych w tych rundach
+    """
+    __slots__ = ("loaded", "reserved")
+
+    def __init__(self, loaded: Optional[float]):
+        self.loaded = loaded
+        self.reserved = 0.0
+
+
+class Wallet:
+    """
+    Portfel graczy w pamięci procesu.
+    Rezerwacja stawki nie wymaga zapytania do bazy - sprawdzenie i pobranie
+    środków odbywa się bez przełączania zadań, więc jest atomowe. Dlatego
+    portfel wolno zmieniać tylko w pętli zdarzeń (wątki puli przez
+    coordinator.notify_balance_changes).
+    Stawka zostaje w reserved do rozliczenia rundy, także po zapisaniu jej
+    w bazie - loaded zawiera stawki rund nierozliczonych, więc dostępne
+    saldo (loaded - reserved) jest poprawne niezależnie od tego, czy
+    odczyt z bazy nastąpił przed, czy po zapisie stawki.
+    """
+    def __init__(self):
+        self.entries: Dict[int, WalletEntry] = {}
+        # Rośnie przy każdej zmianie sald w bazie poza pobraniem stawek
+        # (rozliczenie, operacja admina) - odczyt sprzed zmiany jest odrzucany
+        self.version = 0
+
+    async def reserve(self, user_id: int, amount: float) -> Optional[float]:
+        """
+        Rezerwuje stawkę. Zwraca dostępne saldo po rezerwacji
+        albo None, gdy gracz nie istnieje lub brakuje środków.
+        """
+        return (await self.reserve_many([(user_id, amount)]))[0]
+
+    async def reserve_many(self, requests: List[Tuple[int, float]]) -> List[Optional[float]]:
+        """
+        Rezerwuje stawki wielu zakładów naraz: brakujące salda są wczytywane
+        jednym zapytaniem. Zwraca saldo po rezerwacji (albo None) dla każdego zakładu.
+        """
+        missing = {
+            uid for uid, _ in requests
+            if uid not in self.entries or self.entries[uid].loaded is None
+        }
+        if missing:
+            await self._load(list(missing))
+
+        results = []
+        for uid, amount in requests:
+            entry = self.entries.get(uid)
+            if entry is None or entry.loaded is None:
+                results.append(None)
+            else:
+                results.append(self._take(entry, amount))
+        return results
+
+    async def _load(self, user_ids: List[int]):
+        while True:
+            version = self.version
+            balances = await run_in_db(load_balances, user_ids)
+            if version == self.version:
+                break
+        for uid, balance in balances.items():
+            entry = self.entries.setdefault(uid, WalletEntry(balance))
+            if entry.loaded is None:
+                entry.loaded = balance
+
+    @staticmethod
+    def _take(entry: WalletEntry, amount: float) -> Optional[float]:
+        available = entry.loaded - entry.reserved
+        if amount <= 0 or available < amount:
+            return None
+        entry.reserved += amount
+        return available - amount
+
+    def release(self, user_id: int, amount: float):
+        """Zwalnia rezerwację (zakład nie został przyjęty albo runda anulowana)"""
+        entry = self.entries.get(user_id)
+        if entry is not None:
+            entry.reserved -= amount
+
+    def invalidate(self, user_id: int):
+        """Wymusza ponowne wczytanie salda (np. po zmianie przez admina)"""
+        self.version += 1
+        entry = self.entries.get(user_id)
+        if entry is not None:
+            entry.loaded = None
+
+    def apply_settlement(self, stakes: Dict[int, float]):
+        """
+        Zwalnia rezerwacje zapisanej rundy (gracz -> suma stawek). Gracze bez
+        otwartych rezerwacji są usuwani, a pozostali wczytają saldo ponownie.
+        """
+        self.version += 1
+        for uid, stake in stakes.items():
+            entry = self.entries.get(uid)
+            if entry is None:
+                continue
+            entry.reserved -= stake
+            if entry.reserved <= 1e-9:
+                del self.entries[uid]
+            else:
+                entry.loaded = None
+
+
+# Wspólny portfel procesu
+wallet = Wallet()
+
+
+class BetBook:
+    """
+    Księga zakładów jednej rundy - tylko dopisywanie.
+    Zakodowane zakłady trzymamy w zwartych tablicach, żeby rozliczenie
+    całej rundy było jednym wywołaniem calculate_payouts.
+    """
+    def __init__(self):
+        self.bets: List[dict] = []
+        self.stakes: Dict[int, float] = {}
+        self.masks = array("Q")
+        self.multipliers = array("d")
+        self.amounts = array("d")
+
+    def add(self, user_id: int, bet_type: str, value, amount: float,
+            encoded: EncodedBet) -> dict:
+        bet = {
+            "user_id": user_id,
+            "bet_type": bet_type,
+            "value": value,
+            "amount": amount
+        }
+        self.bets.append(bet)
+        self.masks.append(encoded.mask)
+        self.multipliers.append(encoded.multiplier)
+        self.amounts.append(amount)
+        self.stakes[user_id] = self.stakes.get(user_id, 0.0) + amount
+        return bet
+
+    def payouts(self, engine: RouletteEngine, result_number: int):
+        """Wygrane kolejnych zakładów dla wylosowanej liczby"""
+        return engine.calculate_payouts(self.masks, self.multipliers, self.amounts, result_number)
+
+    def __len__(self):
+        return len(self.bets)
+
+
+def build_settlement(book: BetBook, engine: RouletteEngine, result: SpinResult):
+    """
+    Wylicza rozliczenie rundy: sumy wygranych graczy, zmiany sald
+    i wiersze zakładów do zapisania.
+    """
+    winnings: Dict[int, float] = {}
+    bet_rows = []
+    for bet, payout in zip(book.bets, book.payouts(engine, result.number)):
+        payout = float(payout)
+        if payout > 0:
+            winnings[bet["user_id"]] = winnings.get(bet["user_id"], 0.0) + payout
+        bet_rows.append({
+            "user_id": bet["user_id"],
+            "bet_type": bet["bet_type"],
+            "value": str(bet["value"]),
+            "amount": bet["amount"],
+            "payout": payout,
+        })
+
+    deltas = {uid: -stake for uid, stake in book.stakes.items()}
+    for uid, win_amount in winnings.items():
+        deltas[uid] = deltas.get(uid, 0.0) + win_amount
+    return winnings, deltas, bet_rows
+
+
+async def settle_round(wallet: Wallet, book: BetBook, engine: RouletteEngine,
+                       result: SpinResult, round_id: Optional[int] = None) -> Dict[int, float]:
+    """
+    Rozlicza rundę: zapisuje wynik, zakłady i wygrane w jednej transakcji,
+    a potem aktualizuje portfel w pamięci. Zwraca sumy wygranych graczy.
+    """
+    winnings, deltas, bet_rows = build_settlement(book, engine, result)
+    await db_writer.submit(write_round_result, result, winnings, bet_rows, round_id)
+    wallet.apply_settlement(book.stakes)
+    user_cache.invalidate_many(deltas)
+    return winnings
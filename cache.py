@@ -0,0 +1,79 @@
+"""
+Ograniczone cache w pamięci (LRU z czasem życia wpisów)
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, Optional
+
+
+class TTLCache:
+    """
+    Cache LRU o ograniczonym rozmiarze, wpisy wygasają po ttl sekundach.
+    Bezpieczny dla wątków (synchroniczne endpointy działają w puli wątków).
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        """Zapisuje wartość; expires_at (monotonic) może skrócić czas życia wpisu"""
+        deadline = time.monotonic() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            self._data[key] = (deadline, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_many(self, keys: Iterable[Hashable]):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class UserSnapshot:
+    """Niezmienna kopia danych użytkownika przechowywana w cache"""
+    __slots__ = ("id", "username", "balance", "is_admin")
+
+    def __init__(self, id: int, username: str, balance: float, is_admin: bool):
+        self.id = id
+        self.username = username
+        self.balance = balance
+        self.is_admin = is_admin
+
+
+# Zdekodowane tokeny JWT (token -> dane z tokenu)
+token_cache = TTLCache(maxsize=10000, ttl=300)
+
+# Dane użytkowników (user_id -> UserSnapshot), unieważniane przy zmianie salda
+user_cache = TTLCache(maxsize=10000, ttl=30)
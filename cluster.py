@@ -0,0 +1,336 @@
+"""
+Wspólne rundy wszystkich stołów dla wielu procesów uvicorn (--workers N).
+
+Proces, który zdobędzie blokadę pliku, zostaje liderem: prowadzi pętle gry
+stołów i księgi zakładów, a przez gniazdo Unix wysyła pozostałym procesom gotowe
+ramki do rozesłania ich klientom. Pozostałe procesy (followerzy) przekazują
+liderowi przyjmowane zakłady. Gdy lider padnie, blokadę przejmuje inny proces.
+
+Tryb klastra włącza zmienna ROULETTE_CLUSTER=1; bez niej proces jest
+po prostu liderem i nic nie wysyła przez gniazdo.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Set
+
+from bets import wallet
+from cache import user_cache
+from frames import encode_frame, server_time
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_ENABLED = os.getenv("ROULETTE_CLUSTER") == "1"
+LOCK_PATH = os.getenv("ROULETTE_LOCK", "roulette.leader.lock")
+BUS_PATH = os.getenv("ROULETTE_BUS", "roulette.bus.sock")
+
+# Co ile sekund follower próbuje ponownie połączyć się z liderem / przejąć blokadę
+RETRY_INTERVAL = 1.0
+# Czas oczekiwania followera na odpowiedź lidera w sprawie zakładu
+BET_TIMEOUT = 5.0
+# Follower z większym zaległym buforem jest rozłączany
+MAX_FOLLOWER_BUFFER = 4 * 1024 * 1024
+# Najdłuższa wiadomość magistrali (jedna linia JSON) - domyślne 64 KiB
+# StreamReadera nie mieści wyniku rundy z kilkoma tysiącami graczy
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+# Paczka zakładów followera jest dzielona na wiadomości o tylu zakładach
+MAX_BUS_BETS = 500
+
+
+class RoundCoordinator:
+    """
+    Wybór lidera i kanał komunikacji między procesami.
+    Aplikacja podpina funkcje zwrotne przed wywołaniem start().
+    """
+    def __init__(self):
+        self.is_leader = False
+
+        # Korutyna wywoływana w procesie, który został liderem (np. start pętli gry)
+        self.on_leader: Optional[Callable] = None
+        # Rozesłanie gotowej ramki do lokalnych klientów stołu: (stół, ramka)
+        self.on_frame: Optional[Callable] = None
+        # Nowa historia losowań stołu (follower): (stół, historia, wynik albo None, wygrane)
+        self.on_history: Optional[Callable] = None
+        # Przyjęcie paczki zakładów w liderze: (stół, lista zakładów) -> lista odpowiedzi
+        self.bet_handler: Optional[Callable] = None
+        # Aktualne historie stołów do wysłania nowemu followerowi
+        self.history_provider: Optional[Callable[[], Dict[str, list]]] = None
+        # Zdarzenie dla paneli administratora (w każdym procesie): (zdarzenie)
+        self.on_admin_event: Optional[Callable] = None
+
+        self._lock_file = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._task: Optional[asyncio.Task] = None
+        self._followers: Set[asyncio.StreamWriter] = set()
+        self._leader_writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_request = 0
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        if not CLUSTER_ENABLED or self._try_lock():
+            await self._become_leader()
+        else:
+            self._task = asyncio.create_task(self._follow())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._followers):
+            writer.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    # Lider
+
+    async def broadcast(self, table_id: str, message: dict):
+        """Koduje wiadomość raz i rozsyła ją klientom stołu we wszystkich procesach"""
+        frame = encode_frame({**message, "server_time": server_time()})
+        await self.on_frame(table_id, frame)
+        self._publish({"kind": "frame", "table": table_id, "frame": frame})
+
+    def publish_spin(self, table_id: str, result: dict, history: list, user_ids,
+                     winners: Dict[int, float]):
+        """Przekazuje followerom nowy wynik, historię, graczy ze zmienionym saldem i wygrane"""
+        self._publish({
+            "kind": "spin",
+            "table": table_id,
+            "result": result,
+            "history": history,
+            "users": list(user_ids),
+            "winners": [[uid, amount] for uid, amount in winners.items()],
+        })
+
+    def notify_balance_change(self, user_id: int):
+        """
+        Unieważnia saldo gracza we wszystkich procesach.
+        Można wywołać z wątku puli (synchroniczne endpointy).
+        """
+        self.notify_balance_changes([user_id])
+
+    def notify_balance_changes(self, user_ids: List[int]):
+        """
+        Jak notify_balance_change dla wielu graczy - jedną wiadomością.
+        Portfel jest zmieniany tylko w pętli zdarzeń (jego rezerwacje są atomowe,
+        bo nic innego nie działa w trakcie) - z wątku puli przez call_soon_threadsafe.
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        user_cache.invalidate_many(user_ids)
+        if self._loop is None or self._in_loop():
+            self._invalidate(user_ids)
+        else:
+            self._loop.call_soon_threadsafe(self._invalidate, user_ids)
+
+    def _in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _invalidate(self, user_ids: List[int]):
+        for user_id in user_ids:
+            wallet.invalidate(user_id)
+        if self._loop is not None and CLUSTER_ENABLED:
+            self._send_invalidate(user_ids)
+
+    def _send_invalidate(self, user_ids: List[int]):
+        message = {"kind": "invalidate", "user_ids": user_ids}
+        if self.is_leader:
+            self._publish(message)
+        elif self._leader_writer is not None:
+            self._write(self._leader_writer, message)
+
+    def publish_admin(self, event: dict):
+        """
+        Rozsyła zdarzenie paneli administratora do wszystkich procesów
+        (przez lidera). Można wywołać z wątku puli.
+        """
+        if self._loop is not None and self.on_admin_event is not None:
+            self._loop.call_soon_threadsafe(self._send_admin, event)
+
+    def _send_admin(self, event: dict):
+        message = {"kind": "admin", "event": event}
+        if self.is_leader or self._leader_writer is None:
+            self._loop.create_task(self.on_admin_event(event))
+            self._publish(message)
+        else:
+            # Lider odeśle zdarzenie wszystkim followerom, także temu
+            self._write(self._leader_writer, message)
+
+    def _publish(self, message: dict):
+        if not self._followers:
+            return
+        line = (encode_frame(message) + "\n").encode()
+        for writer in list(self._followers):
+            if writer.transport.get_write_buffer_size() > MAX_FOLLOWER_BUFFER:
+                logger.warning("Follower nie nadąża - rozłączam")
+                self._followers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+
+    @staticmethod
+    def _write(writer: asyncio.StreamWriter, message: dict):
+        writer.write((encode_frame(message) + "\n").encode())
+
+    def _try_lock(self) -> bool:
+        lock_file = open(LOCK_PATH, "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def _become_leader(self):
+        self.is_leader = True
+        if CLUSTER_ENABLED:
+            # Trzymamy blokadę, więc stare gniazdo na pewno nie jest używane
+            if os.path.exists(BUS_PATH):
+                os.unlink(BUS_PATH)
+            self._server = await asyncio.start_unix_server(
+                self._serve_follower, path=BUS_PATH, limit=MAX_MESSAGE_SIZE
+            )
+            logger.info("Proces %s jest liderem rundy", os.getpid())
+        await self.on_leader()
+
+    async def _serve_follower(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        for table_id, history in self.history_provider().items():
+            self._write(writer, {"kind": "history", "table": table_id, "history": history})
+        self._followers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                kind = message.get("kind")
+                if kind == "bets":
+                    asyncio.create_task(self._handle_bets(writer, message))
+                elif kind == "invalidate":
+                    for user_id in message["user_ids"]:
+                        wallet.invalidate(user_id)
+                    user_cache.invalidate_many(message["user_ids"])
+                    self._publish(message)
+                elif kind == "admin":
+                    await self.on_admin_event(message["event"])
+                    self._publish(message)
+        except ConnectionError:
+            pass
+        except ValueError:
+            logger.exception("Błędna wiadomość od followera - rozłączam")
+        finally:
+            self._followers.discard(writer)
+            writer.close()
+
+    async def _handle_bets(self, writer: asyncio.StreamWriter, message: dict):
+        try:
+            replies = await self.bet_handler(message["table"], message["bets"])
+        except Exception:
+            # Follower dostaje odmowę od razu, zamiast czekać BET_TIMEOUT
+            logger.exception("Nie udało się przyjąć zakładów followera")
+            replies = [{"error": "Nie udało się przyjąć zakładu, spróbuj ponownie"} for _ in message["bets"]]
+        if not writer.is_closing():
+            self._write(writer, {"kind": "bets_result", "request": message["request"], "replies": replies})
+
+    # Follower
+
+    async def place_bets(self, table_id: str, bets: List[dict]) -> List[dict]:
+        """
+        Przekazuje paczkę zakładów liderowi - wiadomościami po najwyżej
+        MAX_BUS_BETS zakładów (lub przyjmuje ją lokalnie, jeśli to lider).
+        Zwraca odpowiedź dla każdego zakładu.
+        """
+        if self.is_leader:
+            return await self.bet_handler(table_id, bets)
+        if self._leader_writer is None:
+            return [{"error": "Brak połączenia z serwerem gry"} for _ in bets]
+        if len(bets) > MAX_BUS_BETS:
+            chunks = await asyncio.gather(*(
+                self.place_bets(table_id, bets[start:start + MAX_BUS_BETS])
+                for start in range(0, len(bets), MAX_BUS_BETS)
+            ))
+            return [reply for chunk in chunks for reply in chunk]
+
+        self._next_request += 1
+        request = self._next_request
+        future = self._loop.create_future()
+        self._pending[request] = future
+        try:
+            self._write(self._leader_writer, {"kind": "bets", "request": request, "table": table_id, "bets": bets})
+            replies = await asyncio.wait_for(future, BET_TIMEOUT)
+            # Lider pobrał stawki z sald w bazie
+            user_cache.invalidate_many({
+                bet["user_id"] for bet, reply in zip(bets, replies) if "new_balance" in reply
+            })
+            return replies
+        except asyncio.TimeoutError:
+            error = "Serwer gry nie odpowiada"
+        except ConnectionError:
+            error = "Utracono połączenie z serwerem gry"
+        finally:
+            self._pending.pop(request, None)
+        return [{"error": error} for _ in bets]
+
+    async def _follow(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(BUS_PATH, limit=MAX_MESSAGE_SIZE)
+            except OSError:
+                reader = writer = None
+
+            if writer is not None:
+                self._leader_writer = writer
+                try:
+                    await self._read_leader(reader)
+                except ConnectionError:
+                    pass
+                except ValueError:
+                    logger.exception("Błędna wiadomość od lidera - łączę ponownie")
+                finally:
+                    self._leader_writer = None
+                    writer.close()
+                    for future in self._pending.values():
+                        if not future.done():
+                            future.set_exception(ConnectionError())
+
+            if self._try_lock():
+                await self._become_leader()
+                return
+            await asyncio.sleep(RETRY_INTERVAL)
+
+    async def _read_leader(self, reader: asyncio.StreamReader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            message = json.loads(line)
+            kind = message.get("kind")
+            if kind == "frame":
+                await self.on_frame(message["table"], message["frame"])
+            elif kind == "bets_result":
+                future = self._pending.get(message["request"])
+                if future is not None and not future.done():
+                    future.set_result(message["replies"])
+            elif kind == "history":
+                await self.on_history(message["table"], message["history"], None, {})
+            elif kind == "spin":
+                user_cache.invalidate_many(message["users"])
+                winners = {uid: amount for uid, amount in message["winners"]}
+                await self.on_history(message["table"], message["history"], message["result"], winners)
+            elif kind == "invalidate":
+                user_cache.invalidate_many(message["user_ids"])
+            elif kind == "admin":
+                await self.on_admin_event(message["event"])
+
+
+coordinator = RoundCoordinator()
@@ -0,0 +1,194 @@
+"""
+Zarządzanie połączeniami WebSocket i rozsyłanie wiadomości do klientów
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+from fastapi import WebSocket
+
+from frames import encode_frame, encode_binary, frame_to_binary, server_time
+from metrics import BROADCAST_SECONDS
+
+# Maksymalna liczba ramek czekających na wysłanie do jednego klienta.
+# Klient, który nie nadąża z odbiorem, jest rozłączany.
+CLIENT_QUEUE_SIZE = 64
+
+# Czas (w sekundach) na zamknięcie gniazda usuwanego klienta
+CLOSE_TIMEOUT = 1.0
+
+# Co ile sekund klienci dostają ping (odpowiadają pong) i po ilu sekundach
+# ciszy połączenie jest uznawane za martwe
+HEARTBEAT_INTERVAL = 15.0
+HEARTBEAT_TIMEOUT = 45.0
+
+PING_FRAME = encode_frame({"type": "ping"})
+
+
+class ClientConnection:
+    """
+    Pojedynczy klient: gniazdo, kolejka wyjściowa i zadanie wysyłające.
+    binary - klient wybrał ramki MessagePack; user_id - gracz, który obstawiał z tego gniazda;
+    last_seen - czas ostatniej wiadomości od klienta (time.monotonic).
+    """
+    __slots__ = ("websocket", "queue", "writer", "binary", "user_id", "last_seen")
+
+    def __init__(self, websocket: WebSocket, queue_size: int, binary: bool = False):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.binary = binary
+        self.user_id: Optional[int] = None
+        self.last_seen = time.monotonic()
+
+
+class ConnectionManager:
+    """
+    Rozsyła wiadomości do wszystkich klientów bez czekania na najwolniejszego.
+    Wiadomość jest serializowana raz i trafia do kolejek poszczególnych klientów,
+    które opróżniają ich własne zadania wysyłające.
+    """
+    def __init__(self, queue_size: int = CLIENT_QUEUE_SIZE):
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        self.queue_size = queue_size
+        self.binary_clients = 0
+
+        # Statystyki rozsyłania (w milisekundach)
+        self.last_broadcast_ms = 0.0
+        self.last_delivery_ms = 0.0
+        self.max_delivery_ms = 0.0
+        self.evicted = 0
+        self.reaped = 0
+
+    async def connect(self, websocket: WebSocket, binary: bool = False):
+        await websocket.accept()
+        client = ClientConnection(websocket, self.queue_size, binary)
+        client.writer = asyncio.create_task(self._writer(client))
+        self.active_connections[websocket] = client
+        if binary:
+            self.binary_clients += 1
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.active_connections.pop(websocket, None)
+        if client is None:
+            return
+        if client.binary:
+            self.binary_clients -= 1
+        if client.writer is not asyncio.current_task():
+            client.writer.cancel()
+
+    def set_user(self, websocket: WebSocket, user_id: int):
+        """Zapamiętuje gracza gniazda (do powiadomień o wygranej)"""
+        client = self.active_connections.get(websocket)
+        if client is not None:
+            client.user_id = user_id
+
+    def touch(self, websocket: WebSocket):
+        """Odnotowuje wiadomość od klienta (klient żyje)"""
+        client = self.active_connections.get(websocket)
+        if client is not None:
+            client.last_seen = time.monotonic()
+
+    def heartbeat(self, timeout: float = HEARTBEAT_TIMEOUT) -> int:
+        """
+        Usuwa klientów, od których nic nie przyszło przez timeout sekund,
+        a pozostałym wysyła ping. Zwraca liczbę usuniętych.
+        """
+        now = time.monotonic()
+        started = time.perf_counter()
+        binary_ping = frame_to_binary(PING_FRAME) if self.binary_clients else None
+        reaped = 0
+        for client in list(self.active_connections.values()):
+            if now - client.last_seen > timeout:
+                self._drop(client)
+                reaped += 1
+            else:
+                self._enqueue(client, binary_ping if client.binary else PING_FRAME, started)
+        self.reaped += reaped
+        return reaped
+
+    async def send_personal(self, websocket: WebSocket, message: dict):
+        """Wysyła wiadomość do jednego klienta przez jego kolejkę"""
+        client = self.active_connections.get(websocket)
+        if client is not None:
+            frame = encode_binary(message) if client.binary else encode_frame(message)
+            self._enqueue(client, frame, time.perf_counter())
+
+    async def send_frame(self, websocket: WebSocket, frame: str):
+        """Wysyła gotową ramkę JSON do jednego klienta"""
+        client = self.active_connections.get(websocket)
+        if client is not None:
+            self._enqueue(client, frame_to_binary(frame) if client.binary else frame, time.perf_counter())
+
+    async def broadcast(self, message: dict):
+        """Dodaje czas serwera, koduje wiadomość raz i rozsyła do wszystkich"""
+        await self.broadcast_frame(encode_frame({**message, "server_time": server_time()}))
+
+    async def broadcast_frame(self, frame: str):
+        """Rozsyła gotową ramkę JSON do wszystkich klientów"""
+        started = time.perf_counter()
+        # Wersja binarna kodowana raz, tylko gdy ktoś jej używa
+        binary_frame = frame_to_binary(frame) if self.binary_clients else None
+        for client in list(self.active_connections.values()):
+            self._enqueue(client, binary_frame if client.binary else frame, started)
+
+        elapsed = time.perf_counter() - started
+        self.last_broadcast_ms = elapsed * 1000
+        BROADCAST_SECONDS.observe(elapsed)
+
+    async def notify_winners(self, winners: Dict[int, float]):
+        """Wysyła wygrane tylko do gniazd graczy, którzy wygrali"""
+        if not winners:
+            return
+        for client in list(self.active_connections.values()):
+            amount = winners.get(client.user_id)
+            if amount:
+                await self.send_personal(client.websocket, {"type": "win", "amount": amount})
+
+    def stats(self) -> dict:
+        """Zwraca statystyki połączeń i opóźnień rozsyłania"""
+        return {
+            "connections": len(self.active_connections),
+            "last_broadcast_ms": round(self.last_broadcast_ms, 3),
+            "last_delivery_ms": round(self.last_delivery_ms, 3),
+            "max_delivery_ms": round(self.max_delivery_ms, 3),
+            "evicted": self.evicted,
+            "reaped": self.reaped,
+        }
+
+    def _enqueue(self, client: ClientConnection, frame: str, enqueued_at: float):
+        try:
+            client.queue.put_nowait((frame, enqueued_at))
+        except asyncio.QueueFull:
+            # Klient nie nadąża - usuwamy go, zamiast spowalniać pozostałych
+            self.evicted += 1
+            self._drop(client)
+
+    async def _writer(self, client: ClientConnection):
+        websocket = client.websocket
+        try:
+            while True:
+                frame, enqueued_at = await client.queue.get()
+                if client.binary:
+                    await websocket.send_bytes(frame)
+                else:
+                    await websocket.send_text(frame)
+                delivery_ms = (time.perf_counter() - enqueued_at) * 1000
+                self.last_delivery_ms = delivery_ms
+                if delivery_ms > self.max_delivery_ms:
+                    self.max_delivery_ms = delivery_ms
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Martwe gniazdo - usuwamy klienta z listy
+            self._drop(client)
+
+    def _drop(self, client: ClientConnection):
+        self.disconnect(client.websocket)
+        asyncio.create_task(self._close(client.websocket))
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), CLOSE_TIMEOUT)
+        except Exception:
+            pass
@@ -0,0 +1,101 @@
+"""
+Strumieniowy eksport historii losowań i zakładów (NDJSON albo CSV).
+
+Wiersze są czytane z bazy porcjami (yield_per - na Postgresie kursor po
+stronie serwera) i od razu wysyłane do klienta, więc eksport milionów
+wierszy zużywa stałą ilość pamięci i zaczyna się bez czekania na całe
+zapytanie. Zakres dat filtruje po czasie losowania (zakłady nie mają
+własnego znacznika czasu - biorą go z rundy).
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Sequence
+
+from sqlalchemy import select
+
+from database import SessionLocal, timestamp_bound
+from models import Bet, SpinHistory
+
+# Liczba wierszy pobieranych z bazy i wysyłanych jedną porcją
+EXPORT_BATCH = 1000
+
+EXPORT_KINDS = ("spins", "bets")
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def export_query(kind: str, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+    """Zapytanie eksportu; date_from włącznie, date_to wyłącznie"""
+    if kind == "spins":
+        query = select(
+            SpinHistory.id,
+            SpinHistory.winning_number.label("number"),
+            SpinHistory.color,
+            SpinHistory.timestamp,
+        ).order_by(SpinHistory.id)
+    else:
+        # Kolejność zgodna z indeksem ix_bets_spin - bez sortowania całego wyniku
+        query = (
+            select(
+                Bet.id,
+                Bet.spin_id,
+                Bet.user_id,
+                Bet.bet_type,
+                Bet.value,
+                Bet.amount,
+                Bet.payout,
+                SpinHistory.timestamp,
+            )
+            .join(SpinHistory, SpinHistory.id == Bet.spin_id)
+            .order_by(Bet.spin_id, Bet.id)
+        )
+    if date_from is not None:
+        query = query.where(SpinHistory.timestamp >= timestamp_bound(date_from))
+    if date_to is not None:
+        query = query.where(SpinHistory.timestamp < timestamp_bound(date_to))
+    return query
+
+
+def _plain(value):
+    return value.isoformat(sep=" ") if isinstance(value, datetime) else value
+
+
+def encode_ndjson(columns: Sequence[str], rows: Iterable[Sequence]) -> str:
+    """Porcja wierszy jako NDJSON (jeden obiekt JSON w linii)"""
+    return "".join(
+        json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+def encode_csv(rows: Iterable[Sequence]) -> str:
+    """Porcja wierszy jako CSV"""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(
+        [_plain(value) for value in row] for row in rows
+    )
+    return buffer.getvalue()
+
+
+def stream_export(kind: str, fmt: str, date_from: Optional[datetime] = None,
+                  date_to: Optional[datetime] = None) -> Iterator[str]:
+    """
+    Generator kolejnych porcji eksportu. Sesja jest otwierana przy pierwszej
+    porcji i zamykana po ostatniej (albo gdy klient przerwie pobieranie).
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            export_query(kind, date_from, date_to).execution_options(yield_per=EXPORT_BATCH)
+        )
+        columns = list(result.keys())
+        if fmt == "csv":
+            yield encode_csv([columns])
+        for rows in result.partitions():
+            yield encode_csv(rows) if fmt == "csv" else encode_ndjson(columns, rows)
+    finally:
+        db.close()
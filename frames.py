@@ -0,0 +1,75 @@
+"""
+Serializacja wiadomości WebSocket do gotowych ramek.
+
+Domyślnie ramki są tekstowe (JSON). Klient może przy połączeniu poprosić
+o ramki binarne MessagePack (?format=msgpack), jeśli pakiet msgpack jest zainstalowany.
+"""
+import json
+import time
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:  # orjson jest opcjonalny
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack jest opcjonalny
+    msgpack = None
+
+_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+
+
+def encode_frame(message: dict) -> str:
+    """Koduje wiadomość do tekstu JSON (orjson, jeśli jest dostępny)"""
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return _encoder.encode(message)
+
+
+def encode_binary(message: dict) -> bytes:
+    """Koduje wiadomość do ramki binarnej MessagePack"""
+    return msgpack.packb(message)
+
+
+def frame_to_binary(frame: str) -> bytes:
+    """Zamienia gotową ramkę JSON na MessagePack"""
+    return encode_binary(json.loads(frame))
+
+
+def now_ms() -> int:
+    """Czas serwera w milisekundach od epoki (do liczenia odliczania u klienta)"""
+    return int(time.time() * 1000)
+
+
+def server_time() -> str:
+    """Aktualny czas serwera w formacie wysyłanym do klientów"""
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class InitSnapshot:
+    """
+    Ramka 'init' z historią losowań, statystykami stołu i stanem rundy.
+    Historia i statystyki są kodowane ponownie tylko po zmianie ich wersji.
+    """
+    def __init__(self, engine, stats=None):
+        self.engine = engine
+        self.stats = stats
+        self._version = None
+        self._history_json = "[]"
+        self._stats_json = "null"
+
+    def frame(self, round_state: dict = None) -> str:
+        version = (self.engine.history_version, self.stats.version if self.stats else None)
+        if self._version != version:
+            self._history_json = encode_frame(self.engine.history_payload())
+            if self.stats is not None:
+                self._stats_json = encode_frame(self.stats.summary())
+            self._version = version
+        return '{"type":"init","history":%s,"stats":%s,"round":%s,"server_time":%s}' % (
+            self._history_json,
+            self._stats_json,
+            encode_frame({**(round_state or {}), "now": now_ms()}),
+            encode_frame(server_time())
+        )
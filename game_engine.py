@@ -1,7 +1,162 @@
 import random
 from collections import deque
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, NamedTuple, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy jest opcjonalny - bez niego liczymy w petli
+    np = None
+
+RED_NUMBERS = frozenset({1, 3, 5, 7, 9, 12, 14, 16, 18, 19, 21, 23, 25, 27, 30, 32, 34, 36})
+
+# Kolejnosc pol na kole ruletki europejskiej (zgodnie z ruchem wskazowek zegara)
+WHEEL_ORDER = (0, 32, 15, 19, 4, 21, 2, 25, 17, 34, 6, 27, 13, 36, 11, 30, 8, 23, 10,
+               5, 24, 16, 33, 1, 20, 14, 31, 9, 22, 18, 29, 7, 28, 12, 35, 3, 26)
+
+
+class Pocket(NamedTuple):
+    """
+    Niezmienne cechy jednego pola. Dla zera parity, dozen, column i half
+    sa None (zero nie nalezy do zadnej z tych grup).
+    """
+    number: int
+    color: str
+    parity: Optional[str]
+    dozen: Optional[str]
+    column: Optional[str]
+    half: Optional[str]
+    neighbours: Tuple[int, int]  # sasiedzi na kole: (z lewej, z prawej)
+
+
+def build_pockets() -> Tuple[Pocket, ...]:
+    """Buduje rekordy wszystkich 37 pol (indeks = numer pola)"""
+    pockets = []
+    for n in range(37):
+        position = WHEEL_ORDER.index(n)
+        neighbours = (WHEEL_ORDER[position - 1], WHEEL_ORDER[(position + 1) % 37])
+        if n == 0:
+            pockets.append(Pocket(0, "green", None, None, None, None, neighbours))
+            continue
+        pockets.append(Pocket(
+            number=n,
+            color="red" if n in RED_NUMBERS else "black",
+            parity="even" if n % 2 == 0 else "odd",
+            dozen=("1st 12", "2nd 12", "3rd 12")[(n - 1) // 12],
+            column=("1st col", "2nd col", "3rd col")[(n - 1) % 3],
+            half="low" if n <= 18 else "high",
+            neighbours=neighbours,
+        ))
+    return tuple(pockets)
+
+
+POCKETS = build_pockets()
+# Kolory pol jako krotka - get_color to jedno indeksowanie
+COLORS = tuple(pocket.color for pocket in POCKETS)
+
+
+class SpinResult:
+    """
+    Wynik losowania. Na kazde pole jest jeden wspoldzielony obiekt
+    (SPIN_RESULTS), wiec losowanie niczego nie alokuje.
+    Nie nalezy go modyfikowac - takze slownika payload.
+    """
+    __slots__ = ("number", "color", "pocket", "payload")
+
+    def __init__(self, pocket: Pocket):
+        self.number = pocket.number
+        self.color = pocket.color
+        self.pocket = pocket
+        # Gotowa postac do JSON (wiadomosci, magistrala klastra, historia)
+        self.payload = {"number": pocket.number, "color": pocket.color}
+
+    def __getitem__(self, key: str):
+        """Zgodnosc z dawnym wynikiem w postaci slownika: result["number"]"""
+        return self.payload[key]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.payload)
+
+    def __repr__(self):
+        return f"SpinResult({self.number}, {self.color!r})"
+
+
+SPIN_RESULTS = tuple(SpinResult(pocket) for pocket in POCKETS)
+
+
+class EncodedBet(NamedTuple):
+    """
+    Zaklad zakodowany przy przyjeciu: rodzaj, maska bitowa wygrywajacych
+    pol (bit n = pole n) i mnoznik wyplaty
+    """
+    kind: str
+    mask: int
+    multiplier: float
+
+
+def _mask(numbers: Iterable[int]) -> int:
+    mask = 0
+    for n in numbers:
+        mask |= 1 << n
+    return mask
+
+
+def _to_int(value) -> int:
+    # Ulamek nie jest numerem pola (int() obcialby 5.5 do 5)
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(value)
+    return int(value)
+
+
+def _combo_key(numbers: Iterable[int]) -> str:
+    return "-".join(str(n) for n in sorted(numbers))
+
+
+def build_payout_table() -> Dict[Tuple[str, str], EncodedBet]:
+    """
+    Buduje tabele wszystkich dozwolonych zakladow: (rodzaj, wartosc) -> EncodedBet.
+    Nowy rodzaj zakladu to nowe wpisy w tej tabeli.
+    """
+    groups: Dict[str, Dict[str, List[int]]] = {
+        "number": {str(n): [n] for n in range(37)},
+        "color": {},
+        "parity": {},
+        "dozen": {},
+        "column": {},
+        "split": {},
+        "street": {},
+        "corner": {},
+    }
+    # Kolor, parzystosc, tuzin i kolumna wprost z rekordow pol (bez zera)
+    for pocket in POCKETS[1:]:
+        for kind in ("color", "parity", "dozen", "column"):
+            groups[kind].setdefault(getattr(pocket, kind), []).append(pocket.number)
+
+    # Sasiednie pola na stole (3 kolumny, 12 rzedow) oraz zero z 1, 2, 3
+    splits = [(0, 1), (0, 2), (0, 3)]
+    splits += [(n, n + 1) for n in range(1, 37) if n % 3 != 0]
+    splits += [(n, n + 3) for n in range(1, 34)]
+    for combo in splits:
+        groups["split"][_combo_key(combo)] = list(combo)
+    for n in range(1, 37, 3):
+        combo = (n, n + 1, n + 2)
+        groups["street"][_combo_key(combo)] = list(combo)
+    for n in range(1, 33):
+        if n % 3 != 0:
+            combo = (n, n + 1, n + 3, n + 4)
+            groups["corner"][_combo_key(combo)] = list(combo)
+
+    table = {}
+    for kind, values in groups.items():
+        for value, numbers in values.items():
+            # Wyplata z wkladem: 36 / liczba wygrywajacych pol (jak dotad: x36, x3, x2)
+            table[(kind, value)] = EncodedBet(kind, _mask(numbers), 36 / len(numbers))
+    # Zielony to tylko zero - wyplata jak za numer
+    table[("color", "green")] = EncodedBet("color", _mask([0]), 36.0)
+    return table
+
+
+PAYOUT_TABLE = build_payout_table()
 
 @dataclass
 class GameState:
@@ -17,57 +172,85 @@ class RouletteEngine:
     Klasa zarzadzajaca logiką ruletki
     """
     def __init__(self):
-        # Kolejka dwustronna do historii
+        # Kolejka dwustronna do historii (obiekty SpinResult)
         self.history: deque = deque(maxlen=10)
-        self.red_numbers = {1, 3, 5, 7, 9, 12, 14, 16, 18, 19, 21, 23, 25, 27, 30, 32, 34, 36}
+        # Zwiększana przy każdej zmianie historii (do cache ramek)
+        self.history_version = 0
+        self.red_numbers = RED_NUMBERS
+        # Wspolne, niezmienne rekordy pol (indeks = numer pola)
+        self.pockets = POCKETS
 
     def get_color(self, number: int) -> str:
         """
-        Zwraca kolor dla podanej liczby
+        Zwraca kolor dla podanej liczby (0-36)
         """
-        if number == 0:
-            return "green"
-        return "red" if number in self.red_numbers else "black"
+        return COLORS[number]
 
-    def spin(self) -> Dict[str, Any]:
+    def spin(self) -> SpinResult:
         """
         Losuje liczbę całkowitą w zakresie 0-36
-        Zwraca slownik z wynikiem losowania i kolorem
+        Zwraca wynik losowania (numer, kolor i rekord pola)
         """
-        number = random.randint(0, 36)
-        color = self.get_color(number)
-        
-        result = {"number": number, "color": color}
+        result = SPIN_RESULTS[random.randrange(37)]
         self.history.appendleft(result)
+        self.history_version += 1
         return result
 
+    def history_payload(self) -> List[dict]:
+        """Historia w postaci do JSON (od najnowszego wyniku)"""
+        return [result.payload for result in self.history]
+
+    def load_history(self, items: List[dict]):
+        """Zastepuje historie (np. odebrana od innego procesu)"""
+        self.history.clear()
+        self.history.extend(SPIN_RESULTS[item["number"]] for item in items)
+        self.history_version += 1
+
+    def bet_key(self, bet_type: str, bet_value) -> Optional[str]:
+        """
+        Wartosc zakladu w postaci klucza tabeli wyplat: numery przechodza
+        przez int() ("05" i 5.0 -> "5", "2-1" -> "1-2").
+        Zwraca None, gdy numeru nie da sie odczytac.
+        """
+        try:
+            if bet_type == "number":
+                return str(_to_int(bet_value))
+            if bet_type in ("split", "street", "corner"):
+                return _combo_key(_to_int(n) for n in str(bet_value).split("-"))
+        except (TypeError, ValueError):
+            return None
+        return str(bet_value)
+
+    def encode_bet(self, bet_type: str, bet_value) -> Optional[EncodedBet]:
+        """
+        Koduje zaklad do postaci z tabeli wyplat.
+        Zwraca None dla nieznanego lub niedozwolonego zakladu.
+        """
+        value = self.bet_key(bet_type, bet_value)
+        if value is None:
+            return None
+        return PAYOUT_TABLE.get((bet_type, value))
+
     def calculate_payout(self, bet_type: str, bet_value: str, amount: float, result_number: int) -> float:
         """
         Oblicza wygrana na podstawie zakladu i wyniku
         """
-        result_color = self.get_color(result_number)
-        payout = 0.0
-
-        # Prosta logika wyplat
-        if bet_type == "number":
-            if int(bet_value) == result_number:
-                payout = amount * 36
-        elif bet_type == "color":
-            if bet_value == result_color:
-                multiplier = 36 if bet_value == "green" else 2
-                payout = amount * multiplier
-        elif bet_type == "parity":
-            if result_number != 0:
-                is_even = (result_number % 2 == 0)
-                if (bet_value == "even" and is_even) or (bet_value == "odd" and not is_even):
-                    payout = amount * 2
-        elif bet_type == "dozen":
-            if result_number != 0:
-                if bet_value == "1st 12" and 1 <= result_number <= 12:
-                    payout = amount * 3
-                elif bet_value == "2nd 12" and 13 <= result_number <= 24:
-                    payout = amount * 3
-                elif bet_value == "3rd 12" and 25 <= result_number <= 36:
-                    payout = amount * 3
-        
-        return payout
\ No newline at end of file
+        bet = self.encode_bet(bet_type, bet_value)
+        if bet is None or not (bet.mask >> result_number) & 1:
+            return 0.0
+        return amount * bet.multiplier
+
+    def calculate_payouts(self, masks, multipliers, amounts, result_number: int):
+        """
+        Oblicza wygrane dla calej serii zakodowanych zakladow naraz.
+        Z numpy liczy wektorowo (zwraca tablice), bez niego zwraca liste.
+        """
+        if np is not None:
+            masks = np.asarray(masks, dtype=np.uint64)
+            hits = ((masks >> np.uint64(result_number)) & np.uint64(1)).astype(bool)
+            stakes = np.asarray(amounts, dtype=np.float64) * np.asarray(multipliers, dtype=np.float64)
+            return np.where(hits, stakes, 0.0)
+        return [
+            amount * multiplier if (mask >> result_number) & 1 else 0.0
+            for mask, multiplier, amount in zip(masks, multipliers, amounts)
+        ]
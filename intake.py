@@ -0,0 +1,194 @@
+"""
+Przyjmowanie zakładów z WebSocketów.
+
+Wiadomości place_bet / place_bets trafiają do jednej kolejki. Zadanie
+przetwarzające zbiera z niej wszystko, co się uzbierało, sprawdza zakłady
+(BetRequest), limituje graczy (token bucket) i przekazuje zakłady każdego
+stołu jedną paczką - z jednym wczytaniem sald dla całej paczki.
+Pod koniec obstawiania, gdy wszyscy obstawiają naraz, paczki rosną
+zamiast kolejki zapytań do bazy.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from cluster import coordinator
+from schemas import BetRequest
+
+logger = logging.getLogger(__name__)
+
+# Maksymalna liczba wiadomości z zakładami czekających w kolejce
+INTAKE_QUEUE_SIZE = 4096
+# Maksymalna liczba wiadomości przetwarzanych w jednej paczce
+INTAKE_BATCH_SIZE = 512
+# Maksymalna liczba zakładów w jednej wiadomości place_bets
+MAX_BETS_PER_MESSAGE = 50
+
+# Limit gracza: BET_RATE zakładów na sekundę, chwilowo do BET_BURST
+BET_RATE = 10.0
+BET_BURST = 30.0
+# Powyżej tylu kubełków usuwamy te, które i tak są już pełne
+MAX_BUCKETS = 10000
+
+# Odpowiedź na zakład, którego nie udało się przekazać do stołu (np. chwilowy błąd bazy)
+HANDLER_ERROR = "Nie udało się przyjąć zakładu, spróbuj ponownie"
+
+
+class TokenBucket:
+    """Kubełek z żetonami uzupełnianymi w stałym tempie"""
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+
+
+class RateLimiter:
+    """
+    Limity zakładów graczy (token bucket na gracza).
+    Używany tylko z pętli asyncio, więc bez blokad.
+    """
+    def __init__(self, rate: float = BET_RATE, burst: float = BET_BURST,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.buckets: Dict[int, TokenBucket] = {}
+        self.rejected = 0
+
+    def allow(self, user_id: int, cost: float = 1.0) -> bool:
+        """Pobiera cost żetonów gracza; False, gdy gracz przekroczył limit"""
+        now = self.clock()
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            if len(self.buckets) >= MAX_BUCKETS:
+                self._prune(now)
+            bucket = self.buckets[user_id] = TokenBucket(self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+
+        if bucket.tokens < cost:
+            self.rejected += 1
+            return False
+        bucket.tokens -= cost
+        return True
+
+    def _prune(self, now: float):
+        full_after = self.burst / self.rate
+        for user_id, bucket in list(self.buckets.items()):
+            if now - bucket.updated >= full_after:
+                del self.buckets[user_id]
+
+
+class BetIntake:
+    """
+    Kolejka zakładów z przetwarzaniem paczkami.
+    handler(stół, lista zakładów) -> lista odpowiedzi przyjmuje zakłady stołu
+    (np. coordinator.place_bets).
+    """
+    def __init__(self, handler: Callable, limiter: Optional[RateLimiter] = None,
+                 queue_size: int = INTAKE_QUEUE_SIZE, batch_size: int = INTAKE_BATCH_SIZE):
+        self.handler = handler
+        self.limiter = limiter or RateLimiter()
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batches = 0
+        self.bets = 0
+        self.overloaded = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, table_id: str, raw_bets: List[dict]) -> List[dict]:
+        """
+        Zleca przyjęcie zakładów z jednej wiadomości i czeka na wynik.
+        Zwraca odpowiedź dla każdego zakładu: {"new_balance": ...}, {"error": ...}
+        albo {} gdy obstawianie jest zamknięte.
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((table_id, raw_bets, future))
+        except asyncio.QueueFull:
+            self.overloaded += 1
+            return [{"error": "Serwer jest przeciążony, spróbuj ponownie"} for _ in raw_bets]
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "bets": self.bets,
+            "overloaded": self.overloaded,
+            "rate_limited": self.limiter.rejected,
+        }
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            jobs = [await self._queue.get()]
+            while len(jobs) < self.batch_size and not self._queue.empty():
+                jobs.append(self._queue.get_nowait())
+            try:
+                await self._process(jobs)
+            except Exception:
+                # Błąd paczki nie może zerwać połączeń graczy - każdy zakład dostaje odmowę
+                logger.exception("Nie udało się przetworzyć paczki zakładów")
+                for _, raw_bets, future in jobs:
+                    if not future.done():
+                        future.set_result([{"error": HANDLER_ERROR} for _ in raw_bets])
+            self.batches += 1
+
+    async def _process(self, jobs):
+        replies: List[List[dict]] = []
+        # Poprawne zakłady pogrupowane po stołach: (nr wiadomości, nr zakładu, zakład)
+        by_table: Dict[str, List[Tuple[int, int, dict]]] = {}
+
+        for j, (table_id, raw_bets, _) in enumerate(jobs):
+            job_replies = []
+            for b, raw in enumerate(raw_bets):
+                try:
+                    bet = BetRequest.model_validate(raw)
+                except ValidationError:
+                    job_replies.append({"error": "Nieprawidłowy zakład"})
+                    continue
+                if not self.limiter.allow(bet.user_id):
+                    job_replies.append({"error": "Zbyt wiele zakładów, zwolnij"})
+                    continue
+                job_replies.append({})
+                by_table.setdefault(table_id, []).append((j, b, bet.model_dump()))
+            replies.append(job_replies)
+
+        tables = list(by_table)
+        results = await asyncio.gather(*(
+            self._handle(table_id, [bet for _, _, bet in by_table[table_id]])
+            for table_id in tables
+        ))
+        for table_id, table_replies in zip(tables, results):
+            for (j, b, _), reply in zip(by_table[table_id], table_replies):
+                replies[j][b] = reply
+            self.bets += len(table_replies)
+
+        for (_, _, future), job_replies in zip(jobs, replies):
+            if not future.done():
+                future.set_result(job_replies)
+
+    async def _handle(self, table_id: str, bets: List[dict]) -> List[dict]:
+        """Zakłady jednego stołu; błąd stołu nie dotyczy zakładów na innych stołach"""
+        try:
+            return await self.handler(table_id, bets)
+        except Exception:
+            logger.exception("Nie udało się przyjąć zakładów stołu %s", table_id)
+            return [{"error": HANDLER_ERROR} for _ in bets]
+
+
+# Wspólna kolejka zakładów procesu (zakłady trafiają do lidera rundy)
+bet_intake = BetIntake(coordinator.place_bets)
@@ -0,0 +1,199 @@
+"""
+Dziennik rund - dokończenie rundy przerwanej awarią procesu.
+
+Lider zapisuje w bazie otwarcie rundy, każdą paczkę przyjętych zakładów
+(zanim gracz dostanie potwierdzenie) i wylosowany numer. Zapisy idą przez
+db_writer, więc są łączone w transakcje z innymi zapisami (group commit).
+Rozliczenie rundy oznacza ją jako settled i usuwa jej zakłady z dziennika
+w tej samej transakcji - dziennik zawiera więc tylko rundy nierozliczone,
+a czas odtwarzania nie zależy od liczby rozegranych rund.
+
+Przy starcie (albo przejęciu roli lidera) recover():
+- rundę wylosowaną, ale nierozliczoną rozlicza zapisanym numerem,
+- rundę przerwaną w trakcie obstawiania anuluje i zwraca graczom stawki
+  (pobrane z sald razem z zapisem zakładów w dzienniku).
+"""
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from bets import BetBook, build_settlement, credit_balances, take_stakes, write_round_result
+from database import SessionLocal, db_writer
+from game_engine import RouletteEngine, SPIN_RESULTS, SpinResult
+from models import Round, JournalBet, SpinHistory
+
+logger = logging.getLogger(__name__)
+
+# Długość odtwarzanej historii stołu (jak RouletteEngine.history)
+HISTORY_SIZE = 10
+
+
+def _open_round(db: Session, table_id: str) -> int:
+    return db.execute(insert(Round).values(table_id=table_id, status="open")).inserted_primary_key[0]
+
+
+def _record_bets(db: Session, round_id: int, bets: List[dict]) -> List[Optional[int]]:
+    stakes: Dict[int, float] = {}
+    for bet in bets:
+        stakes[bet["user_id"]] = stakes.get(bet["user_id"], 0.0) + bet["amount"]
+    short = take_stakes(db, stakes)
+    taken = [bet for bet in bets if bet["user_id"] not in short]
+    ids = iter(db.scalars(insert(JournalBet).returning(JournalBet.id, sort_by_parameter_order=True), [
+        {
+            "round_id": round_id,
+            "user_id": bet["user_id"],
+            "bet_type": bet["bet_type"],
+            "value": str(bet["value"]),
+            "amount": bet["amount"],
+        }
+        for bet in taken
+    ]).all() if taken else [])
+    return [None if bet["user_id"] in short else next(ids) for bet in bets]
+
+
+def _refund_bets(db: Session, condition) -> Set[int]:
+    """Zwraca graczom stawki wybranych wpisów dziennika i usuwa te wpisy"""
+    refunds = dict(db.execute(
+        select(JournalBet.user_id, func.sum(JournalBet.amount)).where(condition).group_by(JournalBet.user_id)
+    ).all())
+    credit_balances(db, refunds)
+    db.execute(delete(JournalBet).where(condition))
+    return set(refunds)
+
+
+def _cancel_bets(db: Session, bet_ids: List[int]):
+    _refund_bets(db, JournalBet.id.in_(bet_ids))
+
+
+def _void_round(db: Session, round_id: int) -> Set[int]:
+    db.execute(update(Round).where(Round.id == round_id).values(status="void"))
+    return _refund_bets(db, JournalBet.round_id == round_id)
+
+
+def _record_result(db: Session, round_id: int, number: int):
+    db.execute(update(Round).where(Round.id == round_id).values(status="drawn", winning_number=number))
+
+
+class RoundJournal:
+    """Zapisy dziennika wykonywane przez pętlę gry lidera"""
+
+    async def open_round(self, table_id: str) -> int:
+        """Zapisuje otwarcie rundy stołu; zwraca jej id"""
+        return await db_writer.submit(_open_round, table_id)
+
+    async def record_bets(self, round_id: int, bets: List[dict]) -> List[Optional[int]]:
+        """
+        Zapisuje paczkę przyjętych zakładów (przed wysłaniem potwierdzeń)
+        i w tej samej transakcji pobiera stawki z sald. Zwraca id wpisów
+        dziennika w kolejności zakładów; None dla zakładów gracza, którego
+        saldo w bazie nie pokrywa stawek (nic nie zostało zapisane ani pobrane).
+        """
+        if not bets:
+            return []
+        return await db_writer.submit(_record_bets, round_id, bets)
+
+    async def cancel_bets(self, bet_ids: List[int]):
+        """
+        Usuwa z dziennika zakłady odrzucone już po zapisie (obstawianie
+        zamknęło się w trakcie) i zwraca ich stawki - odtwarzanie rundy
+        nie może ich rozliczyć
+        """
+        if bet_ids:
+            await db_writer.submit(_cancel_bets, bet_ids)
+
+    async def record_result(self, round_id: int, number: int):
+        """Zapisuje wylosowany numer przed rozliczeniem rundy"""
+        await db_writer.submit(_record_result, round_id, number)
+
+    async def void_round(self, round_id: int) -> Set[int]:
+        """
+        Anuluje rundę przerwaną błędem i zwraca stawki jej zakładów.
+        Zwraca graczy, których salda się zmieniły.
+        """
+        return await db_writer.submit(_void_round, round_id)
+
+    def recover(self) -> Tuple[List[Tuple[str, SpinResult]], int, Set[int]]:
+        """
+        Kończy rundy przerwane awarią (wywoływane w wątku bazy przed startem
+        pętli gry). Zwraca rozliczone rundy (stół, wynik), liczbę anulowanych
+        rund i graczy, których salda się zmieniły.
+        """
+        settled: List[Tuple[str, SpinResult]] = []
+        voided = 0
+        users: Set[int] = set()
+        engine = RouletteEngine()
+
+        db = SessionLocal()
+        try:
+            rounds = db.execute(
+                select(Round.id, Round.table_id, Round.status, Round.winning_number)
+                .where(Round.status.in_(("open", "drawn")))
+                .order_by(Round.id)
+            ).all()
+            for round_id, table_id, status, number in rounds:
+                if status == "drawn" and number is not None:
+                    book = BetBook()
+                    bets = db.execute(select(JournalBet).where(JournalBet.round_id == round_id)).scalars()
+                    for bet in bets:
+                        encoded = engine.encode_bet(bet.bet_type, bet.value)
+                        if encoded is not None:
+                            book.add(bet.user_id, bet.bet_type, bet.value, bet.amount, encoded)
+                    result = SPIN_RESULTS[number]
+                    winnings, deltas, bet_rows = build_settlement(book, engine, result)
+                    write_round_result(db, result, winnings, bet_rows, round_id)
+                    settled.append((table_id, result))
+                    users.update(deltas)
+                else:
+                    users.update(_void_round(db, round_id))
+                    voided += 1
+                db.commit()
+        finally:
+            db.close()
+
+        if settled or voided:
+            logger.warning("Dziennik rund: rozliczono %d, anulowano %d przerwanych rund",
+                           len(settled), voided)
+        return settled, voided, users
+
+
+def load_recent_history(table_ids: List[str], default_table: str,
+                        size: int = HISTORY_SIZE) -> Dict[str, List[dict]]:
+    """
+    Ostatnie size wyników każdego stołu (od najnowszego) jednym zapytaniem do spin_history.
+    Losowania sprzed dziennika rund (bez wpisu w rounds) należą do stołu domyślnego.
+    Przeszukiwane jest tylko kilka ostatnich losowań na stół, nie cała tabela.
+    """
+    table = func.coalesce(Round.table_id, default_table)
+    window = size * max(1, len(table_ids)) * 4
+    newest = select(func.max(SpinHistory.id)).scalar_subquery()
+    ranked = (
+        select(
+            table.label("table_id"),
+            SpinHistory.winning_number,
+            func.row_number().over(partition_by=table, order_by=SpinHistory.id.desc()).label("position"),
+        )
+        .select_from(SpinHistory)
+        .outerjoin(Round, Round.spin_id == SpinHistory.id)
+        .where(SpinHistory.id > newest - window)
+        .subquery()
+    )
+    query = (
+        select(ranked.c.table_id, ranked.c.winning_number)
+        .where(ranked.c.position <= size)
+        .order_by(ranked.c.table_id, ranked.c.position)
+    )
+
+    history: Dict[str, List[dict]] = {table_id: [] for table_id in table_ids}
+    db = SessionLocal()
+    try:
+        for table_id, number in db.execute(query):
+            if table_id in history and number is not None and 0 <= number <= 36:
+                history[table_id].append(SPIN_RESULTS[number].to_dict())
+    finally:
+        db.close()
+    return history
+
+
+round_journal = RoundJournal()
@@ -0,0 +1,565 @@
+"""
+Test obciążeniowy pętli gry (WebSocket) i API.
+
+Uruchamia aplikację (domyślnie osobny proces uvicorn z tymczasową bazą,
+--in-process w tym samym procesie, albo --url dla działającego serwera),
+rejestruje graczy i otwiera wielu klientów /ws/game, którzy obstawiają
+w fazie obstawiania. Mierzy:
+- czas połączenia do ramki init (razem z ponowieniami po odesłaniu przez serwer),
+- spóźnienie zmiany fazy względem ogłoszonego końca obstawiania (jitter zegara gry),
+- rozrzut dostarczenia tej samej ramki do wszystkich klientów,
+- czas od wysłania zakładu do potwierdzenia,
+- czas rozliczenia rundy (od końca losowania do ramki z wynikiem),
+- czas odpowiedzi logowania i /api/me,
+- pamięć serwera na jedno połączenie.
+
+Raport (JSON) zawiera commit i parametry testu, a --compare wypisuje zmiany
+względem wcześniejszego raportu, więc wyniki można porównywać między commitami.
+
+Użycie:
+    python loadtest.py --clients 1000 --rounds 3 --output raport.json
+    python loadtest.py --clients 1000 --rounds 3 --compare raport.json
+    python loadtest.py --url http://127.0.0.1:8000 --betting-time 20 --clients 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Ile klientów jednocześnie nawiązuje połączenie / loguje się
+CONNECT_CONCURRENCY = 100
+LOGIN_CONCURRENCY = 8
+# Zakłady nie są wysyłane później niż tyle ms przed końcem obstawiania
+BET_MARGIN_MS = 500
+PASSWORD = "loadtest"
+
+
+def now_ms() -> float:
+    return time.time() * 1000
+
+
+def summarize(values: List[float]) -> dict:
+    """Liczba, średnia i percentyle serii pomiarów"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def read_rss_kb(pid: Optional[int]) -> Optional[int]:
+    """Pamięć rezydentna procesu w KB (tylko Linux)"""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=HERE,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def raise_fd_limit(needed: int):
+    """Podnosi limit otwartych plików, żeby zmieścić wszystkie połączenia"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+class Metrics:
+    """Pomiary zbierane przez wszystkich klientów"""
+    def __init__(self):
+        self.connect_ms: List[float] = []
+        self.login_ms: List[float] = []
+        self.me_ms: List[float] = []
+        self.phase_lateness_ms: List[float] = []
+        self.bet_latency_ms: List[float] = []
+        self.settlement_ms: List[float] = []
+        # (typ ramki, deadline rundy) -> czasy odbioru u kolejnych klientów
+        self.deliveries: Dict[tuple, List[float]] = {}
+        self.bets_sent = 0
+        self.bets_confirmed = 0
+        self.bets_unanswered = 0
+        self.errors: Dict[str, int] = {}
+        self.connect_failed = 0
+        self.connect_retries = 0
+        self.disconnected = 0
+        self.ready = 0
+        self.all_ready = asyncio.Event()
+
+    def delivered(self, kind: str, deadline: int, received: float):
+        self.deliveries.setdefault((kind, deadline), []).append(received)
+
+    def error(self, message: str):
+        self.errors[message] = self.errors.get(message, 0) + 1
+
+    def fanout_spread(self) -> List[float]:
+        return [max(times) - min(times) for times in self.deliveries.values() if len(times) > 1]
+
+
+# Serwer
+
+class SpawnedServer:
+    """uvicorn w osobnym procesie z tymczasową bazą SQLite"""
+    def __init__(self, args):
+        self.args = args
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.tmpdir = tempfile.TemporaryDirectory(prefix="roulette-loadtest-")
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    async def start(self):
+        env = dict(os.environ, **server_env(self.args, self.tmpdir.name))
+        command = [sys.executable, "-m", "uvicorn", "main:app",
+                   "--port", str(self.port), "--log-level", "warning"]
+        if self.args.no_deflate:
+            command += ["--ws-per-message-deflate", "false"]
+        self.process = subprocess.Popen(command, cwd=HERE, env=env, stdout=subprocess.DEVNULL)
+        await wait_until_up(self.url)
+
+    async def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.tmpdir.cleanup()
+
+
+class InProcessServer:
+    """
+    uvicorn w tej samej pętli asyncio co klienci. Pomiar pamięci
+    obejmuje wtedy też klientów, a serwer dzieli z nimi procesor.
+    """
+    def __init__(self, args):
+        self.args = args
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.tmpdir = tempfile.TemporaryDirectory(prefix="roulette-loadtest-")
+        self.pid = os.getpid()
+        self.server = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        # Konfiguracja bazy i długości rundy jest czytana przy imporcie modułów aplikacji
+        os.environ.update(server_env(self.args, self.tmpdir.name))
+        os.chdir(HERE)
+        sys.path.insert(0, HERE)
+        import uvicorn
+        import main
+
+        config = uvicorn.Config(main.app, host="127.0.0.1", port=self.port, log_level="warning",
+                                ws_per_message_deflate=not self.args.no_deflate)
+        self.server = uvicorn.Server(config)
+        self.task = asyncio.create_task(self.server.serve())
+        await wait_until_up(self.url)
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.should_exit = True
+            await self.task
+        self.tmpdir.cleanup()
+
+
+class ExternalServer:
+    """Działający już serwer (--url); pamięć mierzona, gdy podano --server-pid"""
+    def __init__(self, args):
+        self.url = args.url.rstrip("/")
+        self.pid = args.server_pid
+
+    async def start(self):
+        await wait_until_up(self.url)
+
+    async def stop(self):
+        pass
+
+
+def server_env(args, tmpdir: str) -> Dict[str, str]:
+    return {
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmpdir, 'loadtest.db')}",
+        "ROULETTE_BETTING_TIME": str(args.betting_time),
+        "ROULETTE_ROLLING_TIME": str(args.rolling_time),
+        "ROULETTE_RESULT_TIME": str(args.result_time),
+    }
+
+
+async def wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as http:
+        while True:
+            try:
+                if (await http.get("/api/tables")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Serwer {url} nie odpowiada")
+            await asyncio.sleep(0.2)
+
+
+# Gracze
+
+async def sign_in(http: httpx.AsyncClient, username: str, metrics: Metrics) -> dict:
+    """Rejestruje gracza (albo loguje, jeśli już istnieje); ponawia po 429"""
+    payload = {"username": username, "password": PASSWORD}
+    path = "/register"
+    while True:
+        started = now_ms()
+        response = await http.post(path, json=payload)
+        if response.status_code == 429:
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+            continue
+        if response.status_code == 400 and path == "/register":
+            path = "/login"
+            continue
+        response.raise_for_status()
+        metrics.login_ms.append(now_ms() - started)
+        data = response.json()
+        return {"token": data["access_token"], "user_id": data["user"]["id"]}
+
+
+async def sign_in_all(http: httpx.AsyncClient, count: int, metrics: Metrics) -> List[dict]:
+    limit = asyncio.Semaphore(LOGIN_CONCURRENCY)
+
+    async def one(i: int) -> dict:
+        async with limit:
+            return await sign_in(http, f"loadtest{i}", metrics)
+
+    return await asyncio.gather(*(one(i) for i in range(count)))
+
+
+def random_bet(user_id: int) -> dict:
+    if random.random() < 0.5:
+        return {"user_id": user_id, "bet_type": "color",
+                "value": random.choice(("red", "black")), "amount": 1}
+    return {"user_id": user_id, "bet_type": "number", "value": random.randint(0, 36), "amount": 1}
+
+
+async def place_bets(ws, user_id: int, deadline: int, args, pending: deque, metrics: Metrics):
+    """Wysyła zakłady rundy w losowych chwilach fazy obstawiania"""
+    window = max(0.0, (deadline - now_ms() - BET_MARGIN_MS) / 1000)
+    delays = []
+    for _ in range(args.bets):
+        if random.random() < args.rush:
+            # Zakład w ostatniej sekundzie obstawiania
+            delays.append(window - random.uniform(0, min(1.0, window)))
+        else:
+            delays.append(random.uniform(0, window))
+
+    started = time.monotonic()
+    for delay in sorted(delays):
+        await asyncio.sleep(max(0.0, started + delay - time.monotonic()))
+        if args.batch > 1:
+            message = {"type": "place_bets", "bets": [random_bet(user_id) for _ in range(args.batch)]}
+        else:
+            message = {"type": "place_bet", **random_bet(user_id)}
+        pending.append(now_ms())
+        metrics.bets_sent += args.batch
+        await ws.send(json.dumps(message))
+
+
+async def fetch_me(http: httpx.AsyncClient, token: str, metrics: Metrics):
+    started = now_ms()
+    try:
+        response = await http.get("/api/me", headers={"Authorization": f"Bearer {token}"})
+        if response.status_code == 200:
+            metrics.me_ms.append(now_ms() - started)
+        else:
+            metrics.error(f"/api/me {response.status_code}")
+    except httpx.HTTPError as e:
+        metrics.error(f"/api/me {type(e).__name__}")
+
+
+async def connect(ws_url: str, args, metrics: Metrics, connect_limit: asyncio.Semaphore):
+    """
+    Łączy klienta i czeka na ramkę init. Klient odesłany przez kontrolę
+    przyjęć (zamknięcie 1013 "retry=<ms>") czeka wskazany czas i próbuje ponownie.
+    """
+    while True:
+        async with connect_limit:
+            ws = await websockets.connect(
+                ws_url, compression=None if args.no_deflate else "deflate",
+                max_size=None, open_timeout=60, ping_interval=None
+            )
+            try:
+                await ws.recv()
+                return ws
+            except websockets.ConnectionClosed as e:
+                reason = e.rcvd.reason if e.rcvd is not None else ""
+                if not reason.startswith("retry="):
+                    raise
+        metrics.connect_retries += 1
+        await asyncio.sleep(int(reason[len("retry="):]) / 1000)
+
+
+async def player(ws_url: str, http: httpx.AsyncClient, account: dict, args, metrics: Metrics,
+                 connect_limit: asyncio.Semaphore):
+    """Jeden klient: łączy się, obstawia w kolejnych rundach i mierzy czasy"""
+    try:
+        started = now_ms()
+        ws = await connect(ws_url, args, metrics, connect_limit)
+        metrics.connect_ms.append(now_ms() - started)
+        ready(metrics, args)
+    except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+        metrics.connect_failed += 1
+        metrics.error(f"connect {type(e).__name__}")
+        ready(metrics, args)
+        return
+
+    pending: deque = deque()
+    tasks: List[asyncio.Task] = []
+    deadline = None
+    rolling_at = None
+    rounds = 0
+    try:
+        async for raw in ws:
+            received = now_ms()
+            message = json.loads(raw)
+            kind = message.get("type")
+
+            if kind == "ping":
+                await ws.send('{"type": "pong"}')
+            elif kind == "round_start":
+                deadline = message["deadline"]
+                rolling_at = None
+                metrics.delivered("round_start", deadline, received)
+                tasks.append(asyncio.create_task(
+                    place_bets(ws, account["user_id"], deadline, args, pending, metrics)))
+                tasks.append(asyncio.create_task(fetch_me(http, account["token"], metrics)))
+            elif kind == "status" and deadline is not None:
+                rolling_at = received
+                metrics.phase_lateness_ms.append(received - deadline)
+                metrics.delivered("rolling", deadline, received)
+                # Zakład bez odpowiedzi (obstawianie zamknięte) nie może przesunąć kolejki
+                metrics.bets_unanswered += len(pending)
+                pending.clear()
+            elif kind == "result" and rolling_at is not None:
+                metrics.settlement_ms.append(received - rolling_at - args.rolling_time * 1000)
+                metrics.delivered("result", deadline, received)
+                rounds += 1
+                if rounds >= args.rounds:
+                    break
+            elif kind in ("bet_confirmed", "bets_result", "error"):
+                if pending:
+                    metrics.bet_latency_ms.append(received - pending.popleft())
+                if kind == "bet_confirmed":
+                    metrics.bets_confirmed += 1
+                elif kind == "bets_result":
+                    for result in message["results"]:
+                        if result["ok"]:
+                            metrics.bets_confirmed += 1
+                        else:
+                            metrics.error(result["message"])
+                else:
+                    metrics.error(message.get("message", "error"))
+    except websockets.ConnectionClosed:
+        metrics.disconnected += 1
+    finally:
+        for task in tasks:
+            task.cancel()
+        await ws.close()
+
+
+def ready(metrics: Metrics, args):
+    metrics.ready += 1
+    if metrics.ready >= args.clients:
+        metrics.all_ready.set()
+
+
+# Raport
+
+async def run(args) -> dict:
+    if args.url:
+        server = ExternalServer(args)
+    elif args.in_process:
+        server = InProcessServer(args)
+    else:
+        server = SpawnedServer(args)
+
+    raise_fd_limit(args.clients * 2 + 256)
+    metrics = Metrics()
+    started = time.monotonic()
+    await server.start()
+    try:
+        limits = httpx.Limits(max_connections=CONNECT_CONCURRENCY)
+        async with httpx.AsyncClient(base_url=server.url, timeout=60, limits=limits) as http:
+            accounts = await sign_in_all(http, min(args.users, args.clients), metrics)
+            rss_before = read_rss_kb(server.pid)
+
+            ws_url = server.url.replace("http", "ws", 1) + "/ws/game"
+            connect_limit = asyncio.Semaphore(CONNECT_CONCURRENCY)
+            players = asyncio.gather(*(
+                player(ws_url, http, accounts[i % len(accounts)], args, metrics, connect_limit)
+                for i in range(args.clients)
+            ))
+            round_length = args.betting_time + args.rolling_time + args.result_time
+            try:
+                await asyncio.wait_for(asyncio.shield(metrics.all_ready.wait()), 120)
+                rss_after = read_rss_kb(server.pid)
+                await asyncio.wait_for(players, (args.rounds + 1) * (round_length + 10) + 60)
+            except asyncio.TimeoutError:
+                players.cancel()
+                metrics.error("timeout")
+                rss_after = read_rss_kb(server.pid)
+    finally:
+        await server.stop()
+
+    connected = args.clients - metrics.connect_failed
+    per_connection = None
+    if rss_before is not None and rss_after is not None and connected:
+        per_connection = round((rss_after - rss_before) / connected, 2)
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "mode": "url" if args.url else "in-process" if args.in_process else "spawn",
+            "clients": args.clients,
+            "users": min(args.users, args.clients),
+            "rounds": args.rounds,
+            "bets_per_round": args.bets,
+            "batch": args.batch,
+            "rush": args.rush,
+            "betting_time": args.betting_time,
+            "deflate": not args.no_deflate,
+        },
+        "duration_s": round(time.monotonic() - started, 1),
+        "connect_ms": summarize(metrics.connect_ms),
+        "login_ms": summarize(metrics.login_ms),
+        "me_ms": summarize(metrics.me_ms),
+        "phase_lateness_ms": summarize(metrics.phase_lateness_ms),
+        "fanout_spread_ms": summarize(metrics.fanout_spread()),
+        "bet_latency_ms": summarize(metrics.bet_latency_ms),
+        "settlement_ms": summarize(metrics.settlement_ms),
+        "bets": {
+            "sent": metrics.bets_sent,
+            "confirmed": metrics.bets_confirmed,
+            "unanswered": metrics.bets_unanswered,
+        },
+        "connections": {
+            "failed": metrics.connect_failed,
+            "retries": metrics.connect_retries,
+            "dropped": metrics.disconnected,
+        },
+        "memory_kb": {
+            "rss_before": rss_before,
+            "rss_after": rss_after,
+            "per_connection": per_connection,
+        },
+        "errors": metrics.errors,
+    }
+
+
+def flatten(report: dict, prefix: str = "") -> Dict[str, float]:
+    values = {}
+    for key, value in report.items():
+        if key in ("meta", "errors"):
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def compare(old: dict, new: dict) -> str:
+    """Tabela zmian wartości liczbowych między dwoma raportami"""
+    old_values, new_values = flatten(old), flatten(new)
+    lines = [f"{'pomiar':<32}{old.get('meta', {}).get('revision') or 'poprzedni':>14}"
+             f"{new['meta']['revision'] or 'obecny':>14}{'zmiana':>10}"]
+    for key, value in new_values.items():
+        if key not in old_values:
+            continue
+        before = old_values[key]
+        change = f"{(value - before) / before * 100:+.1f}%" if before else "-"
+        lines.append(f"{key:<32}{before:>14}{value:>14}{change:>10}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test obciążeniowy ruletki")
+    parser.add_argument("--clients", type=int, default=500, help="liczba połączeń WebSocket")
+    parser.add_argument("--users", type=int, default=100, help="liczba kont graczy (klienci dzielą konta)")
+    parser.add_argument("--rounds", type=int, default=3, help="liczba mierzonych rund")
+    parser.add_argument("--bets", type=int, default=2, help="wiadomości z zakładami na klienta w rundzie")
+    parser.add_argument("--batch", type=int, default=1, help="zakładów w wiadomości (>1 wysyła place_bets)")
+    parser.add_argument("--rush", type=float, default=0.3,
+                        help="część zakładów wysyłana w ostatniej sekundzie obstawiania")
+    parser.add_argument("--betting-time", type=int, default=5)
+    parser.add_argument("--rolling-time", type=int, default=1)
+    parser.add_argument("--result-time", type=int, default=2)
+    parser.add_argument("--url", help="adres działającego serwera zamiast uruchamiania własnego")
+    parser.add_argument("--server-pid", type=int, help="pid serwera z --url (do pomiaru pamięci)")
+    parser.add_argument("--in-process", action="store_true", help="serwer w tym samym procesie")
+    parser.add_argument("--no-deflate", action="store_true", help="bez kompresji permessage-deflate")
+    parser.add_argument("--output", help="zapis raportu JSON do pliku")
+    parser.add_argument("--compare", help="raport JSON do porównania")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare) as previous:
+            print(compare(json.load(previous), report))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,35 @@
 import asyncio
 import json
-from datetime import datetime
-from typing import List
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import threading
+import time
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
-from database import engine, Base, SessionLocal
-from models import User, SpinHistory
-from game_engine import RouletteEngine
-from security import get_password_hash
-from api_routes import router as api_router
+from admin_feed import admin_feed
+from admission import admission, RETRY_CLOSE_CODE
+from database import engine, Base, SessionLocal, db_writer, run_in_db
+from models import User
+from stats import spin_stats, leaderboard, ROLLING_WINDOW
+from security import password_hasher, HashPoolSaturated
+from api_routes import router as api_router, get_current_user
+from cache import UserSnapshot, user_cache
+from cluster import coordinator
+from frames import msgpack
+from intake import bet_intake, MAX_BETS_PER_MESSAGE
+from journal import round_journal, load_recent_history, HISTORY_SIZE
+from metrics import registry as metrics_registry, BET_LATENCY_SECONDS, BET_QUEUE, HASH_PENDING, WS_CONNECTIONS
+from profiler import profiler
+from retention import retention_job
+from tables import registry, Table, DEFAULT_TABLE
 
 # Inicjalizacja bazy danych
 Base.metadata.create_all(bind=engine)
+# create_all pomija istniejące tabele - indeksy dodane później tworzymy osobno
+for db_table in Base.metadata.sorted_tables:
+    for index in db_table.indexes:
+        index.create(bind=engine, checkfirst=True)
 
 # Inicjalizacja aplikacji
 app = FastAPI()
@@ -21,184 +38,381 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # Dołączanie routera z endpointami
 app.include_router(api_router)
 
-# Silnik gry
-game_engine = RouletteEngine()
 
-# Lista aktywnych zakładów
-ACTIVE_BETS = []
+@app.get("/api/admin/ws-stats")
+def get_ws_stats(current_user: UserSnapshot = Depends(get_current_user)):
+    """Statystyki połączeń WebSocket i opóźnień rozsyłania (per stół)"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Brak uprawnień")
+    return {table.id: table.manager.stats() for table in registry.tables.values()}
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+@app.get("/api/admin/bet-stats")
+def get_bet_stats(current_user: UserSnapshot = Depends(get_current_user)):
+    """Stan kolejki przyjmowania zakładów (paczki, odrzucone przez limit)"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Brak uprawnień")
+    return bet_intake.stats()
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
 
-    async def broadcast(self, message: dict):
-        message["server_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                pass
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Metryki procesu w formacie tekstowym Prometheusa"""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+WS_CONNECTIONS.set_function(
+    lambda: {(table.id,): len(table.manager.active_connections) for table in registry.tables.values()}
+)
+BET_QUEUE.set_function(lambda: bet_intake.stats()["queued"])
+HASH_PENDING.set_function(lambda: password_hasher.pending)
+
+
+@app.post("/api/admin/profiler/start")
+async def start_profiler(
+    interval_ms: float = Query(5.0, ge=1.0, le=1000.0),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Włącza profiler próbkujący wątek pętli gry (poprzedni pomiar jest usuwany)"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Brak uprawnień")
+    # Funkcja async, więc działa w wątku pętli asyncio - ten wątek jest próbkowany.
+    # Sam start (zatrzymanie poprzedniego pomiaru) idzie w wątku puli.
+    await run_in_threadpool(profiler.start, interval_ms / 1000, threading.get_ident())
+    return profiler.stats()
+
+
+@app.post("/api/admin/profiler/stop")
+async def stop_profiler(current_user: UserSnapshot = Depends(get_current_user)):
+    """Wyłącza profiler"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Brak uprawnień")
+    # join() wątku profilera nie może blokować pętli asyncio
+    await run_in_threadpool(profiler.stop)
+    return profiler.stats()
+
+
+@app.get("/api/admin/profiler", response_class=PlainTextResponse)
+def get_profile(
+    limit: int = Query(200, ge=1, le=10000),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Zebrane stosy w formacie collapsed stacks (np. dla flamegraph.pl)"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Brak uprawnień")
+    return profiler.collapsed(limit)
+
+
+@app.get("/api/tables")
+def get_tables():
+    """Lista stołów z ich stanem i liczbą graczy"""
+    return registry.summary()
+
+
+def load_usernames(user_ids: list) -> dict:
+    db = SessionLocal()
+    try:
+        return dict(db.query(User.id, User.username).filter(User.id.in_(user_ids)).all())
+    finally:
+        db.close()
+
 
-manager = ConnectionManager()
+@app.get("/api/stats")
+async def get_table_stats(table: str = DEFAULT_TABLE):
+    """
+    Statystyki kroczące stołu (gorące i zimne numery, serie) i ranking
+    największych wygranych. Liczone w pamięci przy każdym losowaniu;
+    baza jest pytana tylko o nazwy nowych graczy w rankingu.
+    """
+    current = registry.get(table)
+    if current is None:
+        raise HTTPException(status_code=404, detail="Nieznany stół")
+    missing = leaderboard.missing_names()
+    if missing:
+        leaderboard.names.update(await run_in_db(load_usernames, missing))
+    return {"table": current.id, **current.stats.summary(), "leaderboard": leaderboard.top()}
 
 
 # WebSocket
 
-CURRENT_GAME_STATE = {"status": "waiting", "time_left": 10}
+def describe_bet(bet_type: str, bet_value, amount: float) -> str:
+    """Opis zakładu wyświetlany graczowi"""
+    bet_description = f"{amount} PLN na "
+    if bet_type == "number":
+        bet_description += f"numer {bet_value}"
+    elif bet_type == "color":
+        color_names = {"red": "CZERWONY", "black": "CZARNY", "green": "ZIELONY"}
+        bet_description += color_names.get(bet_value, bet_value)
+    elif bet_type == "parity":
+        parity_names = {"even": "PARZYSTE", "odd": "NIEPARZYSTE"}
+        bet_description += parity_names.get(bet_value, bet_value)
+    elif bet_type == "dozen":
+        bet_description += f"tuzin {bet_value}"
+    elif bet_type == "column":
+        bet_description += f"kolumna {bet_value}"
+    elif bet_type in ("split", "street", "corner"):
+        bet_description += f"{bet_type} {bet_value}"
+    return bet_description
+
+
+async def accept_bets(table_id: str, bets: list) -> list:
+    """Przyjmuje paczkę zakładów na wskazanym stole (wywoływane tylko w liderze)"""
+    table = registry.get(table_id)
+    if table is None:
+        return [{"error": "Nieznany stół"} for _ in bets]
+    return await table.accept_bets(bets)
+
+
+async def table_broadcast(table_id: str, frame: str):
+    """Rozsyła ramkę do lokalnych klientów stołu"""
+    table = registry.get(table_id)
+    if table is not None:
+        await table.manager.broadcast_frame(frame)
+
+
+async def receive_history(table_id: str, history: list, result, winners: dict):
+    """Historia, wynik i wygrane stołu odebrane od lidera (w procesach followerów)"""
+    table = registry.get(table_id)
+    if table is not None:
+        table.engine.load_history(history)
+        await table.manager.notify_winners(winners)
+    if result is not None:
+        spin_stats.record(result["number"], result["color"])
+        leaderboard.record(table_id, winners)
+        if table is not None:
+            table.stats.record(result["number"], result["color"])
+
 
 @app.websocket("/ws/game")
 async def websocket_endpoint(websocket: WebSocket):
+    await play(websocket, registry.get(DEFAULT_TABLE))
+
+
+@app.websocket("/ws/game/{table_id}")
+async def table_websocket_endpoint(websocket: WebSocket, table_id: str):
+    table = registry.get(table_id)
+    if table is None:
+        await websocket.close(code=4404)
+        return
+    await play(websocket, table)
+
+
+@app.websocket("/ws/admin")
+async def admin_websocket_endpoint(websocket: WebSocket):
+    """
+    Zdarzenia na żywo dla panelu administratora. Przeglądarka nie ustawi
+    nagłówka Authorization dla WebSocketu, więc token jest w ?token=.
+    """
+    try:
+        user = await run_in_threadpool(get_current_user, f"Bearer {websocket.query_params.get('token', '')}")
+    except HTTPException:
+        user = None
+    if user is None or not user.is_admin:
+        await websocket.close(code=4403)
+        return
+
+    manager = admin_feed.manager
     await manager.connect(websocket)
     try:
-        await websocket.send_json({
-            "type": "init", 
-            "history": list(game_engine.history),
-            "server_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
+        await manager.send_frame(websocket, admin_feed.snapshot())
+        while True:
+            # Panel tylko odbiera zdarzenia i odpowiada pong na ping
+            await websocket.receive_text()
+            manager.touch(websocket)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect(websocket)
+
+
+async def play(websocket: WebSocket, table: Table):
+    """
+    Obsługa klienta podłączonego do stołu.
+    Parametr ?format=msgpack wybiera ramki binarne (jeśli msgpack jest zainstalowany).
+    """
+    retry_after = admission.admit(registry.connections())
+    if retry_after is not None:
+        # Zamknięcie zaraz po przyjęciu - przeglądarka widzi tylko kod i powód zamknięcia
+        await websocket.accept()
+        await websocket.close(code=RETRY_CLOSE_CODE, reason=f"retry={int(retry_after * 1000)}")
+        return
+
+    manager = table.manager
+    binary = websocket.query_params.get("format") == "msgpack" and msgpack is not None
+    await manager.connect(websocket, binary)
+    try:
+        await manager.send_frame(websocket, table.init_snapshot.frame(table.round_state()))
         while True:
             data_text = await websocket.receive_text()
-            data = json.loads(data_text)
+            # Każda wiadomość (także pong na ping) potwierdza, że klient żyje
+            manager.touch(websocket)
+            try:
+                data = json.loads(data_text)
+            except ValueError:
+                continue
+            if not isinstance(data, dict):
+                continue
 
             if data.get("type") == "place_bet":
-                if CURRENT_GAME_STATE["status"] != "betting":
+                await place_bets(websocket, table, [data], single=True)
+            elif data.get("type") == "place_bets":
+                bets = data.get("bets")
+                if not isinstance(bets, list) or not 0 < len(bets) <= MAX_BETS_PER_MESSAGE:
+                    await manager.send_personal(websocket, {
+                        "type": "error",
+                        "message": f"Wiadomość może zawierać od 1 do {MAX_BETS_PER_MESSAGE} zakładów"
+                    })
                     continue
-                
-                user_id = data.get("user_id")
-                amount = float(data.get("amount"))
-                bet_type = data.get("bet_type")
-                bet_value = data.get("value")
-                
-                from database import SessionLocal
-                db = SessionLocal()
-                try:
-                    user = db.query(User).filter(User.id == user_id).first()
-                    if user and user.balance >= amount:
-                        user.balance -= amount
-                        db.commit()
-                        
-                        bet_entry = {
-                            "user_id": user_id,
-                            "bet_type": bet_type,
-                            "value": bet_value,
-                            "amount": amount
-                        }
-                        ACTIVE_BETS.append(bet_entry)
-                        
-                        bet_description = f"{amount} PLN na "
-                        if bet_type == "number":
-                            bet_description += f"numer {bet_value}"
-                        elif bet_type == "color":
-                            color_names = {"red": "CZERWONY", "black": "CZARNY", "green": "ZIELONY"}
-                            bet_description += color_names.get(bet_value, bet_value)
-                        elif bet_type == "parity":
-                            parity_names = {"even": "PARZYSTE", "odd": "NIEPARZYSTE"}
-                            bet_description += parity_names.get(bet_value, bet_value)
-                        elif bet_type == "dozen":
-                            bet_description += f"tuzin {bet_value}"
-                        
-                        await websocket.send_json({
-                            "type": "bet_confirmed", 
-                            "new_balance": user.balance,
-                            "message": f"Przyjęto: {amount} PLN na {bet_value}",
-                            "bet_info": bet_description
-                        })
-                    else:
-                        await websocket.send_json({"type": "error", "message": "Brak środków"})
-                finally:
-                    db.close()
+                await place_bets(websocket, table, bets, single=False)
 
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
-async def game_loop():
-    global ACTIVE_BETS
+
+async def place_bets(websocket: WebSocket, table: Table, bets: list, single: bool):
+    """
+    Przekazuje zakłady do kolejki przyjmowania i odsyła odpowiedź.
+    Na place_bet odpowiada bet_confirmed albo error, na place_bets
+    jedną wiadomością bets_result z wynikiem każdego zakładu.
+    """
+    manager = table.manager
+    user_id = bets[0].get("user_id") if isinstance(bets[0], dict) else None
+    if isinstance(user_id, int):
+        manager.set_user(websocket, user_id)
+
+    started = time.perf_counter()
+    replies = await bet_intake.submit(table.id, bets)
+
+    results = []
+    new_balance = None
+    for bet, reply in zip(bets, replies):
+        if "error" in reply:
+            results.append({"ok": False, "message": reply["error"]})
+        elif "new_balance" in reply:
+            new_balance = reply["new_balance"]
+            value = table.engine.bet_key(bet["bet_type"], bet["value"])
+            results.append({
+                "ok": True,
+                "message": f"Przyjęto: {bet['amount']} PLN na {value}",
+                "bet_info": describe_bet(bet["bet_type"], value, bet["amount"]),
+            })
+        else:
+            results.append({"ok": False, "message": "Obstawianie jest zamknięte"})
+
+    if not single:
+        await manager.send_personal(websocket, {
+            "type": "bets_result",
+            "new_balance": new_balance,
+            "results": results,
+        })
+    elif "new_balance" in replies[0]:
+        await manager.send_personal(websocket, {
+            "type": "bet_confirmed",
+            "new_balance": new_balance,
+            "message": results[0]["message"],
+            "bet_info": results[0]["bet_info"],
+        })
+    elif "error" in replies[0]:
+        await manager.send_personal(websocket, {"type": "error", "message": replies[0]["error"]})
+    BET_LATENCY_SECONDS.observe(time.perf_counter() - started)
+
+
+def admin_exists() -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(User.id).filter(User.username == "admin").first() is not None
+    finally:
+        db.close()
+
+
+def add_admin(db, hashed_pw: str):
+    # Tworzymy usera z flagą is_admin=True i dużym saldem
+    db.add(User(
+        username="admin",
+        password=hashed_pw,
+        is_admin=True,
+        balance=100000.0
+    ))
+
+
+async def create_admin():
+    """
+    Automatyczne tworzenie admina. Zapytania idą do wątku bazy, a bcrypt
+    do puli haszowania - przejęcie roli lidera nie wstrzymuje pętli zdarzeń.
+    """
+    if await run_in_db(admin_exists):
+        print("Konto admina już istnieje: Login: admin / Hasło: admin")
+        return
+    print("TWORZENIE KONTA ADMINA")
     while True:
-        # Faza obstawiania
-        CURRENT_GAME_STATE["status"] = "betting"
-        ACTIVE_BETS = []
-        
-        for i in range(20, -1, -1):
-            CURRENT_GAME_STATE["time_left"] = i
-            await manager.broadcast({"type": "timer", "value": i, "status": "betting"})
-            await asyncio.sleep(1)
-        
-        # Faza losowania
-        CURRENT_GAME_STATE["status"] = "rolling"
-        await manager.broadcast({"type": "status", "value": "rolling"})
-        await asyncio.sleep(2)
-        
-        result = game_engine.spin()
-        
-        from database import SessionLocal
-        db = SessionLocal()
         try:
-            history_entry = SpinHistory(winning_number=result['number'], color=result['color'])
-            db.add(history_entry)
-            
-            winning_users_updates = {}
-            
-            # Rozliczanie wielu zakladow
-            for bet in ACTIVE_BETS:
-                payout = game_engine.calculate_payout(
-                    bet["bet_type"], 
-                    str(bet["value"]), 
-                    bet["amount"], 
-                    result["number"]
-                )
-                if payout > 0:
-                    winning_users_updates[bet["user_id"]] = winning_users_updates.get(bet["user_id"], 0) + payout
-
-            for uid, win_amount in winning_users_updates.items():
-                user = db.query(User).filter(User.id == uid).first()
-                if user:
-                    user.balance += win_amount
-            
-            db.commit()
-
-            await manager.broadcast({
-                "type": "result",
-                "number": result['number'],
-                "color": result['color'],
-                "history": list(game_engine.history),
-                "winners": winning_users_updates
-            })
-            
-        finally:
-            db.close()
-        
-        await asyncio.sleep(6)
+            hashed_pw = await password_hasher.hash("admin") # Hasło: admin
+            break
+        except HashPoolSaturated:
+            # Pula zajęta logowaniami graczy - admin poczeka na wolne miejsce
+            await asyncio.sleep(1)
+    await db_writer.submit(add_admin, hashed_pw)
+    print("Konto admina utworzone: Login: admin / Hasło: admin")
+
+
+async def start_leader():
+    """
+    Ten proces prowadzi rundę: tworzy admina, kończy rundy przerwane awarią,
+    odtwarza historię stołów, uruchamia pętlę gry i zestawianie historii.
+    Praca na bazie idzie do wątku bazy - przy przejęciu roli lidera klienci
+    podłączeni do tego procesu nie czekają na nią.
+    """
+    await create_admin()
+    settled, _, users = await run_in_db(round_journal.recover)
+    for _, result in settled:
+        spin_stats.record(result.number, result.color)
+    user_cache.invalidate_many(users)
+
+    history = await run_in_db(load_recent_history, list(registry.tables), DEFAULT_TABLE, ROLLING_WINDOW)
+    for table_id, items in history.items():
+        table = registry.get(table_id)
+        table.engine.load_history(items[:HISTORY_SIZE])
+        table.stats.load([item["number"] for item in reversed(items)])
+    registry.start()
+    retention_job.start()
+
+
+async def load_table_stats():
+    """Okno statystyk stołów w procesie followera (lider wczytuje je w start_leader)"""
+    history = await run_in_db(load_recent_history, list(registry.tables), DEFAULT_TABLE, ROLLING_WINDOW)
+    for table_id, items in history.items():
+        registry.get(table_id).stats.load([item["number"] for item in reversed(items)])
+
 
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(game_loop())
-
-    #  Automatyczne tworzenie admina
-    from database import SessionLocal
     db = SessionLocal()
     try:
-        admin_user = db.query(User).filter(User.username == "admin").first()
-        if not admin_user:
-            print("TWORZENIE KONTA ADMINA")
-            hashed_pw = get_password_hash("admin") # Hasło: admin
-            # Tworzymy usera z flagą is_admin=True i dużym saldem
-            admin = User(
-                username="admin", 
-                password=hashed_pw, 
-                is_admin=True, 
-                balance=100000.0
-            )
-            db.add(admin)
-            db.commit()
-            print("Konto admina utworzone: Login: admin / Hasło: admin")
-        else:
-            print("Konto admina już istnieje: Login: admin / Hasło: admin")
+        spin_stats.load(db)
     finally:
         db.close()
 
+    coordinator.on_leader = start_leader
+    coordinator.on_frame = table_broadcast
+    coordinator.on_history = receive_history
+    coordinator.bet_handler = accept_bets
+    coordinator.on_admin_event = admin_feed.dispatch
+    coordinator.history_provider = lambda: {
+        table.id: table.engine.history_payload() for table in registry.tables.values()
+    }
+    await coordinator.start()
+    if not coordinator.is_leader:
+        await load_table_stats()
+    registry.start_heartbeat()
+    admin_feed.start(lambda: {
+        table.id: len(table.manager.active_connections) for table in registry.tables.values()
+    })
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await coordinator.stop()
+    password_hasher.shutdown()
+    profiler.stop()
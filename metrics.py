@@ -0,0 +1,235 @@
+"""
+Metryki aplikacji w formacie tekstowym Prometheusa (endpoint /metrics).
+
+Liczniki i histogramy to zwykłe obiekty w pamięci procesu - pomiar to kilka
+operacji arytmetycznych pod blokadą, więc można je wywoływać na gorących
+ścieżkach. Wartości wynikające z innych struktur (np. liczba połączeń)
+są odczytywane dopiero przy pobraniu /metrics.
+
+Przy kilku procesach uvicorn każdy proces ma własne wartości.
+"""
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+# Progi histogramów czasu (sekundy)
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricsRegistry:
+    """Zbiór metryk procesu renderowany do formatu tekstowego"""
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """Wspólna obsługa etykiet: każda kombinacja wartości ma własny obiekt pomiaru"""
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._child()
+        registry.register(self)
+
+    def labels(self, *values):
+        """Pomiar dla podanych wartości etykiet"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._child())
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterable[Tuple[str, dict, float]]:
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            yield from child.samples(labels)
+
+
+class _CounterValue:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self.lock:
+            self.value += amount
+
+    def samples(self, labels):
+        yield "", labels, self.value
+
+
+class Counter(_Metric):
+    """Licznik rosnący (nazwa powinna kończyć się na _total)"""
+    kind = "counter"
+
+    def _child(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1.0):
+        self._children[()].inc(amount)
+
+
+class Gauge(_Metric):
+    """
+    Wartość chwilowa. Zamiast ustawiać ją przy każdej zmianie można podać
+    funkcję wywoływaną przy pobraniu metryk: zwraca liczbę albo
+    słownik {krotka wartości etykiet: liczba}.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self._function: Optional[Callable] = None
+        super().__init__(name, help, labelnames)
+
+    def _child(self):
+        return _GaugeValue()
+
+    def set(self, value: float):
+        self._children[()].set(value)
+
+    def set_function(self, function: Callable):
+        self._function = function
+
+    def samples(self):
+        if self._function is None:
+            yield from super().samples()
+            return
+        value = self._function()
+        if isinstance(value, dict):
+            for key, item in value.items():
+                yield "", dict(zip(self.labelnames, key)), item
+        else:
+            yield "", {}, value
+
+
+class _GaugeValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self, labels):
+        yield "", labels, self.value
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count", "lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self, labels):
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        cumulative = 0
+        for bound, bucket in zip(self.bounds + (float("inf"),), counts):
+            cumulative += bucket
+            yield "_bucket", {**labels, "le": _format_value(float(bound))}, cumulative
+        yield "_sum", labels, total
+        yield "_count", labels, count
+
+
+class Histogram(_Metric):
+    """Histogram o stałych progach (pomiar to wyszukiwanie binarne progu)"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = TIME_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+
+# Metryki aplikacji
+
+WS_CONNECTIONS = Gauge(
+    "roulette_ws_connections", "Otwarte połączenia WebSocket", ["table"])
+WS_REJECTED = Counter(
+    "roulette_ws_rejected_total", "Połączenia odrzucone przez kontrolę przyjęć", ["reason"])
+WS_REAPED = Counter(
+    "roulette_ws_reaped_total", "Połączenia usunięte, bo klient nie odpowiadał na ping")
+BROADCAST_SECONDS = Histogram(
+    "roulette_broadcast_seconds", "Czas wstawienia ramki do kolejek wszystkich klientów stołu")
+BETS_PER_ROUND = Histogram(
+    "roulette_bets_per_round", "Liczba zakładów w rundzie",
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000))
+BET_LATENCY_SECONDS = Histogram(
+    "roulette_bet_latency_seconds", "Czas od odebrania wiadomości z zakładami do odpowiedzi")
+SETTLEMENT_SECONDS = Histogram(
+    "roulette_settlement_seconds", "Czas rozliczenia rundy (zapis wyniku, zakładów i sald)")
+ROUNDS = Counter(
+    "roulette_rounds_total", "Rozegrane rundy", ["table"])
+DB_SECONDS = Histogram(
+    "roulette_db_seconds", "Czas operacji na bazie (query - run_in_db, "
+    "write_batch - wspólny commit, session - połączenie trzymane przez sesję)", ["kind"])
+PASSWORD_HASH_SECONDS = Histogram(
+    "roulette_password_hash_seconds", "Czas bcrypt razem z oczekiwaniem w kolejce puli", ["op"])
+BET_QUEUE = Gauge(
+    "roulette_bet_queue", "Wiadomości z zakładami czekające w kolejce przyjmowania")
+HASH_PENDING = Gauge(
+    "roulette_password_hash_pending", "Zlecenia bcrypt w puli procesów")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from database import Base
 
@@ -23,4 +23,93 @@ class SpinHistory(Base):
     id = Column(Integer, primary_key=True, index=True)
     winning_number = Column(Integer)
     color = Column(String)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Eksport historii z zakresem dat
+        Index("ix_spin_history_timestamp", "timestamp"),
+    )
+
+
+class Bet(Base):
+    """
+    Model zakladu gracza, zapisywany zbiorczo przy rozliczeniu rundy.
+    Runda to jedno losowanie z tabeli spin_history.
+    """
+    __tablename__ = "bets"
+
+    id = Column(Integer, primary_key=True)
+    spin_id = Column(Integer, ForeignKey("spin_history.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    bet_type = Column(String)
+    value = Column(String)
+    amount = Column(Float)
+    payout = Column(Float, default=0.0)
+
+    __table_args__ = (
+        # Historia gracza (stronicowanie po rundach) i wszystkie zaklady rundy
+        Index("ix_bets_user_spin", "user_id", "spin_id"),
+        Index("ix_bets_spin", "spin_id"),
+    )
+
+
+class Round(Base):
+    """
+    Runda stolu w dzienniku rund: open (obstawianie), drawn (wylosowana,
+    nierozliczona), settled (rozliczona - spin_id) albo void (anulowana po awarii).
+    Status settled jest zapisywany w tej samej transakcji co rozliczenie.
+    """
+    __tablename__ = "rounds"
+
+    id = Column(Integer, primary_key=True)
+    table_id = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="open")
+    winning_number = Column(Integer)
+    spin_id = Column(Integer, ForeignKey("spin_history.id"))
+    opened_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Odtwarzanie po awarii szuka tylko rund nierozliczonych
+        Index("ix_rounds_status", "status"),
+        Index("ix_rounds_spin", "spin_id", unique=True),
+    )
+
+
+class JournalBet(Base):
+    """
+    Zaklad przyjety w rundzie, ktora nie zostala jeszcze rozliczona (stawka jest juz pobrana z salda).
+    Wpisy rundy sa usuwane przy jej rozliczeniu (od tej chwili zaklad jest w tabeli bets).
+    """
+    __tablename__ = "round_journal"
+
+    id = Column(Integer, primary_key=True)
+    round_id = Column(Integer, ForeignKey("rounds.id"), nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
+    bet_type = Column(String)
+    value = Column(String)
+    amount = Column(Float)
+
+    __table_args__ = (
+        # Stawki gracza w rundach nierozliczonych (wczytywanie salda do portfela)
+        Index("ix_round_journal_user", "user_id"),
+    )
+
+
+class SpinRollup(Base):
+    """
+    Zestawienie losowan: ile razy wypadl numer w godzinie (period="hour")
+    albo w dniu ("day"), czas UTC. Liczby dla kolorow wynikaja z numerow.
+    Zestawienia zostaja po przeniesieniu starych losowan do archiwum.
+    """
+    __tablename__ = "spin_rollups"
+
+    id = Column(Integer, primary_key=True)
+    period = Column(String, nullable=False)
+    start = Column(DateTime(timezone=True), nullable=False)
+    number = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        # Zakres okresow jednego rodzaju
+        Index("ix_spin_rollups_period_start", "period", "start", "number", unique=True),
+    )
@@ -0,0 +1,101 @@
+"""
+Próbkujący profiler włączany przez admina.
+
+Osobny wątek co interval sekund odczytuje stos wątku pętli asyncio
+(sys._current_frames) i zlicza powtarzające się stosy. Wynik jest w formacie
+"collapsed stacks" (funkcja;funkcja;funkcja liczba), który przyjmują narzędzia
+do flame graphów. Wyłączony profiler nic nie kosztuje.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+# Domyślny odstęp między próbkami (sekundy)
+DEFAULT_INTERVAL = 0.005
+# Maksymalna głębokość zapisywanego stosu
+MAX_DEPTH = 64
+# Profiler wyłącza się sam po tym czasie, gdyby admin o nim zapomniał
+MAX_DURATION = 300.0
+
+
+class SamplingProfiler:
+    """Profiler próbkujący jeden wątek (domyślnie ten, który go włączył)"""
+    def __init__(self):
+        self.samples: Counter = Counter()
+        # Próbki dopisuje wątek profilera, a czytają je wątki puli endpointów
+        self._lock = threading.Lock()
+        self.interval = DEFAULT_INTERVAL
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._target: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = DEFAULT_INTERVAL, thread_id: Optional[int] = None):
+        """Zaczyna nowy pomiar (poprzednie próbki są usuwane)"""
+        self.stop()
+        with self._lock:
+            self.samples = Counter()
+        self.interval = interval
+        self._target = thread_id or threading.get_ident()
+        self._stop.clear()
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Kończy pomiar i czeka na wątek profilera (blokuje - z pętli asyncio przez wątek)"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.stopped_at = time.time()
+
+    def collapsed(self, limit: int = 200) -> str:
+        """Najczęstsze stosy w formacie collapsed stacks"""
+        with self._lock:
+            top = self.samples.most_common(limit)
+        return "\n".join(f"{stack} {count}" for stack, count in top)
+
+    def stats(self) -> dict:
+        end = self.stopped_at or time.time()
+        with self._lock:
+            samples, stacks = sum(self.samples.values()), len(self.samples)
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "samples": samples,
+            "stacks": stacks,
+            "duration_s": round(end - self.started_at, 1) if self.started_at else 0,
+        }
+
+    def _sample(self):
+        deadline = time.monotonic() + MAX_DURATION
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None or time.monotonic() > deadline:
+                break
+            stack = _collapse(frame)
+            with self._lock:
+                self.samples[stack] += 1
+        self.stopped_at = time.time()
+
+
+def _collapse(frame) -> str:
+    stack = []
+    while frame is not None and len(stack) < MAX_DEPTH:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,316 @@
+"""
+Zestawienia i archiwizacja historii losowań.
+
+Zadanie w tle (tylko w liderze) co COMPACT_INTERVAL sekund:
+- zlicza losowania zakończonych godzin do zestawień godzinowych, a pełnych
+  dni - do dziennych (tabela spin_rollups, liczba losowań każdego numeru),
+- losowania starsze niż ARCHIVE_DAYS dni (razem z ich zakładami) zapisuje
+  do plików NDJSON.gz w ARCHIVE_DIR i usuwa z bazy.
+
+range_counts() łączy zestawienia dzienne, godzinowe i losowania jeszcze
+niezestawione, więc statystyki dowolnego zakresu kosztują tyle, ile dni
+i godzin obejmuje zakres, a nie tyle, ile losowań ma baza.
+Wszystkie czasy są w UTC.
+"""
+import asyncio
+import gzip
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, db_writer, run_in_db, timestamp_bound
+from export import EXPORT_BATCH, EXPORT_KINDS, stream_export
+from game_engine import POCKETS
+from models import Bet, Round, SpinHistory, SpinRollup
+
+logger = logging.getLogger(__name__)
+
+# Losowania starsze niż tyle dni trafiają do archiwum (0 wyłącza archiwizację)
+ARCHIVE_DAYS = int(os.getenv("ROULETTE_ARCHIVE_DAYS", "90"))
+ARCHIVE_DIR = os.getenv("ROULETTE_ARCHIVE_DIR", "archive")
+
+# Co ile sekund zadanie sprawdza, czy jest coś do zestawienia
+COMPACT_INTERVAL = 600.0
+# Godzina jest zestawiana z tym opóźnieniem (ostatnie rozliczenia mogą być jeszcze w kolejce zapisu)
+ROLLUP_DELAY = timedelta(minutes=5)
+# Najdłuższy zakres zestawiany w jednej transakcji (nadrabianie dużej bazy idzie porcjami)
+ROLLUP_BATCH = timedelta(days=1)
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _naive(value: datetime) -> datetime:
+    """Czas UTC bez strefy (SQLite zwraca takie, Postgres - ze strefą)"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ceil_hour(value: datetime) -> datetime:
+    start = floor_hour(value)
+    return start if start == value else start + HOUR
+
+
+def ceil_day(value: datetime) -> datetime:
+    start = floor_day(value)
+    return start if start == value else start + DAY
+
+
+def rolled_until(db: Session, period: str) -> Optional[datetime]:
+    """Koniec ostatniego zestawionego okresu (None, gdy nie ma zestawień)"""
+    last = db.execute(select(func.max(SpinRollup.start)).where(SpinRollup.period == period)).scalar()
+    if last is None:
+        return None
+    return _naive(last) + (HOUR if period == "hour" else DAY)
+
+
+# Zestawienia
+
+def roll_hours(db: Session, until: datetime) -> bool:
+    """
+    Zestawia losowania z godzin przed until, najwyżej ROLLUP_BATCH naraz
+    (pomija godziny bez losowań). Zwraca True, gdy coś zostało dopisane.
+    Commit należy do wywołującego (db_writer).
+    """
+    query = select(func.min(SpinHistory.timestamp))
+    mark = rolled_until(db, "hour")
+    if mark is not None:
+        query = query.where(SpinHistory.timestamp >= timestamp_bound(mark))
+    first = db.execute(query).scalar()
+    if first is None:
+        return False
+    start = floor_hour(_naive(first))
+    end = min(until, start + ROLLUP_BATCH)
+    if start >= end:
+        return False
+
+    counts: Dict[tuple, int] = {}
+    rows = db.execute(
+        select(SpinHistory.timestamp, SpinHistory.winning_number)
+        .where(SpinHistory.timestamp >= timestamp_bound(start))
+        .where(SpinHistory.timestamp < timestamp_bound(end))
+        .execution_options(yield_per=EXPORT_BATCH)
+    )
+    for timestamp, number in rows:
+        if number is not None and 0 <= number <= 36:
+            key = (floor_hour(_naive(timestamp)), number)
+            counts[key] = counts.get(key, 0) + 1
+    return _insert_rollups(db, "hour", counts)
+
+
+def roll_days(db: Session) -> bool:
+    """
+    Sumuje zestawienia godzinowe pełnych dni (tylko już w całości
+    zestawionych godzinowo) w dzienne. Zwraca True, gdy coś zostało dopisane.
+    """
+    hour_mark = rolled_until(db, "hour")
+    if hour_mark is None:
+        return False
+    query = select(func.min(SpinRollup.start)).where(SpinRollup.period == "hour")
+    mark = rolled_until(db, "day")
+    if mark is not None:
+        query = query.where(SpinRollup.start >= mark)
+    first = db.execute(query).scalar()
+    if first is None:
+        return False
+    start = floor_day(_naive(first))
+    end = min(floor_day(hour_mark), start + ROLLUP_BATCH)
+    if start >= end:
+        return False
+
+    counts: Dict[tuple, int] = {}
+    rows = db.execute(
+        select(SpinRollup.start, SpinRollup.number, SpinRollup.count)
+        .where(SpinRollup.period == "hour")
+        .where(SpinRollup.start >= start)
+        .where(SpinRollup.start < end)
+    )
+    for hour, number, count in rows:
+        key = (floor_day(_naive(hour)), number)
+        counts[key] = counts.get(key, 0) + count
+    return _insert_rollups(db, "day", counts)
+
+
+def _insert_rollups(db: Session, period: str, counts: Dict[tuple, int]) -> bool:
+    if counts:
+        db.execute(insert(SpinRollup), [
+            {"period": period, "start": start, "number": number, "count": count}
+            for (start, number), count in sorted(counts.items())
+        ])
+    return bool(counts)
+
+
+# Archiwum
+
+def oldest_archivable_day(db: Session, horizon: datetime) -> Optional[datetime]:
+    """Najstarszy dzień z losowaniami sprzed horizon, już zestawiony godzinowo"""
+    first = db.execute(select(func.min(SpinHistory.timestamp))).scalar()
+    mark = rolled_until(db, "hour")
+    if first is None or mark is None:
+        return None
+    day = floor_day(_naive(first))
+    if day + DAY > min(horizon, mark):
+        return None
+    return day
+
+
+def write_archive(day: datetime) -> List[str]:
+    """Zapisuje losowania i zakłady dnia do plików NDJSON.gz (strumieniowo)"""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    paths = []
+    for kind in EXPORT_KINDS:
+        path = os.path.join(ARCHIVE_DIR, f"{kind}-{day:%Y-%m-%d}.ndjson.gz")
+        # Plik pojawia się pod docelową nazwą dopiero w całości
+        partial = path + ".part"
+        with gzip.open(partial, "wt", encoding="utf-8") as archive:
+            for chunk in stream_export(kind, "ndjson", day, day + DAY):
+                archive.write(chunk)
+        os.replace(partial, path)
+        paths.append(path)
+    return paths
+
+
+def delete_day(db: Session, day: datetime):
+    """Usuwa zarchiwizowany dzień: zakłady, wpisy dziennika rund i losowania"""
+    in_day = (
+        (SpinHistory.timestamp >= timestamp_bound(day))
+        & (SpinHistory.timestamp < timestamp_bound(day + DAY))
+    )
+    spins = select(SpinHistory.id).where(in_day)
+    db.execute(delete(Bet).where(Bet.spin_id.in_(spins)))
+    db.execute(delete(Round).where(Round.spin_id.in_(spins)))
+    db.execute(delete(SpinHistory).where(in_day))
+
+
+# Odczyt
+
+def range_counts(db: Session, date_from: Optional[datetime] = None,
+                 date_to: Optional[datetime] = None) -> List[int]:
+    """
+    Liczba losowań każdego numeru w zakresie [date_from, date_to).
+    Pełne dni są brane z zestawień dziennych, pozostałe godziny z godzinowych,
+    a losowania jeszcze niezestawione - z spin_history. W zestawionym okresie
+    granice zakresu są zaokrąglane do pełnych godzin.
+    """
+    counts = [0] * 37
+    low = _naive(date_from) if date_from is not None else None
+    high = _naive(date_to) if date_to is not None else None
+    hour_mark = rolled_until(db, "hour")
+    raw_from = low
+
+    if hour_mark is not None and (low is None or low < hour_mark):
+        hours_from = floor_hour(low) if low is not None else None
+        hours_to = hour_mark if high is None else min(ceil_hour(high), hour_mark)
+        day_mark = rolled_until(db, "day")
+        days_from = ceil_day(hours_from) if hours_from is not None else None
+        days_to = min(floor_day(hours_to), day_mark) if day_mark is not None else None
+        if days_to is not None and (days_from is None or days_from < days_to):
+            _add_rollups(db, counts, "day", days_from, days_to)
+            if days_from is not None:
+                _add_rollups(db, counts, "hour", hours_from, days_from)
+            _add_rollups(db, counts, "hour", days_to, hours_to)
+        else:
+            _add_rollups(db, counts, "hour", hours_from, hours_to)
+        raw_from = hour_mark if low is None else max(low, hour_mark)
+
+    if high is None or raw_from is None or raw_from < high:
+        query = select(SpinHistory.winning_number, func.count()).group_by(SpinHistory.winning_number)
+        if raw_from is not None:
+            query = query.where(SpinHistory.timestamp >= timestamp_bound(raw_from))
+        if high is not None:
+            query = query.where(SpinHistory.timestamp < timestamp_bound(high))
+        for number, count in db.execute(query):
+            if number is not None and 0 <= number <= 36:
+                counts[number] += count
+    return counts
+
+
+def _add_rollups(db: Session, counts: List[int], period: str,
+                 start: Optional[datetime], end: datetime):
+    if start is not None and start >= end:
+        return
+    query = (
+        select(SpinRollup.number, func.sum(SpinRollup.count))
+        .where(SpinRollup.period == period)
+        .where(SpinRollup.start < end)
+        .group_by(SpinRollup.number)
+    )
+    if start is not None:
+        query = query.where(SpinRollup.start >= start)
+    for number, count in db.execute(query):
+        counts[number] += count
+
+
+def color_counts(counts: List[int]) -> Dict[str, int]:
+    """Liczba losowań kolorów z liczby losowań numerów"""
+    colors: Dict[str, int] = {}
+    for pocket, count in zip(POCKETS, counts):
+        if count:
+            colors[pocket.color] = colors.get(pocket.color, 0) + count
+    return colors
+
+
+class RetentionJob:
+    """Zadanie w tle lidera: zestawienia i archiwizacja"""
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.compact()
+            except Exception:
+                logger.exception("Zestawianie historii losowań nie powiodło się")
+            await asyncio.sleep(COMPACT_INTERVAL)
+
+    async def compact(self, now: Optional[datetime] = None):
+        """Jeden przebieg: zestawienia godzinowe, dzienne i archiwum"""
+        now = now or utcnow()
+        until = floor_hour(now - ROLLUP_DELAY)
+        while await db_writer.submit(roll_hours, until):
+            pass
+        while await db_writer.submit(roll_days):
+            pass
+        if not ARCHIVE_DAYS:
+            return
+        horizon = floor_day(now) - timedelta(days=ARCHIVE_DAYS)
+        while True:
+            day = await run_in_db(_oldest_archivable_day, horizon)
+            if day is None:
+                return
+            # Plik zapisuje osobny wątek, żeby nie zajmować wątku bazy
+            paths = await asyncio.to_thread(write_archive, day)
+            await db_writer.submit(delete_day, day)
+            logger.info("Zarchiwizowano losowania z %s: %s", f"{day:%Y-%m-%d}", ", ".join(paths))
+
+
+def _oldest_archivable_day(horizon: datetime) -> Optional[datetime]:
+    db = SessionLocal()
+    try:
+        return oldest_archivable_day(db, horizon)
+    finally:
+        db.close()
+
+
+retention_job = RetentionJob()
@@ -1,7 +1,9 @@
 """
 Modele Pydantic dla walidacji danych API
 """
-from pydantic import BaseModel
+from typing import List, Optional, Union
+
+from pydantic import BaseModel, Field
 
 
 class UserAuth(BaseModel):
@@ -28,5 +30,41 @@ class TokenResponse(BaseModel):
 class FundOperation(BaseModel):
     """Operacja zarządzania środkami użytkownika"""
     user_id: int
-    amount: float
+    # Kwota zawsze nieujemna - kierunek zmiany wynika z operacji
+    amount: float = Field(ge=0, allow_inf_nan=False)
     operation: str  # 'add', 'remove', 'set'
+
+
+class BulkFundOperation(BaseModel):
+    """Paczka operacji na saldach wykonywana w jednej transakcji"""
+    operations: List[FundOperation] = Field(min_length=1, max_length=10000)
+
+
+class UserPage(BaseModel):
+    """Strona listy użytkowników z kursorem do następnej strony"""
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None
+
+
+class BetResponse(BaseModel):
+    """Zakład gracza w historii"""
+    id: int
+    spin_id: int
+    bet_type: str
+    value: str
+    amount: float
+    payout: float
+
+
+class BetPage(BaseModel):
+    """Strona historii zakładów z kursorem do następnej strony"""
+    items: List[BetResponse]
+    next_cursor: Optional[str] = None
+
+
+class BetRequest(BaseModel):
+    """Zakład wysłany przez WebSocket (place_bet lub element place_bets)"""
+    user_id: int
+    bet_type: str
+    value: Union[int, str]
+    amount: float = Field(gt=0, allow_inf_nan=False)
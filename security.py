@@ -1,8 +1,14 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from typing import Optional
 
+from metrics import PASSWORD_HASH_SECONDS
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 SECRET_KEY = "super_secret"
@@ -15,6 +21,79 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+
+# Pula procesów dla bcrypt - haszowanie nie zajmuje wątków API
+HASH_WORKERS = 2
+# Maksymalna liczba operacji w toku (wykonywanych i czekających w kolejce)
+HASH_MAX_PENDING = 32
+
+
+_HASH_SECONDS = PASSWORD_HASH_SECONDS.labels("hash")
+_VERIFY_SECONDS = PASSWORD_HASH_SECONDS.labels("verify")
+
+
+class HashPoolSaturated(Exception):
+    """Pula haszowania jest pełna - żądanie należy odrzucić (429)"""
+
+
+class PasswordHasher:
+    """
+    Wykonuje bcrypt w osobnych procesach z ograniczoną kolejką.
+    Gdy kolejka jest pełna, od razu zgłasza HashPoolSaturated.
+    """
+    def __init__(self, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    async def _run(self, histogram, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HashPoolSaturated()
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), func, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            histogram.observe(time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_HASH_SECONDS, get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(_VERIFY_SECONDS, verify_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+password_hasher = PasswordHasher()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Tworzy token JWT"""
     to_encode = data.copy()
@@ -32,4 +111,4 @@ def verify_token(token: str) -> Optional[dict]:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
     except JWTError:
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,261 @@
+"""
+Symulacja Monte Carlo ruletki i pomiar wydajności silnika gry.
+
+Losowania są zliczane do histogramu 37 pól, a zwrot dla gracza (RTP)
+i wariancja każdego zakładu z tabeli wypłat są liczone z tego histogramu:
+wygrane wszystkich zakładów liczy silnik gry (encode_bet i calculate_payouts,
+jak przy rozliczaniu rundy) raz dla każdego pola - koszt nie zależy od liczby
+losowań. Błąd w ścieżce wypłat silnika zmienia więc wynik symulacji.
+Szybki generator symulacji nie jest generatorem gry, dlatego równomierność
+sprawdzana jest też na mniejszej próbce losowań RouletteEngine.spin().
+
+Użycie:
+    python simulation.py --spins 100000000 --workers 8 --seed 42
+    python simulation.py --benchmark
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import time
+from multiprocessing import Pool
+from typing import Dict, List, Optional
+
+from game_engine import PAYOUT_TABLE, RouletteEngine
+
+try:
+    import numpy as np
+except ImportError:  # numpy jest opcjonalny - bez niego losujemy modułem random
+    np = None
+
+POCKETS = 37
+
+# Teoretyczny RTP każdego zakładu (36 / 37 dla wszystkich wpisów tabeli)
+EXPECTED_RTP = 36 / 37
+
+# Liczba losowań generowanych jednorazowo w jednym procesie; losowania są też
+# dzielone na porcje tej wielkości, każda z własnym ziarnem
+CHUNK_SIZE = 1_000_000
+
+# Domyślna liczba losowań przez RouletteEngine.spin() (test chi-kwadrat generatora gry)
+ENGINE_SPINS = 1_000_000
+# Przy --tolerance: p-value testu chi-kwadrat poniżej tej wartości kończy się kodem 1
+MIN_P_VALUE = 0.001
+
+
+def simulate_chunk(spins: int, seed: int) -> List[int]:
+    """Losuje spins wyników i zwraca ich histogram (37 pól)"""
+    if np is not None:
+        rng = np.random.default_rng(seed)
+        counts = np.zeros(POCKETS, dtype=np.int64)
+        remaining = spins
+        while remaining > 0:
+            size = min(remaining, CHUNK_SIZE)
+            counts += np.bincount(rng.integers(0, POCKETS, size=size), minlength=POCKETS)
+            remaining -= size
+        return counts.tolist()
+
+    rng = random.Random(seed)
+    counts = [0] * POCKETS
+    pockets = range(POCKETS)
+    remaining = spins
+    while remaining > 0:
+        size = min(remaining, CHUNK_SIZE)
+        for number in rng.choices(pockets, k=size):
+            counts[number] += 1
+        remaining -= size
+    return counts
+
+
+def _worker(args) -> List[int]:
+    return simulate_chunk(*args)
+
+
+def chunk_seed(seed: int, index: int) -> int:
+    """Ziarno porcji losowań - zależy tylko od seed i numeru porcji"""
+    digest = hashlib.sha256(f"{seed}:{index}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def simulate(spins: int, workers: int = 1, seed: Optional[int] = None) -> List[int]:
+    """
+    Histogram spins losowań, liczony równolegle w workers procesach.
+    Przy podanym seed wynik jest powtarzalny i nie zależy od workers -
+    losowania są dzielone na stałe porcje (CHUNK_SIZE), a procesy tylko
+    rozdzielają je między siebie.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    jobs = [
+        (min(CHUNK_SIZE, spins - start), chunk_seed(seed, index))
+        for index, start in enumerate(range(0, spins, CHUNK_SIZE))
+    ]
+
+    if workers == 1:
+        results = [simulate_chunk(*job) for job in jobs]
+    else:
+        with Pool(workers) as pool:
+            results = pool.map(_worker, jobs)
+
+    counts = [0] * POCKETS
+    for result in results:
+        for number, count in enumerate(result):
+            counts[number] += count
+    return counts
+
+
+def rtp_report(counts: List[int], engine: Optional[RouletteEngine] = None) -> Dict[str, dict]:
+    """
+    RTP i wariancja wypłaty (na jednostkę stawki) dla każdego rodzaju zakładu.
+    Dla rodzajów z wieloma wartościami (np. numer) wynik jest średnią po wartościach.
+    Wypłaty liczy silnik gry - tak samo jak przy rozliczaniu rundy.
+    """
+    engine = engine or RouletteEngine()
+    spins = sum(counts)
+    keys = list(PAYOUT_TABLE)
+    # Zakład, którego silnik nie przyjmuje, nic nie wypłaca (RTP 0 wychodzi w raporcie)
+    encoded = [engine.encode_bet(kind, value) for kind, value in keys]
+    masks = [bet.mask if bet else 0 for bet in encoded]
+    multipliers = [bet.multiplier if bet else 0.0 for bet in encoded]
+    amounts = [1.0] * len(keys)
+
+    totals = [0.0] * len(keys)
+    squares = [0.0] * len(keys)
+    for number, count in enumerate(counts):
+        if not count:
+            continue
+        for i, payout in enumerate(engine.calculate_payouts(masks, multipliers, amounts, number)):
+            payout = float(payout)
+            totals[i] += count * payout
+            squares[i] += count * payout * payout
+
+    grouped: Dict[str, List[tuple]] = {}
+    for (kind, _), total, square in zip(keys, totals, squares):
+        mean = total / spins
+        grouped.setdefault(kind, []).append((mean, square / spins - mean ** 2))
+
+    return {
+        kind: {
+            "rtp": sum(m for m, _ in values) / len(values),
+            "variance": sum(v for _, v in values) / len(values),
+            "bets": len(values),
+        }
+        for kind, values in grouped.items()
+    }
+
+
+def chi_square(counts: List[int]) -> Dict[str, float]:
+    """Test chi-kwadrat równomierności rozkładu pól (36 stopni swobody)"""
+    spins = sum(counts)
+    expected = spins / POCKETS
+    statistic = sum((count - expected) ** 2 / expected for count in counts)
+    dof = POCKETS - 1
+    return {"statistic": statistic, "dof": dof, "p_value": _chi2_sf(statistic, dof)}
+
+
+def _chi2_sf(x: float, dof: int) -> float:
+    """P(X >= x) dla rozkładu chi-kwadrat (szereg dolnej niekompletnej funkcji gamma)"""
+    if x <= 0:
+        return 1.0
+    a = dof / 2
+    z = x / 2
+    term = 1.0 / a
+    total = term
+    n = 1
+    while term > total * 1e-15 and n < 10000:
+        term *= z / (a + n)
+        total += term
+        n += 1
+    lower = math.exp(a * math.log(z) - z - math.lgamma(a)) * total
+    return max(0.0, 1.0 - lower)
+
+
+def engine_histogram(spins: int, engine: Optional[RouletteEngine] = None) -> List[int]:
+    """Histogram spins losowań generatorem gry (RouletteEngine.spin)"""
+    engine = engine or RouletteEngine()
+    counts = [0] * POCKETS
+    for _ in range(spins):
+        counts[engine.spin().number] += 1
+    return counts
+
+
+def benchmark(spins: int = ENGINE_SPINS, bets: int = 100_000) -> Dict[str, float]:
+    """
+    Przepustowość spin(), calculate_payout i calculate_payouts (operacje/s)
+    oraz test chi-kwadrat losowań spin() z pomiaru
+    """
+    engine = RouletteEngine()
+
+    started = time.perf_counter()
+    spin_counts = engine_histogram(spins, engine)
+    spin_rate = spins / (time.perf_counter() - started)
+
+    kinds = list(PAYOUT_TABLE)
+    sample = [kinds[i % len(kinds)] for i in range(bets)]
+
+    started = time.perf_counter()
+    for bet_type, value in sample:
+        engine.calculate_payout(bet_type, value, 1.0, 17)
+    single_rate = bets / (time.perf_counter() - started)
+
+    masks = [PAYOUT_TABLE[key].mask for key in sample]
+    multipliers = [PAYOUT_TABLE[key].multiplier for key in sample]
+    amounts = [1.0] * bets
+    started = time.perf_counter()
+    engine.calculate_payouts(masks, multipliers, amounts, 17)
+    batch_rate = bets / (time.perf_counter() - started)
+
+    return {
+        "spin_per_s": spin_rate,
+        "calculate_payout_per_s": single_rate,
+        "calculate_payouts_per_s": batch_rate,
+        "numpy": np is not None,
+        "spin_chi_square": chi_square(spin_counts),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Symulacja Monte Carlo ruletki")
+    parser.add_argument("--spins", type=int, default=10_000_000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--engine-spins", type=int, default=ENGINE_SPINS,
+                        help="liczba losowań RouletteEngine.spin() do testu chi-kwadrat generatora gry")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="maksymalne odchylenie RTP od 36/37; przekroczenie (lub p-value "
+                             "testu chi-kwadrat poniżej 0.001) kończy się kodem 1")
+    parser.add_argument("--benchmark", action="store_true", help="pomiar wydajności silnika gry")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(json.dumps(benchmark(), indent=2))
+        return
+
+    started = time.perf_counter()
+    counts = simulate(args.spins, args.workers, args.seed)
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "spins": args.spins,
+        "seconds": elapsed,
+        "spins_per_s": args.spins / elapsed,
+        "rtp": rtp_report(counts),
+        "chi_square": chi_square(counts),
+        "engine_chi_square": chi_square(engine_histogram(args.engine_spins)),
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.tolerance is not None:
+        worst = max(abs(r["rtp"] - EXPECTED_RTP) for r in report["rtp"].values())
+        if worst > args.tolerance:
+            print(f"RTP poza tolerancją: odchylenie {worst:.6f}")
+            raise SystemExit(1)
+        for name in ("chi_square", "engine_chi_square"):
+            if report[name]["p_value"] < MIN_P_VALUE:
+                print(f"Rozkład pól nierównomierny ({name}): p = {report[name]['p_value']:.3g}")
+                raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,19 @@
 let currentUser = null;
 let authToken = null;
 let ws = null;
+let countdownTimer = null;
+let spinHistory = [];
+let lastNumber = null;
+const HISTORY_SIZE = 10;
+
+// Ponowne łączenie: wykładnicze opóźnienie z losowym rozrzutem,
+// chyba że serwer sam wskazał, kiedy wrócić (zamknięcie 1013 "retry=<ms>")
+const RECONNECT_BASE_MS = 1000;
+const RECONNECT_MAX_MS = 30000;
+// Serwer wysyła ping co 15 s - dłuższa cisza oznacza zerwane połączenie
+const HEARTBEAT_TIMEOUT_MS = 45000;
+let reconnectAttempts = 0;
+let heartbeatTimer = null;
 
 function generateNumbersGrid() {
     const container = document.getElementById("numbers-container");
@@ -17,73 +30,85 @@ function generateNumbersGrid() {
 }
 
 function connectWebSocket() {
-    ws = new WebSocket("ws://" + window.location.host + "/ws/game");
+    // Stół można wybrać parametrem ?table=... (domyślnie stół główny)
+    const table = new URLSearchParams(window.location.search).get("table");
+    const path = table ? "/ws/game/" + encodeURIComponent(table) : "/ws/game";
+    ws = new WebSocket("ws://" + window.location.host + path);
 
     ws.onmessage = function(event) {
         const data = JSON.parse(event.data);
+        watchHeartbeat();
         
+        if (data.type === "ping") {
+            ws.send(JSON.stringify({type: "pong"}));
+            return;
+        }
         if (data.server_time) document.getElementById("server-clock").innerText = data.server_time;
 
-        if (data.type === "timer") {
-            document.getElementById("timer").innerText = data.value;
-            const statusEl = document.getElementById("status");
-            
-            if (data.value > 0) {
-                statusEl.innerText = "OBSTAWIANIE";
-                statusEl.style.color = "#2ecc71";
-                document.getElementById("timer-container").style.display = "inline";
-                document.getElementById("table-overlay").style.display = "none";
-
-                if (data.value === 20 && currentUser) {
-                    forceRefreshUserData();
-                    clearBetsDisplay();
-                }
-
-            } else {
-                statusEl.innerText = "KONIEC ZAKŁADÓW";
-                statusEl.style.color = "#e74c3c";
-                document.getElementById("timer-container").style.display = "none";
-                document.getElementById("table-overlay").style.display = "flex";
-                document.getElementById("table-overlay").innerText = "KONIEC CZASU";
-                resetWheelDisplay();
+        if (data.type === "round_start") {
+            // Serwer wysyła tylko koniec obstawiania, odliczamy lokalnie
+            startCountdown(data.deadline, data.now);
+            if (currentUser) {
+                forceRefreshUserData();
+                clearBetsDisplay();
             }
-            
+
         } else if (data.type === "status" && data.value === "rolling") {
+            stopCountdown();
             document.getElementById("status").innerText = "LOSOWANIE...";
             document.getElementById("timer-container").style.display = "none";
             document.getElementById("table-overlay").style.display = "flex";
             document.getElementById("table-overlay").innerText = "LOSOWANIE...";
             resetWheelDisplay();
 
+        } else if (data.type === "status" && data.value === "void") {
+            // Runda przerwana błędem serwera - stawki wróciły na konto
+            stopCountdown();
+            document.getElementById("status").innerText = "RUNDA ANULOWANA - STAWKI ZWRÓCONE";
+            document.getElementById("timer-container").style.display = "none";
+            document.getElementById("table-overlay").style.display = "none";
+            if (currentUser) {
+                forceRefreshUserData();
+                clearBetsDisplay();
+            }
+
         } else if (data.type === "result") {
-            document.getElementById("status").innerText = "WYNIK: " + data.number;
-            document.getElementById("status").style.color = "#f1c40f";
+            stopCountdown();
+            const statusEl = document.getElementById("status");
+            statusEl.innerText = "WYNIK: " + data.number;
+            statusEl.style.color = "#f1c40f";
             document.getElementById("timer-container").style.display = "none";
             updateDisplay(data.number, data.color);
-            renderHistory(data.history);
-            
-            if (currentUser && data.winners) {
-                const userIdStr = String(currentUser.id);
-                const hasBets = document.getElementById("active-bets-container").style.display !== "none";
-                
-                if (data.winners[userIdStr]) {
-                    const win = data.winners[userIdStr];
-                    
-                    const statusEl = document.getElementById("status");
-                    statusEl.innerText = `WYGRANA! +${win.toFixed(2)} PLN | Wynik: ${data.number}`;
-                    statusEl.style.color = "#2ecc71";
-                    
-                    setTimeout(() => forceRefreshUserData(), 500);
-                } else if (hasBets) {
-                    const statusEl = document.getElementById("status");
-                    statusEl.innerText = `Przegrana | Wynik: ${data.number}`;
-                    statusEl.style.color = "#e74c3c";
-                }
+
+            // Historia przychodzi tylko w 'init', dalej dopisujemy kolejne wyniki
+            spinHistory.unshift({number: data.number, color: data.color});
+            spinHistory.length = Math.min(spinHistory.length, HISTORY_SIZE);
+            renderHistory(spinHistory);
+            renderStats(data.stats);
+
+            const hasBets = document.getElementById("active-bets-container").style.display !== "none";
+            if (currentUser && hasBets) {
+                // Wygrana nadpisze ten komunikat osobną wiadomością 'win'
+                statusEl.innerText = `Przegrana | Wynik: ${data.number}`;
+                statusEl.style.color = "#e74c3c";
             }
+            lastNumber = data.number;
             document.getElementById("bet-message").innerText = "";
 
+        } else if (data.type === "win") {
+            const statusEl = document.getElementById("status");
+            statusEl.innerText = `WYGRANA! +${data.amount.toFixed(2)} PLN | Wynik: ${lastNumber}`;
+            statusEl.style.color = "#2ecc71";
+            setTimeout(() => forceRefreshUserData(), 500);
+
         } else if (data.type === "init") {
-            renderHistory(data.history);
+            reconnectAttempts = 0;
+            spinHistory = data.history;
+            renderHistory(spinHistory);
+            renderStats(data.stats);
+            if (data.round && data.round.status === "betting") {
+                startCountdown(data.round.deadline, data.round.now);
+            }
 
         } else if (data.type === "bet_confirmed") {
             currentUser.balance = data.new_balance;
@@ -100,7 +125,59 @@ function connectWebSocket() {
         }
     };
     
-    ws.onclose = () => setTimeout(connectWebSocket, 1000);
+    ws.onopen = watchHeartbeat;
+    ws.onclose = function(event) {
+        clearTimeout(heartbeatTimer);
+        const delay = reconnectDelay(event);
+        reconnectAttempts++;
+        setTimeout(connectWebSocket, delay);
+    };
+}
+
+function reconnectDelay(event) {
+    const hint = /^retry=(\d+)$/.exec(event.reason || "");
+    if (hint) return parseInt(hint[1]);
+    const cap = Math.min(RECONNECT_MAX_MS, RECONNECT_BASE_MS * 2 ** reconnectAttempts);
+    return Math.random() * cap;
+}
+
+function watchHeartbeat() {
+    clearTimeout(heartbeatTimer);
+    const socket = ws;
+    heartbeatTimer = setTimeout(() => socket.close(), HEARTBEAT_TIMEOUT_MS);
+}
+
+function startCountdown(deadline, serverNow) {
+    // Różnica zegarów klienta i serwera, żeby odliczanie nie zależało od ustawień komputera
+    const offset = serverNow - Date.now();
+    stopCountdown();
+
+    const statusEl = document.getElementById("status");
+    statusEl.innerText = "OBSTAWIANIE";
+    statusEl.style.color = "#2ecc71";
+    document.getElementById("timer-container").style.display = "inline";
+    document.getElementById("table-overlay").style.display = "none";
+
+    const tick = () => {
+        const left = Math.max(0, Math.ceil((deadline - (Date.now() + offset)) / 1000));
+        document.getElementById("timer").innerText = left;
+        if (left === 0) {
+            stopCountdown();
+            statusEl.innerText = "KONIEC ZAKŁADÓW";
+            statusEl.style.color = "#e74c3c";
+            document.getElementById("timer-container").style.display = "none";
+            document.getElementById("table-overlay").style.display = "flex";
+            document.getElementById("table-overlay").innerText = "KONIEC CZASU";
+            resetWheelDisplay();
+        }
+    };
+    tick();
+    countdownTimer = setInterval(tick, 250);
+}
+
+function stopCountdown() {
+    if (countdownTimer) clearInterval(countdownTimer);
+    countdownTimer = null;
 }
 
 function resetWheelDisplay() {
@@ -126,6 +203,20 @@ function renderHistory(history) {
     });
 }
 
+const STREAK_NAMES = {red: "czerwone", black: "czarne", green: "zero", even: "parzyste", odd: "nieparzyste"};
+
+function renderStats(stats) {
+    const container = document.getElementById("table-stats");
+    if (!stats || !stats.window) {
+        container.innerText = "";
+        return;
+    }
+    const streak = s => s.value ? `${STREAK_NAMES[s.value]} x${s.length}` : "-";
+    container.innerText =
+        `Ostatnie ${stats.window}: gorące ${stats.hot.join(", ")} | zimne ${stats.cold.join(", ")} | ` +
+        `seria: ${streak(stats.streaks.color)}, ${streak(stats.streaks.parity)}`;
+}
+
 function addBetToDisplay(info) {
     const container = document.getElementById("active-bets-container");
     container.style.display = "block";
@@ -171,6 +262,8 @@ async function handleLogin() {
             authToken = data.access_token;
             localStorage.setItem('authToken', authToken);
             initGameInterface(); 
+        } else if (res.status === 429) {
+            alert("Serwer jest przeciążony, spróbuj ponownie za chwilę");
         } else {
             alert("Błąd logowania");
         }
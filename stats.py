@@ -0,0 +1,164 @@
+"""
+Statystyki losowań liczone przyrostowo w pamięci
+"""
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from game_engine import POCKETS
+from retention import color_counts, range_counts
+
+# Liczba ostatnich losowań stołu w statystykach kroczących
+ROLLING_WINDOW = 100
+# Liczba numerów "gorących" i "zimnych"
+HOT_COLD_SIZE = 5
+# Liczba największych wygranych w rankingu
+LEADERBOARD_SIZE = 10
+
+
+class SpinStats:
+    """
+    Liczniki losowań: łącznie, per kolor i per numer.
+    Wczytywane z bazy jednym zapytaniem, potem aktualizowane przy każdym losowaniu.
+    """
+    def __init__(self):
+        self.loaded = False
+        self.total = 0
+        self.colors: Dict[str, int] = {}
+        self.numbers: List[int] = [0] * 37
+
+    def load(self, db: Session):
+        """
+        Wczytuje liczniki z zestawień godzinowych/dziennych i niezestawionych
+        losowań (retention.range_counts) - działa też po archiwizacji historii
+        """
+        self.numbers = range_counts(db)
+        self.colors = color_counts(self.numbers)
+        self.total = sum(self.numbers)
+        self.loaded = True
+
+    def record(self, number: int, color: str):
+        """Dolicza nowe losowanie"""
+        if not self.loaded:
+            # Liczniki zostaną wczytane razem z tym losowaniem
+            return
+        self.total += 1
+        self.colors[color] = self.colors.get(color, 0) + 1
+        self.numbers[number] += 1
+
+
+class RollingStats:
+    """
+    Statystyki kroczące stołu: częstości numerów i kolorów w oknie ostatnich
+    losowań oraz bieżące serie koloru i parzystości (zero przerywa serię
+    parzystości). Aktualizacja przy losowaniu to O(1).
+    """
+    def __init__(self, window: int = ROLLING_WINDOW):
+        self.window: deque = deque(maxlen=window)
+        self.counts: List[int] = [0] * 37
+        self.colors: Dict[str, int] = {}
+        self.color_streak: List = [None, 0]
+        self.parity_streak: List = [None, 0]
+        # Zmienia się przy każdym losowaniu (do unieważniania zakodowanych ramek)
+        self.version = 0
+
+    def record(self, number: int, color: str):
+        """Dolicza losowanie; najstarsze wypada z okna"""
+        if len(self.window) == self.window.maxlen:
+            oldest = self.window[0]
+            self.counts[oldest] -= 1
+            self.colors[POCKETS[oldest].color] -= 1
+        self.window.append(number)
+        self.counts[number] += 1
+        self.colors[color] = self.colors.get(color, 0) + 1
+        _extend(self.color_streak, color)
+        _extend(self.parity_streak, POCKETS[number].parity)
+        self.version += 1
+
+    def load(self, numbers: List[int]):
+        """Odtwarza okno z ostatnich losowań (od najstarszego)"""
+        # version tylko rośnie - ramki zakodowane przed odtworzeniem są nieaktualne
+        self.window.clear()
+        self.counts = [0] * 37
+        self.colors = {}
+        self.color_streak = [None, 0]
+        self.parity_streak = [None, 0]
+        self.version += 1
+        for number in numbers:
+            self.record(number, POCKETS[number].color)
+
+    def summary(self) -> dict:
+        """Numery gorące i zimne, kolory w oknie i bieżące serie"""
+        numbers = range(37)
+        counts = self.counts
+        return {
+            "window": len(self.window),
+            "hot": [n for n in heapq.nlargest(HOT_COLD_SIZE, numbers, key=counts.__getitem__) if counts[n]],
+            "cold": heapq.nsmallest(HOT_COLD_SIZE, numbers, key=counts.__getitem__),
+            "colors": {color: count for color, count in self.colors.items() if count},
+            "streaks": {
+                "color": {"value": self.color_streak[0], "length": self.color_streak[1]},
+                "parity": {"value": self.parity_streak[0], "length": self.parity_streak[1]},
+            },
+        }
+
+
+def _extend(streak: List, value: Optional[str]):
+    if value is not None and streak[0] == value:
+        streak[1] += 1
+    else:
+        streak[0] = value
+        streak[1] = 1 if value is not None else 0
+
+
+class Leaderboard:
+    """
+    Największe wygrane w jednej rundzie od startu serwera. Kopiec min
+    o stałym rozmiarze: wygrana mniejsza od najmniejszej w rankingu jest
+    odrzucana jednym porównaniem, pozostałe kosztują O(log n).
+    """
+    def __init__(self, size: int = LEADERBOARD_SIZE):
+        self.size = size
+        self.heap: List[tuple] = []
+        # Nazwy graczy z rankingu (uzupełniane przy odczycie)
+        self.names: Dict[int, str] = {}
+        self._order = itertools.count()
+
+    def record(self, table_id: str, winners: Dict[int, float]):
+        """Dolicza wygrane rundy: {gracz: kwota}"""
+        heap = self.heap
+        for user_id, amount in winners.items():
+            if len(heap) >= self.size and amount <= heap[0][0]:
+                continue
+            # Licznik rozstrzyga remisy - starsza wygrana zostaje wyżej
+            entry = (amount, -next(self._order), user_id, table_id, int(time.time()))
+            if len(heap) < self.size:
+                heapq.heappush(heap, entry)
+            else:
+                heapq.heapreplace(heap, entry)
+
+    def missing_names(self) -> List[int]:
+        return [entry[2] for entry in self.heap if entry[2] not in self.names]
+
+    def top(self) -> List[dict]:
+        if len(self.names) > self.size * 4:
+            ranked = {entry[2] for entry in self.heap}
+            self.names = {uid: name for uid, name in self.names.items() if uid in ranked}
+        return [
+            {
+                "user_id": user_id,
+                "username": self.names.get(user_id),
+                "amount": amount,
+                "table": table_id,
+                "time": won_at,
+            }
+            for amount, _, user_id, table_id, won_at in sorted(self.heap, reverse=True)
+        ]
+
+
+spin_stats = SpinStats()
+leaderboard = Leaderboard()
@@ -0,0 +1,308 @@
+"""
+Stoły do gry - wiele niezależnych rund w jednej pętli asyncio.
+
+Każdy stół ma własny silnik ruletki, księgę zakładów, zegar i listę
+podłączonych klientów. Stoły startują z przesunięciem w obrębie sekundy,
+żeby ich zegary nie budziły się wszystkie w tej samej chwili.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from admin_feed import admin_feed
+from bets import wallet, BetBook, settle_round
+from cache import user_cache
+from cluster import coordinator
+from connection_manager import ConnectionManager, HEARTBEAT_INTERVAL
+from frames import InitSnapshot, now_ms
+from game_engine import RouletteEngine
+from journal import round_journal
+from metrics import BETS_PER_ROUND, ROUNDS, SETTLEMENT_SECONDS, WS_REAPED
+from stats import spin_stats, leaderboard, RollingStats
+
+logger = logging.getLogger(__name__)
+
+# Długość faz rundy w sekundach (zmienne środowiskowe skracają rundę np. w testach obciążenia)
+BETTING_TIME = int(os.getenv("ROULETTE_BETTING_TIME", "20"))
+ROLLING_TIME = int(os.getenv("ROULETTE_ROLLING_TIME", "2"))
+RESULT_TIME = int(os.getenv("ROULETTE_RESULT_TIME", "6"))
+
+# Stół domyślny, obsługiwany też przez /ws/game
+DEFAULT_TABLE = "main"
+
+# Liczba stołów uruchamianych przy starcie
+TABLE_COUNT = int(os.getenv("ROULETTE_TABLES", "1"))
+
+# Przesunięcia startu kolejnych stołów (ułamek sekundy, złota proporcja)
+_STAGGER_STEP = 0.6180339887
+
+
+class Table:
+    """
+    Jeden stół: silnik gry, zakłady bieżącej rundy, stan i subskrybenci
+    """
+    __slots__ = ("id", "engine", "book", "status", "deadline", "round_id",
+                 "manager", "stats", "init_snapshot", "offset", "task")
+
+    def __init__(self, table_id: str, offset: float = 0.0):
+        self.id = table_id
+        self.engine = RouletteEngine()
+        self.book = BetBook()
+        self.status = "waiting"
+        # Koniec obstawiania bieżącej rundy (ms od epoki)
+        self.deadline = 0
+        # Id bieżącej rundy w dzienniku rund
+        self.round_id: Optional[int] = None
+        self.manager = ConnectionManager()
+        self.stats = RollingStats()
+        # Ramka 'init' przebudowywana tylko po zmianie historii lub statystyk
+        self.init_snapshot = InitSnapshot(self.engine, self.stats)
+        self.offset = offset
+        self.task: Optional[asyncio.Task] = None
+
+    async def accept_bets(self, bets: List[dict]) -> List[dict]:
+        """
+        Przyjmuje paczkę zakładów do bieżącej rundy (wywoływane tylko w liderze).
+        Dla każdego zakładu zwraca {"new_balance": ...}, {"error": ...}
+        albo {} gdy obstawianie jest zamknięte.
+        """
+        if self.status != "betting":
+            return [{} for _ in bets]
+
+        replies: List[dict] = [{} for _ in bets]
+        accepted = []
+        for i, bet in enumerate(bets):
+            encoded = self.engine.encode_bet(bet["bet_type"], bet["value"])
+            if encoded is None:
+                replies[i] = {"error": "Nieprawidłowy zakład"}
+            else:
+                # Do dziennika i księgi trafia wartość w postaci klucza ("05" -> "5")
+                bet = dict(bet, value=self.engine.bet_key(bet["bet_type"], bet["value"]))
+                accepted.append((i, bet, encoded))
+
+        balances = await wallet.reserve_many([(bet["user_id"], bet["amount"]) for _, bet, _ in accepted])
+        reserved = []
+        for (i, bet, encoded), new_balance in zip(accepted, balances):
+            if new_balance is None:
+                replies[i] = {"error": "Brak środków"}
+            else:
+                reserved.append((i, bet, encoded, new_balance))
+
+        # Zakłady trafiają do dziennika rund, zanim gracz dostanie potwierdzenie
+        round_id = self.round_id
+        try:
+            journal_ids = await round_journal.record_bets(round_id, [bet for _, bet, _, _ in reserved])
+            journaled = True
+        except Exception:
+            logger.exception("Nie udało się zapisać zakładów w dzienniku rund")
+            journal_ids = [None] * len(reserved)
+            journaled = False
+
+        closed = self.status != "betting" or self.round_id != round_id
+        if journaled and closed:
+            # Obstawianie zamknęło się w trakcie wczytywania sald lub zapisu -
+            # gracz dostaje odmowę, więc zakłady nie mogą zostać w dzienniku
+            try:
+                await round_journal.cancel_bets([bet_id for bet_id in journal_ids if bet_id is not None])
+            except Exception:
+                logger.exception("Nie udało się usunąć odrzuconych zakładów z dziennika rund")
+        changed = set()
+        for (i, bet, encoded, new_balance), bet_id in zip(reserved, journal_ids):
+            if not journaled:
+                wallet.release(bet["user_id"], bet["amount"])
+                replies[i] = {"error": "Nie udało się przyjąć zakładu, spróbuj ponownie"}
+            elif bet_id is None:
+                # Saldo w bazie zmieniło się od wczytania do portfela (np. operacja admina)
+                wallet.release(bet["user_id"], bet["amount"])
+                wallet.invalidate(bet["user_id"])
+                replies[i] = {"error": "Brak środków"}
+            elif closed:
+                wallet.release(bet["user_id"], bet["amount"])
+            else:
+                self.book.add(bet["user_id"], bet["bet_type"], bet["value"], bet["amount"], encoded)
+                replies[i] = {"new_balance": new_balance}
+                changed.add(bet["user_id"])
+        # Stawki są już pobrane z sald w bazie
+        user_cache.invalidate_many(changed)
+        return replies
+
+    def round_state(self) -> dict:
+        """Stan rundy dla nowo podłączonych klientów"""
+        return {"status": self.status, "deadline": self.deadline}
+
+    @property
+    def time_left(self) -> int:
+        """Sekundy do końca obstawiania (0 poza fazą obstawiania)"""
+        if self.status != "betting":
+            return 0
+        return max(0, round((self.deadline - time.time() * 1000) / 1000))
+
+    async def run(self):
+        """
+        Pętla gry stołu. Błąd w rundzie (np. zablokowana baza) nie kończy
+        pętli - runda jest anulowana, a stół zaczyna następną.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(self.offset)
+        while True:
+            try:
+                await self.play_round(loop)
+            except Exception:
+                logger.exception("Runda stołu %s przerwana błędem", self.id)
+                await self.void_round()
+                await asyncio.sleep(RESULT_TIME)
+
+    async def play_round(self, loop: asyncio.AbstractEventLoop):
+        """
+        Jedna runda. Zamiast tykać co sekundę wysyła jedną wiadomość
+        'round_start' z końcem obstawiania - klienci odliczają sami.
+        """
+        # Faza obstawiania
+        self.round_id = None
+        self.round_id = await round_journal.open_round(self.id)
+        self.status = "betting"
+        self.book = BetBook()
+        round_end = loop.time() + BETTING_TIME
+        self.deadline = int((time.time() + BETTING_TIME) * 1000)
+
+        await coordinator.broadcast(self.id, {
+            "type": "round_start",
+            "deadline": self.deadline,
+            "now": now_ms(),
+        })
+        await _sleep_until(loop, round_end)
+
+        # Faza losowania
+        self.status = "rolling"
+        await coordinator.broadcast(self.id, {"type": "status", "value": "rolling"})
+        await asyncio.sleep(ROLLING_TIME)
+
+        result = self.engine.spin()
+        await round_journal.record_result(self.round_id, result.number)
+
+        # Rozliczanie wszystkich zakladow rundy naraz
+        started = time.perf_counter()
+        winners = await settle_round(wallet, self.book, self.engine, result, self.round_id)
+        # Runda jest zapisana - błąd w dalszej części nie może jej już anulować
+        self.round_id = None
+        SETTLEMENT_SECONDS.observe(time.perf_counter() - started)
+        BETS_PER_ROUND.observe(len(self.book))
+        ROUNDS.labels(self.id).inc()
+        spin_stats.record(result.number, result.color)
+        self.stats.record(result.number, result.color)
+        leaderboard.record(self.id, winners)
+        admin_feed.publish(
+            "spin", table=self.id, number=result.number, color=result.color,
+            bets=len(self.book), players=len(self.book.stakes),
+            stakes=round(sum(self.book.stakes.values()), 2),
+            payouts=round(sum(winners.values()), 2),
+        )
+
+        # Klienci dopisują wynik do swojej historii, więc nie wysyłamy jej całej
+        await coordinator.broadcast(self.id, {
+            "type": "result", **result.payload, "stats": self.stats.summary(),
+        })
+        # Followerzy wysyłają wygrane po odebraniu spin - ramka wyniku musi
+        # być w magistrali wcześniej, inaczej gracz dostałby "win" przed "result"
+        coordinator.publish_spin(self.id, result.payload, self.engine.history_payload(),
+                                 self.book.stakes, winners)
+        await self.manager.notify_winners(winners)
+
+        await asyncio.sleep(RESULT_TIME)
+
+    async def void_round(self):
+        """
+        Anuluje rundę przerwaną błędem: zwraca stawki z dziennika, zwalnia
+        rezerwacje w portfelu i informuje klientów. Zapis jest ponawiany do
+        skutku - do tego czasu stół nie zaczyna nowej rundy.
+        """
+        self.status = "waiting"
+        round_id, book = self.round_id, self.book
+        self.round_id = None
+        self.book = BetBook()
+        if round_id is None:
+            return
+
+        while True:
+            try:
+                users = await round_journal.void_round(round_id)
+                break
+            except Exception:
+                logger.exception("Nie udało się anulować rundy %s stołu %s", round_id, self.id)
+                await asyncio.sleep(RESULT_TIME)
+        wallet.apply_settlement(book.stakes)
+        coordinator.notify_balance_changes(users)
+        try:
+            await coordinator.broadcast(self.id, {"type": "status", "value": "void"})
+        except Exception:
+            logger.exception("Nie udało się powiadomić klientów stołu %s o anulowaniu rundy", self.id)
+
+
+async def _sleep_until(loop: asyncio.AbstractEventLoop, deadline: float):
+    await asyncio.sleep(max(0.0, deadline - loop.time()))
+
+
+class TableRegistry:
+    """
+    Rejestr stołów procesu
+    """
+    def __init__(self):
+        self.tables: Dict[str, Table] = {}
+        self.heartbeat_task: Optional[asyncio.Task] = None
+
+    def create(self, table_id: str) -> Table:
+        offset = (len(self.tables) * _STAGGER_STEP) % 1.0
+        table = Table(table_id, offset)
+        self.tables[table_id] = table
+        return table
+
+    def get(self, table_id: str) -> Optional[Table]:
+        return self.tables.get(table_id)
+
+    def start(self):
+        """Uruchamia pętle gry wszystkich stołów (tylko w liderze)"""
+        for table in self.tables.values():
+            if table.task is None or table.task.done():
+                table.task = asyncio.create_task(table.run())
+
+    def start_heartbeat(self):
+        """Ping klientów i paneli admina, usuwanie martwych połączeń (w każdym procesie)"""
+        if self.heartbeat_task is None or self.heartbeat_task.done():
+            self.heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            self.reap()
+
+    def reap(self) -> int:
+        """Jeden przebieg heartbeatu: stoły i panele administratora"""
+        managers = [table.manager for table in self.tables.values()]
+        managers.append(admin_feed.manager)
+        reaped = sum(manager.heartbeat() for manager in managers)
+        if reaped:
+            WS_REAPED.inc(reaped)
+        return reaped
+
+    def connections(self) -> int:
+        """Liczba klientów podłączonych do stołów procesu"""
+        return sum(len(table.manager.active_connections) for table in self.tables.values())
+
+    def summary(self) -> list:
+        return [
+            {
+                "id": table.id,
+                "status": table.status,
+                "time_left": table.time_left,
+                "players": len(table.manager.active_connections),
+            }
+            for table in self.tables.values()
+        ]
+
+
+registry = TableRegistry()
+registry.create(DEFAULT_TABLE)
+for _number in range(2, TABLE_COUNT + 1):
+    registry.create(f"table-{_number}")
@@ -0,0 +1,30 @@
+"""
+Wspólne fixture testów: baza SQLite w pamięci zamiast roulette.db
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import api_routes
+import bets
+import database
+import journal
+from database import Base
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    """
+    SessionLocal modułów gry podmieniony na bazę w pamięci
+    (jedno połączenie współdzielone przez wątek bazy i test)
+    """
+    engine = create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    for module in (database, bets, journal, api_routes):
+        monkeypatch.setattr(module, "SessionLocal", factory)
+    yield factory
+    engine.dispose()
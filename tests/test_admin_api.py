@@ -0,0 +1,133 @@
+"""
+Testy endpointów admina: lista graczy stronami i operacje na saldach
+"""
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+import api_routes
+from api_routes import get_all_users, get_spin_history, manage_funds, manage_funds_bulk
+from cache import UserSnapshot
+from game_engine import POCKETS
+from models import SpinHistory, User
+from schemas import BulkFundOperation, FundOperation
+from stats import SpinStats
+
+ADMIN = UserSnapshot(1, "admin", 0.0, True)
+NAMES = ["ala", "alan", "alek", "bartek", "beata", "zenon"]
+
+
+@pytest.fixture
+def users(session_factory):
+    db = session_factory()
+    db.add_all(User(username=name, password="x", balance=100.0) for name in NAMES)
+    db.commit()
+    ids = {user.username: user.id for user in db.query(User)}
+    db.close()
+    return ids
+
+
+def all_pages(**filters):
+    names, cursor = [], None
+    while True:
+        page = get_all_users(limit=2, cursor=cursor, current_user=ADMIN, **filters)
+        names.extend(user.username for user in page.items)
+        if page.next_cursor is None:
+            return names
+        cursor = page.next_cursor
+
+
+class TestUserPages:
+    """Testy stronicowania listy graczy kursorem"""
+
+    def test_pages_cover_all_users_once(self, users):
+        """Test: kolejne strony zwracają wszystkich graczy po kolei, bez powtórzeń"""
+        assert all_pages() == sorted(NAMES)
+
+    def test_prefix(self, users):
+        """Test: prefix zawęża listę do nazw zaczynających się od tekstu"""
+        assert all_pages(prefix="al") == ["ala", "alan", "alek"]
+        assert all_pages(prefix="b") == ["bartek", "beata"]
+        assert all_pages(prefix="x") == []
+
+    def test_requires_admin(self, users):
+        """Test: zwykły gracz nie widzi listy"""
+        with pytest.raises(HTTPException) as error:
+            get_all_users(current_user=UserSnapshot(2, "ala", 0.0, False))
+        assert error.value.status_code == 403
+
+
+class TestFundOperations:
+    """Testy operacji admina na saldach"""
+
+    def test_negative_amount_rejected(self):
+        """Test: ujemna kwota nie przechodzi walidacji (add nie może odejmować)"""
+        with pytest.raises(ValidationError):
+            FundOperation(user_id=1, amount=-50, operation="add")
+        with pytest.raises(ValidationError):
+            FundOperation(user_id=1, amount=float("inf"), operation="set")
+
+    def test_remove_stops_at_zero(self, users):
+        """Test: remove nie schodzi poniżej zera"""
+        reply = manage_funds(FundOperation(user_id=users["ala"], amount=150, operation="remove"), ADMIN)
+        assert reply["new_balance"] == 0.0
+
+    def test_unknown_user(self, users):
+        """Test: operacja na nieistniejącym graczu zwraca 404"""
+        with pytest.raises(HTTPException) as error:
+            manage_funds(FundOperation(user_id=999, amount=1, operation="add"), ADMIN)
+        assert error.value.status_code == 404
+
+    def test_bulk_in_order(self, session_factory, users):
+        """Test: operacje paczki są wykonywane po kolei, brakujący gracze są zgłaszani"""
+        bulk = BulkFundOperation(operations=[
+            {"user_id": users["ala"], "amount": 10, "operation": "set"},
+            {"user_id": users["ala"], "amount": 5, "operation": "add"},
+            {"user_id": users["beata"], "amount": 500, "operation": "remove"},
+            {"user_id": 999, "amount": 1, "operation": "add"},
+        ])
+        assert manage_funds_bulk(bulk, ADMIN) == {"message": "Success", "updated": 2, "missing": [999]}
+        db = session_factory()
+        assert db.get(User, users["ala"]).balance == 15.0
+        assert db.get(User, users["beata"]).balance == 0.0
+        db.close()
+
+
+class TestSpinHistory:
+    """Testy historii losowań dla admina"""
+
+    @pytest.fixture
+    def spins(self, session_factory, monkeypatch):
+        monkeypatch.setattr(api_routes, "spin_stats", SpinStats())
+        db = session_factory()
+        numbers = [0, 1, 2, 3, 1, 5, 7]
+        db.add_all(SpinHistory(winning_number=n, color=POCKETS[n].color) for n in numbers)
+        db.commit()
+        db.close()
+        return numbers
+
+    def test_pages_by_before_id(self, spins):
+        """Test: strony po next_before_id dają całą historię od najnowszych, ostatnia ma None"""
+        numbers, before_id, pages = [], None, 0
+        while True:
+            page = get_spin_history(limit=3, before_id=before_id, current_user=ADMIN)
+            numbers.extend(item["number"] for item in page["history"])
+            pages += 1
+            before_id = page["next_before_id"]
+            if before_id is None:
+                break
+        assert numbers == list(reversed(spins))
+        assert pages == 3
+
+    def test_counters_match_database(self, spins):
+        """Test: liczniki w odpowiedzi są wczytane z bazy przy pierwszym zapytaniu"""
+        page = get_spin_history(limit=1, current_user=ADMIN)
+        assert page["total_spins"] == len(spins)
+        assert page["numbers"][1] == 2 and page["numbers"][7] == 1
+        assert page["statistics"] == {"green": 1, "red": 5, "black": 1}
+
+    def test_requires_admin(self, spins):
+        """Test: zwykły gracz nie widzi historii"""
+        with pytest.raises(HTTPException) as error:
+            get_spin_history(current_user=UserSnapshot(2, "ala", 0.0, False))
+        assert error.value.status_code == 403
@@ -0,0 +1,102 @@
+"""
+Testy zdarzeń na żywo dla paneli administratora
+"""
+import asyncio
+import json
+
+from admin_feed import AdminFeed, admin_feed
+from tables import registry
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        self.frames.append(json.loads(frame))
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = code
+
+
+class TestAdminFeed:
+    """Testy rozsyłania zdarzeń do paneli"""
+
+    def test_snapshot_and_dispatch(self):
+        """Test: panel dostaje ramkę startową, a potem zdarzenia; nowy panel widzi ostatnie wyniki"""
+        async def scenario():
+            feed = AdminFeed()
+            panel = FakeWebSocket()
+            await feed.manager.connect(panel)
+            await feed.manager.send_frame(panel, feed.snapshot())
+            await feed.dispatch({"type": "spin", "number": 7})
+            await feed.dispatch({"type": "balance", "user_id": 1})
+            await asyncio.sleep(0.01)
+            feed.manager.disconnect(panel)
+            return panel.frames, json.loads(feed.snapshot())
+
+        frames, snapshot = asyncio.run(scenario())
+        assert [frame["type"] for frame in frames] == ["init", "spin", "balance"]
+        assert snapshot["recent"] == [{"type": "spin", "number": 7}]
+
+    def test_slow_panel_is_evicted(self):
+        """Test: panel, który nie odbiera zdarzeń, jest rozłączany po zapełnieniu kolejki"""
+        async def scenario():
+            feed = AdminFeed()
+            panel = FakeWebSocket()
+            await feed.manager.connect(panel)
+            # Zadanie wysyłające nie dostaje czasu - kolejka tylko rośnie
+            for i in range(feed.manager.queue_size + 1):
+                await feed.dispatch({"type": "balance", "user_id": i})
+            await asyncio.sleep(0.01)
+            return feed.manager, panel
+
+        manager, panel = asyncio.run(scenario())
+        assert manager.active_connections == {}
+        assert manager.evicted == 1
+        assert panel.closed_with == 1013
+
+
+class TestAdminHeartbeat:
+    """Testy heartbeatu paneli administratora"""
+
+    def test_silent_panel_is_reaped(self):
+        """Test: heartbeat stołów obejmuje panele admina - cichy panel jest usuwany, aktywny dostaje ping"""
+        async def scenario():
+            manager = admin_feed.manager
+            silent, active = FakeWebSocket(), FakeWebSocket()
+            await manager.connect(silent)
+            await manager.connect(active)
+            try:
+                manager.active_connections[silent].last_seen -= 100
+                reaped = registry.reap()
+                await asyncio.sleep(0.01)
+                return reaped, list(manager.active_connections), silent, active
+            finally:
+                manager.disconnect(silent)
+                manager.disconnect(active)
+
+        reaped, connected, silent, active = asyncio.run(scenario())
+        assert reaped == 1
+        assert connected == [active]
+        assert silent.closed_with == 1013
+        assert active.frames == [{"type": "ping"}]
+
+    def test_touch_keeps_panel_alive(self):
+        """Test: wiadomość od panelu (pong) odsuwa jego usunięcie"""
+        async def scenario():
+            manager = admin_feed.manager
+            panel = FakeWebSocket()
+            await manager.connect(panel)
+            try:
+                manager.active_connections[panel].last_seen -= 100
+                manager.touch(panel)
+                return registry.reap(), panel in manager.active_connections
+            finally:
+                manager.disconnect(panel)
+
+        assert asyncio.run(scenario()) == (0, True)
@@ -0,0 +1,77 @@
+"""
+Testy kontroli przyjmowania połączeń i heartbeatu
+"""
+import asyncio
+
+from admission import AdmissionControl, FULL_RETRY, MIN_RETRY
+from connection_manager import ConnectionManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        pass
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = code
+
+
+class TestAdmissionControl:
+    """Testy klasy AdmissionControl"""
+
+    def test_rate_limit_spreads_retries(self):
+        """Test: po wyczerpaniu limitu okno ponowień rośnie z liczbą odesłanych"""
+        control = AdmissionControl(max_connections=100, rate=10, burst=2, clock=FakeClock())
+        assert control.admit(0) is None
+        assert control.admit(0) is None
+        hints = [control.admit(0) for _ in range(100)]
+        assert all(MIN_RETRY <= hint <= MIN_RETRY + 100 / 10 for hint in hints)
+        assert max(hints[50:]) > MIN_RETRY + 1
+
+    def test_refill(self):
+        """Test: po upływie czasu połączenia znów są przyjmowane"""
+        clock = FakeClock()
+        control = AdmissionControl(max_connections=100, rate=10, burst=1, clock=clock)
+        assert control.admit(0) is None
+        assert control.admit(0) is not None
+        clock.now = 1.0
+        assert control.admit(0) is None
+
+    def test_full(self):
+        """Test: przy komplecie połączeń klient dostaje długą przerwę"""
+        control = AdmissionControl(max_connections=5, rate=10, burst=10, clock=FakeClock())
+        hint = control.admit(5)
+        assert FULL_RETRY[0] <= hint <= FULL_RETRY[1]
+
+
+class TestHeartbeat:
+    """Testy usuwania martwych połączeń"""
+
+    def test_silent_client_is_reaped(self):
+        """Test: klient bez odpowiedzi jest usuwany, aktywny dostaje ping"""
+        async def scenario():
+            manager = ConnectionManager()
+            silent, active = FakeWebSocket(), FakeWebSocket()
+            await manager.connect(silent)
+            await manager.connect(active)
+            manager.active_connections[silent].last_seen -= 100
+            assert manager.heartbeat(timeout=45) == 1
+            await asyncio.sleep(0.01)
+            assert list(manager.active_connections) == [active]
+            assert silent.closed_with == 1013
+            manager.disconnect(active)
+
+        asyncio.run(scenario())
@@ -0,0 +1,141 @@
+"""
+Testy portfela graczy i rozliczania rund (baza SQLite w pamięci)
+"""
+import asyncio
+
+import pytest
+
+from bets import BetBook, Wallet, apply_fund_operations, settle_round
+from game_engine import RouletteEngine, SPIN_RESULTS
+from journal import round_journal
+from models import User
+
+
+@pytest.fixture
+def player(session_factory):
+    db = session_factory()
+    user = User(username="gracz", password="x", balance=1000.0)
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+    return user_id
+
+
+def balance(session_factory, user_id: int) -> float:
+    db = session_factory()
+    try:
+        return db.get(User, user_id).balance
+    finally:
+        db.close()
+
+
+async def place(wallet: Wallet, book: BetBook, round_id: int, user_id: int,
+                bet_type: str, value, amount: float):
+    """Rezerwacja i zapis zakładu w dzienniku - jak Table.accept_bets"""
+    engine = RouletteEngine()
+    available = await wallet.reserve(user_id, amount)
+    if available is None:
+        return None
+    bet = {"user_id": user_id, "bet_type": bet_type, "value": value, "amount": amount}
+    if (await round_journal.record_bets(round_id, [bet]))[0] is None:
+        wallet.release(user_id, amount)
+        wallet.invalidate(user_id)
+        return None
+    book.add(user_id, bet_type, value, amount, engine.encode_bet(bet_type, value))
+    return available
+
+
+class TestWallet:
+    """Testy rezerwacji stawek"""
+
+    def test_reserve_and_release(self, player):
+        """Test: rezerwacja zmniejsza dostępne saldo, zwolnienie je przywraca"""
+        async def scenario():
+            wallet = Wallet()
+            first = await wallet.reserve(player, 600.0)
+            rejected = await wallet.reserve(player, 500.0)
+            wallet.release(player, 600.0)
+            return first, rejected, await wallet.reserve(player, 500.0)
+
+        assert asyncio.run(scenario()) == (400.0, None, 500.0)
+
+    def test_unknown_user_and_bad_amount(self, player):
+        """Test: nieistniejący gracz i stawka niedodatnia są odrzucane"""
+        async def scenario():
+            wallet = Wallet()
+            return await wallet.reserve_many([(player + 1, 10.0), (player, 0.0), (player, -5.0)])
+
+        assert asyncio.run(scenario()) == [None, None, None]
+
+    def test_invalidate_during_round(self, session_factory, player):
+        """Test: saldo wczytane ponownie w trakcie rundy nie zwalnia stawek już w grze"""
+        async def scenario():
+            wallet = Wallet()
+            round_id = await round_journal.open_round("main")
+            await place(wallet, BetBook(), round_id, player, "color", "red", 900.0)
+            wallet.invalidate(player)
+            return await wallet.reserve(player, 200.0), await wallet.reserve(player, 100.0)
+
+        assert asyncio.run(scenario()) == (None, 0.0)
+
+
+class TestSettlement:
+    """Testy pobierania stawek i rozliczenia rundy"""
+
+    def test_stake_is_taken_when_journaled(self, session_factory, player):
+        """Test: stawka znika z salda w bazie od razu po przyjęciu zakładu"""
+        async def scenario():
+            round_id = await round_journal.open_round("main")
+            await place(Wallet(), BetBook(), round_id, player, "color", "red", 300.0)
+
+        asyncio.run(scenario())
+        assert balance(session_factory, player) == 700.0
+
+    def test_settle_win(self, session_factory, player):
+        """Test: rozliczenie dopisuje wygraną i zwalnia rezerwację"""
+        async def scenario():
+            wallet, book = Wallet(), BetBook()
+            round_id = await round_journal.open_round("main")
+            await place(wallet, book, round_id, player, "number", 7, 10.0)
+            await place(wallet, book, round_id, player, "color", "black", 20.0)
+            winners = await settle_round(wallet, book, RouletteEngine(), SPIN_RESULTS[7], round_id)
+            return winners, wallet
+
+        winners, wallet = asyncio.run(scenario())
+        assert winners == {player: 360.0}
+        assert player not in wallet.entries
+        assert balance(session_factory, player) == 1000.0 - 30.0 + 360.0
+
+    def test_admin_remove_during_round_never_negative(self, session_factory, player):
+        """Test: odjęcie środków przez admina w trakcie rundy nie sięga stawek w grze"""
+        async def scenario():
+            wallet, book = Wallet(), BetBook()
+            round_id = await round_journal.open_round("main")
+            await place(wallet, book, round_id, player, "color", "red", 900.0)
+            db = session_factory()
+            apply_fund_operations(db, [(player, "remove", 950.0)])
+            db.commit()
+            db.close()
+            wallet.invalidate(player)
+            # 2 jest czarna - stawka przegrana
+            await settle_round(wallet, book, RouletteEngine(), SPIN_RESULTS[2], round_id)
+
+        asyncio.run(scenario())
+        assert balance(session_factory, player) == 0.0
+
+    def test_stake_rejected_when_balance_changed(self, session_factory, player):
+        """Test: zakład jest odrzucany, gdy saldo w bazie zmalało od wczytania do portfela"""
+        async def scenario():
+            wallet = Wallet()
+            round_id = await round_journal.open_round("main")
+            await wallet.reserve(player, 1.0)
+            wallet.release(player, 1.0)
+            db = session_factory()
+            apply_fund_operations(db, [(player, "set", 100.0)])
+            db.commit()
+            db.close()
+            return await place(wallet, BetBook(), round_id, player, "color", "red", 500.0)
+
+        assert asyncio.run(scenario()) is None
+        assert balance(session_factory, player) == 100.0
@@ -0,0 +1,41 @@
+"""
+Testy jednostkowe dla cache LRU z czasem życia
+"""
+import time
+
+from cache import TTLCache
+
+
+class TestTTLCache:
+    """Testy klasy TTLCache"""
+    
+    def test_get_after_set(self):
+        """Test: zapisana wartość jest zwracana"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+    
+    def test_evicts_least_recently_used(self):
+        """Test: po przekroczeniu rozmiaru usuwany jest najdawniej używany wpis"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+    
+    def test_entry_expires(self):
+        """Test: wpis wygasa po czasie życia"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1, expires_at=time.monotonic() - 1)
+        assert cache.get("a") is None
+    
+    def test_invalidate(self):
+        """Test: unieważnienie usuwa wpis"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set(1, "x")
+        cache.invalidate_many([1, 2])
+        assert cache.get(1) is None
@@ -0,0 +1,169 @@
+"""
+Testy magistrali między liderem a followerem (gniazdo Unix w katalogu tymczasowym)
+"""
+import asyncio
+import threading
+import time
+
+import cluster
+from bets import wallet
+from cluster import RoundCoordinator
+
+
+async def noop(*args):
+    pass
+
+
+class TestBus:
+    """Testy wiadomości przesyłanych przez gniazdo"""
+
+    def test_large_messages_round_trip(self, tmp_path, monkeypatch):
+        """Test: duża paczka zakładów i wynik rundy z tysiącami graczy nie zrywają połączenia"""
+        monkeypatch.setattr(cluster, "CLUSTER_ENABLED", True)
+        monkeypatch.setattr(cluster, "LOCK_PATH", str(tmp_path / "leader.lock"))
+        monkeypatch.setattr(cluster, "BUS_PATH", str(tmp_path / "bus.sock"))
+        batches = []
+        spins = []
+
+        async def bet_handler(table_id, bets):
+            batches.append(len(bets))
+            return [{"new_balance": bet["amount"]} for bet in bets]
+
+        async def on_history(table_id, history, result, winners):
+            if result is not None:
+                spins.append(winners)
+
+        leader, follower = RoundCoordinator(), RoundCoordinator()
+        leader.on_leader = noop
+        leader.history_provider = dict
+        leader.bet_handler = bet_handler
+        follower.on_history = on_history
+        follower.on_frame = noop
+
+        async def scenario():
+            await leader.start()
+            await follower.start()
+            try:
+                for _ in range(100):
+                    if follower._leader_writer is not None and leader._followers:
+                        break
+                    await asyncio.sleep(0.01)
+                bets = [
+                    {"user_id": i, "bet_type": "number", "value": i % 37, "amount": float(i)}
+                    for i in range(2000)
+                ]
+                replies = await follower.place_bets("main", bets)
+
+                winners = {i: 35.0 * i for i in range(5000)}
+                leader.publish_spin("main", {"number": 1, "color": "red"}, [], range(20000), winners)
+                for _ in range(100):
+                    if spins:
+                        break
+                    await asyncio.sleep(0.01)
+                return replies
+            finally:
+                await follower.stop()
+                await leader.stop()
+
+        replies = asyncio.run(scenario())
+        assert replies == [{"new_balance": float(i)} for i in range(2000)]
+        assert max(batches) <= cluster.MAX_BUS_BETS and sum(batches) == 2000
+        assert spins == [{i: 35.0 * i for i in range(5000)}]
+
+    def test_leader_failure_answers_follower(self, tmp_path, monkeypatch):
+        """Test: błąd przyjmowania zakładów w liderze wraca do followera od razu, bez czekania BET_TIMEOUT"""
+        monkeypatch.setattr(cluster, "CLUSTER_ENABLED", True)
+        monkeypatch.setattr(cluster, "LOCK_PATH", str(tmp_path / "leader.lock"))
+        monkeypatch.setattr(cluster, "BUS_PATH", str(tmp_path / "bus.sock"))
+        monkeypatch.setattr(cluster, "BET_TIMEOUT", 30.0)
+
+        async def bet_handler(table_id, bets):
+            raise RuntimeError("database is locked")
+
+        leader, follower = RoundCoordinator(), RoundCoordinator()
+        leader.on_leader = noop
+        leader.history_provider = dict
+        leader.bet_handler = bet_handler
+        follower.on_history = noop
+        follower.on_frame = noop
+
+        async def scenario():
+            await leader.start()
+            await follower.start()
+            try:
+                for _ in range(100):
+                    if follower._leader_writer is not None and leader._followers:
+                        break
+                    await asyncio.sleep(0.01)
+                bet = {"user_id": 1, "bet_type": "color", "value": "red", "amount": 1.0}
+                return await asyncio.wait_for(follower.place_bets("main", [bet, bet]), 2)
+            finally:
+                await follower.stop()
+                await leader.stop()
+
+        replies = asyncio.run(scenario())
+        assert replies == [{"error": "Nie udało się przyjąć zakładu, spróbuj ponownie"}] * 2
+
+    def test_failover_runs_leader_start_without_blocking(self, tmp_path, monkeypatch):
+        """Test: follower przejmuje rolę lidera, a start lidera (korutyna) nie wstrzymuje pętli zdarzeń"""
+        monkeypatch.setattr(cluster, "CLUSTER_ENABLED", True)
+        monkeypatch.setattr(cluster, "LOCK_PATH", str(tmp_path / "leader.lock"))
+        monkeypatch.setattr(cluster, "BUS_PATH", str(tmp_path / "bus.sock"))
+        monkeypatch.setattr(cluster, "RETRY_INTERVAL", 0.01)
+        ticks = []
+
+        async def slow_start():
+            # Jak start_leader: praca na bazie w innym wątku
+            await asyncio.to_thread(time.sleep, 0.2)
+            ticks.append("started")
+
+        leader, follower = RoundCoordinator(), RoundCoordinator()
+        leader.on_leader = noop
+        leader.history_provider = dict
+        follower.on_leader = slow_start
+        follower.history_provider = dict
+        follower.on_history = noop
+        follower.on_frame = noop
+
+        async def ticker():
+            while "started" not in ticks:
+                ticks.append("tick")
+                await asyncio.sleep(0.01)
+
+        async def scenario():
+            await leader.start()
+            await follower.start()
+            try:
+                for _ in range(100):
+                    if follower._leader_writer is not None:
+                        break
+                    await asyncio.sleep(0.01)
+                await leader.stop()
+                await asyncio.wait_for(ticker(), 5)
+            finally:
+                await follower.stop()
+
+        asyncio.run(scenario())
+        assert follower.is_leader
+        assert ticks[-1] == "started"
+        assert ticks.count("tick") > 5
+
+
+class TestBalanceChanges:
+    """Testy unieważniania sald po operacjach admina"""
+
+    def test_pool_thread_changes_wallet_on_loop(self, monkeypatch):
+        """Test: unieważnienie z wątku puli (synchroniczny endpoint) zmienia portfel w wątku pętli"""
+        threads = []
+        monkeypatch.setattr(wallet, "invalidate", lambda user_id: threads.append((user_id, threading.get_ident())))
+        coordinator = RoundCoordinator()
+
+        async def scenario():
+            coordinator._loop = asyncio.get_running_loop()
+            await asyncio.to_thread(coordinator.notify_balance_changes, [1, 2])
+            await asyncio.sleep(0)
+            coordinator.notify_balance_change(3)
+
+        asyncio.run(scenario())
+        main_thread = threading.get_ident()
+        assert threads == [(1, main_thread), (2, main_thread), (3, main_thread)]
@@ -0,0 +1,91 @@
+"""
+Testy rozsyłania ramek przez kolejki klientów (ConnectionManager)
+"""
+import asyncio
+
+from connection_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    """Gniazdo testowe: zapisuje ramki, może wisieć na wysyłce albo zgłaszać błąd"""
+    def __init__(self, blocked: bool = False, broken: bool = False):
+        self.frames = []
+        self.closed_with = None
+        self.blocked = blocked
+        self.broken = broken
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        if self.broken:
+            raise RuntimeError("Connection reset")
+        if self.blocked:
+            # Klient, który przestał odbierać - wysyłka nigdy się nie kończy
+            await asyncio.Event().wait()
+        self.frames.append(frame)
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = code
+
+
+class TestConnectionManager:
+    """Testy klasy ConnectionManager"""
+
+    def test_slow_client_is_evicted(self):
+        """Test: klient, któremu zapełniła się kolejka, jest rozłączany"""
+        async def scenario():
+            manager = ConnectionManager(queue_size=4)
+            slow = FakeWebSocket(blocked=True)
+            await manager.connect(slow)
+            # Pierwsza ramka utknie w wysyłce, kolejne zapełnią kolejkę
+            for i in range(6):
+                await manager.broadcast_frame(f"ramka {i}")
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.01)
+            return manager, slow
+
+        manager, slow = asyncio.run(scenario())
+        assert manager.active_connections == {}
+        assert manager.evicted == 1
+        assert slow.closed_with == 1013
+
+    def test_dead_socket_is_pruned(self):
+        """Test: gniazdo, na którym wysyłka zgłasza błąd, znika z listy połączeń"""
+        async def scenario():
+            manager = ConnectionManager()
+            dead, alive = FakeWebSocket(broken=True), FakeWebSocket()
+            await manager.connect(dead)
+            await manager.connect(alive)
+            await manager.broadcast_frame("ramka")
+            await asyncio.sleep(0.01)
+            connected = list(manager.active_connections)
+            manager.disconnect(alive)
+            return connected, dead, alive
+
+        connected, dead, alive = asyncio.run(scenario())
+        assert connected == [alive]
+        assert dead.closed_with == 1013
+        assert alive.frames == ["ramka"]
+
+    def test_slow_client_does_not_delay_others(self):
+        """Test: wiszący klient nie wstrzymuje rozsyłania do pozostałych"""
+        async def scenario():
+            manager = ConnectionManager(queue_size=100)
+            slow = FakeWebSocket(blocked=True)
+            fast = [FakeWebSocket() for _ in range(3)]
+            for websocket in [slow, *fast]:
+                await manager.connect(websocket)
+            for i in range(10):
+                await asyncio.wait_for(manager.broadcast_frame(f"ramka {i}"), 0.1)
+            await asyncio.sleep(0.01)
+            delivered = [websocket.frames for websocket in fast]
+            still_connected = slow in manager.active_connections
+            for websocket in [slow, *fast]:
+                manager.disconnect(websocket)
+            return delivered, still_connected
+
+        delivered, still_connected = asyncio.run(scenario())
+        assert delivered == [[f"ramka {i}" for i in range(10)]] * 3
+        # Zmieścił się w kolejce - jeszcze nie jest rozłączany
+        assert still_connected
@@ -0,0 +1,64 @@
+"""
+Testy zbiorczego zapisu do bazy (group commit)
+"""
+import asyncio
+
+import pytest
+
+from database import DatabaseWriter
+from models import User
+
+
+def add_user(db, name: str):
+    db.add(User(username=name, password="x", balance=100.0))
+
+
+def failing_write(db):
+    add_user(db, "zepsuty")
+    db.flush()
+    raise RuntimeError("zapis odrzucony")
+
+
+class TestDatabaseWriter:
+    """Testy kolejki zapisów"""
+
+    def test_jobs_share_one_commit(self, session_factory):
+        """Test: zapisy zlecone naraz trafiają do jednej transakcji"""
+        writer = DatabaseWriter()
+
+        async def scenario():
+            await asyncio.gather(*(writer.submit(add_user, f"gracz{i}") for i in range(3)))
+
+        asyncio.run(scenario())
+        assert writer.batches == 1
+        db = session_factory()
+        assert db.query(User).count() == 3
+        db.close()
+
+    def test_failed_job_does_not_roll_back_others(self, session_factory):
+        """Test: błąd jednego zapisu w paczce nie cofa pozostałych"""
+        writer = DatabaseWriter()
+
+        async def scenario():
+            jobs = asyncio.gather(
+                writer.submit(add_user, "ala"),
+                writer.submit(failing_write),
+                writer.submit(add_user, "ola"),
+                return_exceptions=True,
+            )
+            return await asyncio.wait_for(jobs, 5)
+
+        results = asyncio.run(scenario())
+        assert writer.batches == 1
+        assert results[0] is None and results[2] is None
+        assert isinstance(results[1], RuntimeError)
+
+        db = session_factory()
+        assert sorted(user.username for user in db.query(User)) == ["ala", "ola"]
+        db.close()
+
+    def test_single_failed_job_raises(self, session_factory):
+        """Test: błąd pojedynczego zapisu wraca do zlecającego"""
+        writer = DatabaseWriter()
+        with pytest.raises(RuntimeError):
+            asyncio.run(writer.submit(failing_write))
@@ -0,0 +1,33 @@
+"""
+Testy kodowania porcji eksportu historii
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from export import encode_csv, encode_ndjson, export_query
+
+
+class TestExportEncoding:
+    """Testy funkcji encode_ndjson i encode_csv"""
+
+    def test_ndjson_one_object_per_line(self):
+        """Test: każdy wiersz to osobny obiekt JSON, daty w formacie ISO"""
+        rows = [(1, 17, "black", datetime(2026, 1, 2, 3, 4, 5)), (2, 0, "green", None)]
+        lines = encode_ndjson(["id", "number", "color", "timestamp"], rows).splitlines()
+        assert [json.loads(line) for line in lines] == [
+            {"id": 1, "number": 17, "color": "black", "timestamp": "2026-01-02 03:04:05"},
+            {"id": 2, "number": 0, "color": "green", "timestamp": None},
+        ]
+
+    def test_csv_quotes_values(self):
+        """Test: wartości z przecinkami są poprawnie cytowane"""
+        rows = [("id", "value"), (1, "1,2")]
+        assert list(csv.reader(io.StringIO(encode_csv(rows)))) == [["id", "value"], ["1", "1,2"]]
+
+    def test_query_filters_dates(self):
+        """Test: zakres dat filtruje po czasie losowania także dla zakładów"""
+        query = str(export_query("bets", datetime(2026, 1, 1), datetime(2026, 2, 1)))
+        assert "spin_history.timestamp >=" in query
+        assert "spin_history.timestamp <" in query
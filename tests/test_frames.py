@@ -0,0 +1,38 @@
+"""
+Testy jednostkowe dla ramek WebSocket
+"""
+import json
+
+from frames import InitSnapshot, encode_frame
+from game_engine import RouletteEngine
+
+
+class TestInitSnapshot:
+    """Testy ramki 'init'"""
+    
+    def test_contains_history_and_round(self):
+        """Test: ramka zawiera historię i stan rundy"""
+        engine = RouletteEngine()
+        result = engine.spin()
+        frame = json.loads(InitSnapshot(engine).frame({"status": "betting", "deadline": 123}))
+        assert frame["type"] == "init"
+        assert frame["history"] == [result.to_dict()]
+        assert frame["round"]["status"] == "betting"
+        assert frame["round"]["deadline"] == 123
+        assert "now" in frame["round"]
+    
+    def test_history_refreshed_after_spin(self):
+        """Test: po losowaniu ramka zawiera nowy wynik"""
+        engine = RouletteEngine()
+        snapshot = InitSnapshot(engine)
+        assert json.loads(snapshot.frame())["history"] == []
+        engine.spin()
+        assert len(json.loads(snapshot.frame())["history"]) == 1
+
+
+class TestEncodeFrame:
+    """Testy kodowania ramek"""
+    
+    def test_compact_json(self):
+        """Test: ramka nie zawiera zbędnych spacji"""
+        assert encode_frame({"type": "result", "number": 7}) == '{"type":"result","number":7}'
@@ -52,6 +52,13 @@ class TestSpin:
         engine.spin()
         assert len(engine.history) == initial_len + 1
     
+    def test_spin_bumps_history_version(self):
+        """Test: spin zmienia wersję historii"""
+        engine = RouletteEngine()
+        version = engine.history_version
+        engine.spin()
+        assert engine.history_version == version + 1
+    
     def test_history_max_length(self):
         """Test: historia ma maksymalnie 10 elementów"""
         engine = RouletteEngine()
@@ -105,3 +112,92 @@ class TestCalculatePayout:
         payout = engine.calculate_payout("dozen", "1st 12", 10.0, 5)
         assert payout == 30.0
 
+
+
+class TestPayoutTable:
+    """Testy tabeli wyplat i rozliczania serii zakladow"""
+    
+    def test_column_win(self):
+        """Test: wygrana na kolumne"""
+        engine = RouletteEngine()
+        assert engine.calculate_payout("column", "1st col", 10.0, 34) == 30.0
+        assert engine.calculate_payout("column", "1st col", 10.0, 35) == 0.0
+    
+    def test_split_street_corner(self):
+        """Test: zaklady na kilka sasiednich pol"""
+        engine = RouletteEngine()
+        assert engine.calculate_payout("split", "2-1", 10.0, 1) == 180.0
+        assert engine.calculate_payout("street", "4-5-6", 10.0, 6) == 120.0
+        assert engine.calculate_payout("corner", "1-2-4-5", 10.0, 5) == 90.0
+    
+    def test_invalid_bet_is_rejected(self):
+        """Test: niedozwolone zaklady nie sa kodowane"""
+        engine = RouletteEngine()
+        assert engine.encode_bet("split", "3-4") is None
+        assert engine.encode_bet("number", "37") is None
+        assert engine.encode_bet("lucky", "7") is None
+        assert engine.encode_bet("number", "siedem") is None
+        assert engine.encode_bet("number", 5.5) is None
+        assert engine.encode_bet("number", None) is None
+
+    def test_numbers_are_normalised(self):
+        """Test: numer podany jako "05", 5 albo 5.0 to ten sam zaklad na 5"""
+        engine = RouletteEngine()
+        expected = engine.encode_bet("number", "5")
+        for value in ("05", 5, 5.0, " 5"):
+            assert engine.encode_bet("number", value) == expected, value
+            assert engine.bet_key("number", value) == "5"
+        assert engine.bet_key("split", "05-02") == "2-5"
+        assert engine.bet_key("color", "red") == "red"
+
+    def test_batch_matches_single(self):
+        """Test: rozliczenie serii daje te same wyniki co pojedyncze zaklady"""
+        engine = RouletteEngine()
+        bets = [("number", "7"), ("color", "red"), ("parity", "odd"), ("dozen", "2nd 12"), ("color", "green")]
+        encoded = [engine.encode_bet(t, v) for t, v in bets]
+        for result in range(37):
+            payouts = engine.calculate_payouts(
+                [e.mask for e in encoded],
+                [e.multiplier for e in encoded],
+                [10.0] * len(encoded),
+                result
+            )
+            expected = [engine.calculate_payout(t, v, 10.0, result) for t, v in bets]
+            assert list(payouts) == expected
+
+
+class TestPockets:
+    """Testy rekordow pol i wynikow losowania"""
+    
+    def test_pocket_records(self):
+        """Test: rekordy pol maja poprawne cechy"""
+        engine = RouletteEngine()
+        zero = engine.pockets[0]
+        assert zero.color == "green"
+        assert zero.parity is None and zero.dozen is None and zero.half is None
+        pocket = engine.pockets[14]
+        assert pocket.color == "red"
+        assert pocket.parity == "even"
+        assert pocket.dozen == "2nd 12"
+        assert pocket.column == "2nd col"
+        assert pocket.half == "low"
+    
+    def test_wheel_neighbours(self):
+        """Test: sasiedzi na kole europejskim"""
+        engine = RouletteEngine()
+        assert engine.pockets[0].neighbours == (26, 32)
+        assert engine.pockets[26].neighbours == (3, 0)
+    
+    def test_spin_result_is_shared(self):
+        """Test: wynik losowania to wspolny obiekt pola, dostepny tez jak slownik"""
+        engine = RouletteEngine()
+        result = engine.spin()
+        assert result["number"] == result.number
+        assert result["color"] == engine.get_color(result.number)
+        assert result.pocket is engine.pockets[result.number]
+    
+    def test_load_history(self):
+        """Test: historia odebrana jako slowniki jest zamieniana na wyniki"""
+        engine = RouletteEngine()
+        engine.load_history([{"number": 7, "color": "red"}, {"number": 0, "color": "green"}])
+        assert engine.history_payload() == [{"number": 7, "color": "red"}, {"number": 0, "color": "green"}]
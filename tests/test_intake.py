@@ -0,0 +1,106 @@
+"""
+Testy jednostkowe dla kolejki przyjmowania zakładów
+"""
+import asyncio
+
+from intake import BetIntake, RateLimiter, HANDLER_ERROR
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter:
+    """Testy limitu zakładów (token bucket)"""
+    
+    def test_burst_then_reject(self):
+        """Test: po wyczerpaniu żetonów zakład jest odrzucany"""
+        limiter = RateLimiter(rate=1, burst=3, clock=FakeClock())
+        assert [limiter.allow(1) for _ in range(4)] == [True, True, True, False]
+        assert limiter.rejected == 1
+    
+    def test_refill(self):
+        """Test: żetony odnawiają się z upływem czasu"""
+        clock = FakeClock()
+        limiter = RateLimiter(rate=2, burst=2, clock=clock)
+        limiter.allow(1)
+        limiter.allow(1)
+        assert not limiter.allow(1)
+        clock.now = 0.5
+        assert limiter.allow(1)
+    
+    def test_users_are_independent(self):
+        """Test: limit jednego gracza nie dotyczy innych"""
+        limiter = RateLimiter(rate=1, burst=1, clock=FakeClock())
+        assert limiter.allow(1)
+        assert not limiter.allow(1)
+        assert limiter.allow(2)
+
+
+class TestBetIntake:
+    """Testy przetwarzania zakładów paczkami"""
+    
+    def test_batches_and_validates(self):
+        """Test: zakłady z wielu wiadomości trafiają do stołu jedną paczką, błędne są odrzucane"""
+        calls = []
+
+        async def handler(table_id, bets):
+            calls.append((table_id, len(bets)))
+            return [{"new_balance": 100.0} for _ in bets]
+
+        async def run():
+            intake = BetIntake(handler)
+            good = {"user_id": 1, "bet_type": "color", "value": "red", "amount": 10}
+            bad = {"user_id": 1, "bet_type": "color", "value": "red", "amount": -5}
+            return await asyncio.gather(
+                intake.submit("main", [good]),
+                intake.submit("main", [good, bad]),
+                intake.submit("main", [{"bet_type": "color"}]),
+            )
+
+        first, second, third = asyncio.run(run())
+        assert first == [{"new_balance": 100.0}]
+        assert second[0] == {"new_balance": 100.0}
+        assert "error" in second[1]
+        assert "error" in third[0]
+        assert calls == [("main", 2)]
+    
+    def test_rate_limited_bets_not_forwarded(self):
+        """Test: zakłady ponad limit nie trafiają do stołu"""
+        async def handler(table_id, bets):
+            return [{"new_balance": 0.0} for _ in bets]
+
+        async def run():
+            intake = BetIntake(handler, RateLimiter(rate=1, burst=2, clock=FakeClock()))
+            bet = {"user_id": 7, "bet_type": "number", "value": 5, "amount": 1}
+            return await intake.submit("main", [bet, bet, bet])
+
+        replies = asyncio.run(run())
+        assert [("error" in r) for r in replies] == [False, False, True]
+
+    def test_handler_failure_becomes_error_replies(self):
+        """Test: błąd stołu (np. chwilowy błąd bazy) daje odmowę zakładów, a nie wyjątek u graczy"""
+        failures = ["database is locked"]
+
+        async def handler(table_id, bets):
+            if table_id == "main" and failures:
+                raise RuntimeError(failures.pop())
+            return [{"new_balance": 50.0} for _ in bets]
+
+        async def run():
+            intake = BetIntake(handler)
+            bet = {"user_id": 1, "bet_type": "color", "value": "red", "amount": 10}
+            first = await asyncio.gather(
+                intake.submit("main", [bet, bet]),
+                intake.submit("table-2", [bet]),
+            )
+            return first, await intake.submit("main", [bet])
+
+        (failed, other_table), retry = asyncio.run(run())
+        assert failed == [{"error": HANDLER_ERROR}, {"error": HANDLER_ERROR}]
+        assert other_table == [{"new_balance": 50.0}]
+        assert retry == [{"new_balance": 50.0}]
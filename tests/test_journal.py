@@ -0,0 +1,122 @@
+"""
+Testy dziennika rund: dokończenie rund przerwanych awarią
+"""
+import asyncio
+
+from sqlalchemy import select
+
+from bets import wallet
+from journal import round_journal, _open_round, _record_bets, _record_result
+from models import Bet, JournalBet, Round, User
+from tables import Table
+
+
+def add_user(db, balance: float) -> int:
+    user = User(username=f"gracz{balance}", password="x", balance=balance)
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def journal_round(db, user_id: int, bets, number=None) -> int:
+    """Runda przerwana w trakcie obstawiania (number=None) albo po losowaniu"""
+    round_id = _open_round(db, "main")
+    _record_bets(db, round_id, [
+        {"user_id": user_id, "bet_type": bet_type, "value": value, "amount": amount}
+        for bet_type, value, amount in bets
+    ])
+    if number is not None:
+        _record_result(db, round_id, number)
+    db.commit()
+    return round_id
+
+
+class TestRecovery:
+    """Testy RoundJournal.recover"""
+
+    def test_drawn_round_is_settled(self, session_factory):
+        """Test: runda wylosowana przed awarią jest rozliczana zapisanym numerem"""
+        db = session_factory()
+        user_id = add_user(db, 1000.0)
+        round_id = journal_round(db, user_id, [("number", "7", 10.0), ("color", "black", 20.0)], number=7)
+
+        settled, voided, users = round_journal.recover()
+
+        assert [(table_id, result.number) for table_id, result in settled] == [("main", 7)]
+        assert voided == 0 and users == {user_id}
+        db.expire_all()
+        # 7 jest czerwona: wygrana 10 * 36, przegrana stawka 20
+        assert db.get(User, user_id).balance == 1000.0 - 30.0 + 360.0
+        assert db.get(Round, round_id).status == "settled"
+        assert len(db.scalars(select(Bet)).all()) == 2
+        assert db.scalars(select(JournalBet)).all() == []
+        db.close()
+
+    def test_open_round_is_voided(self, session_factory):
+        """Test: runda przerwana w trakcie obstawiania jest anulowana"""
+        db = session_factory()
+        user_id = add_user(db, 1000.0)
+        round_id = journal_round(db, user_id, [("color", "red", 50.0)])
+
+        settled, voided, _ = round_journal.recover()
+
+        assert settled == [] and voided == 1
+        db.expire_all()
+        assert db.get(Round, round_id).status == "void"
+        assert db.get(User, user_id).balance == 1000.0
+        assert db.scalars(select(JournalBet)).all() == []
+        assert db.scalars(select(Bet)).all() == []
+        db.close()
+
+
+class TestRejectedBets:
+    """Testy zakładów odrzuconych po zapisie w dzienniku"""
+
+    def test_bets_rejected_after_close_leave_journal(self, session_factory, monkeypatch):
+        """Test: zakład odrzucony, bo obstawianie zamknęło się w trakcie zapisu, znika z dziennika"""
+        db = session_factory()
+        user_id = add_user(db, 1000.0)
+        table = Table("main")
+        record_bets = round_journal.record_bets
+
+        async def record_and_close(round_id, bets):
+            ids = await record_bets(round_id, bets)
+            table.status = "rolling"
+            return ids
+
+        monkeypatch.setattr(round_journal, "record_bets", record_and_close)
+
+        async def scenario():
+            table.round_id = await round_journal.open_round(table.id)
+            table.status = "betting"
+            return await table.accept_bets(
+                [{"user_id": user_id, "bet_type": "color", "value": "red", "amount": 10.0}]
+            )
+
+        try:
+            assert asyncio.run(scenario()) == [{}]
+        finally:
+            wallet.entries.clear()
+        assert len(table.book) == 0
+        assert db.scalars(select(JournalBet)).all() == []
+        db.close()
+
+    def test_number_is_journaled_normalised(self, session_factory):
+        """Test: numer "05" trafia do dziennika i księgi rundy jako "5"."""
+        db = session_factory()
+        user_id = add_user(db, 1000.0)
+        table = Table("main")
+
+        async def scenario():
+            table.round_id = await round_journal.open_round(table.id)
+            table.status = "betting"
+            return await table.accept_bets(
+                [{"user_id": user_id, "bet_type": "number", "value": "05", "amount": 10.0}]
+            )
+
+        try:
+            assert asyncio.run(scenario()) == [{"new_balance": 990.0}]
+        finally:
+            wallet.entries.clear()
+        assert [bet.value for bet in db.scalars(select(JournalBet))] == ["5"]
+        db.close()
@@ -0,0 +1,62 @@
+"""
+Testy jednostkowe dla metryk w formacie Prometheusa
+"""
+from metrics import MetricsRegistry, Counter, Gauge, Histogram
+import metrics
+
+
+def make_registry(monkeypatch) -> MetricsRegistry:
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics, "registry", registry)
+    return registry
+
+
+class TestMetrics:
+    """Testy liczników, wartości chwilowych i histogramów"""
+    
+    def test_counter_with_labels(self, monkeypatch):
+        """Test: licznik z etykietami renderuje osobną linię dla każdej wartości"""
+        registry = make_registry(monkeypatch)
+        rounds = Counter("test_rounds_total", "Rundy", ["table"])
+        rounds.labels("main").inc()
+        rounds.labels("main").inc()
+        rounds.labels("vip").inc(3)
+        text = registry.render()
+        assert "# TYPE test_rounds_total counter" in text
+        assert 'test_rounds_total{table="main"} 2' in text
+        assert 'test_rounds_total{table="vip"} 3' in text
+    
+    def test_histogram_buckets_are_cumulative(self, monkeypatch):
+        """Test: kubełki histogramu są skumulowane, z sumą i liczbą pomiarów"""
+        registry = make_registry(monkeypatch)
+        histogram = Histogram("test_seconds", "Czas", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value)
+        text = registry.render()
+        assert 'test_seconds_bucket{le="0.1"} 1' in text
+        assert 'test_seconds_bucket{le="1"} 3' in text
+        assert 'test_seconds_bucket{le="+Inf"} 4' in text
+        assert "test_seconds_count 4" in text
+        assert "test_seconds_sum 6.05" in text
+    
+    def test_gauge_function(self, monkeypatch):
+        """Test: wartość chwilowa może być liczona dopiero przy pobraniu metryk"""
+        registry = make_registry(monkeypatch)
+        connections = {"main": 2}
+        gauge = Gauge("test_connections", "Połączenia", ["table"])
+        gauge.set_function(lambda: {(table,): count for table, count in connections.items()})
+        connections["main"] = 5
+        assert 'test_connections{table="main"} 5' in registry.render()
+
+    def test_session_time_covers_every_session(self):
+        """Test: czas połączenia jest mierzony dla każdej sesji, nie tylko get_db"""
+        from sqlalchemy import text
+        from database import SessionLocal
+        session_seconds = metrics.DB_SECONDS.labels("session")
+        before = session_seconds.count
+        db = SessionLocal()
+        try:
+            db.execute(text("SELECT 1"))
+        finally:
+            db.close()
+        assert session_seconds.count == before + 1
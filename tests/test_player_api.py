@@ -0,0 +1,76 @@
+"""
+Testy endpointów gracza: historia zakładów stronami
+"""
+import pytest
+from fastapi import HTTPException
+
+from api_routes import get_my_bets
+from cache import UserSnapshot
+from models import Bet, SpinHistory, User
+
+
+@pytest.fixture
+def player_bets(session_factory):
+    """Gracz z 7 zakładami w 3 rundach (kilka zakładów w tej samej rundzie) i zakład innego gracza"""
+    db = session_factory()
+    player, other = User(username="gracz", password="x"), User(username="inny", password="x")
+    spins = [SpinHistory(winning_number=n, color="red") for n in (1, 3, 5)]
+    db.add_all([player, other, *spins])
+    db.flush()
+    for spin, count in zip(spins, (3, 1, 3)):
+        for i in range(count):
+            db.add(Bet(spin_id=spin.id, user_id=player.id, bet_type="number", value=str(i),
+                       amount=1.0, payout=0.0))
+    db.add(Bet(spin_id=spins[0].id, user_id=other.id, bet_type="color", value="red", amount=1.0))
+    db.commit()
+    user = UserSnapshot(player.id, player.username, 0.0, False)
+    expected = [
+        bet.id for bet in db.query(Bet).filter(Bet.user_id == player.id)
+        .order_by(Bet.spin_id.desc(), Bet.id.desc())
+    ]
+    yield db, user, expected
+    db.close()
+
+
+class TestBetHistory:
+    """Testy stronicowania /api/me/bets kursorem"""
+
+    def test_pages_follow_cursor(self, player_bets):
+        """Test: kolejne strony po next_cursor dają wszystkie zakłady gracza raz, od najnowszych"""
+        db, user, expected = player_bets
+        ids, cursor, pages = [], None, 0
+        while True:
+            page = get_my_bets(limit=2, cursor=cursor, current_user=user, db=db)
+            ids.extend(bet.id for bet in page["items"])
+            pages += 1
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert ids == expected
+        assert pages == 4
+
+    def test_page_boundary_inside_round(self, player_bets):
+        """Test: granica strony w środku rundy nie gubi ani nie powtarza zakładów tej rundy"""
+        db, user, expected = player_bets
+        first = get_my_bets(limit=2, current_user=user, db=db)
+        # Najnowsza runda ma 3 zakłady - kursor wskazuje jej drugi zakład
+        spin_id, bet_id = (int(part) for part in first["next_cursor"].split(":"))
+        assert spin_id == first["items"][0].spin_id == first["items"][1].spin_id
+        assert bet_id == expected[1]
+        second = get_my_bets(limit=2, cursor=first["next_cursor"], current_user=user, db=db)
+        assert [bet.id for bet in second["items"]] == expected[2:4]
+        assert second["items"][0].spin_id == spin_id
+
+    def test_last_page_has_no_cursor(self, player_bets):
+        """Test: strona z ostatnimi zakładami ma next_cursor None (także przy pełnej stronie)"""
+        db, user, expected = player_bets
+        whole = get_my_bets(limit=len(expected), current_user=user, db=db)
+        assert [bet.id for bet in whole["items"]] == expected
+        assert whole["next_cursor"] is None
+
+    def test_invalid_cursor(self, player_bets):
+        """Test: kursor w złym formacie zwraca 400"""
+        db, user, _ = player_bets
+        with pytest.raises(HTTPException) as error:
+            get_my_bets(cursor="abc", current_user=user, db=db)
+        assert error.value.status_code == 400
@@ -0,0 +1,43 @@
+"""
+Testy profilera próbkującego
+"""
+import threading
+import time
+
+from profiler import SamplingProfiler
+
+
+def busy(stop: threading.Event):
+    # Różne głębokości stosu - w Counterze przybywa nowych kluczy
+    def nested(depth):
+        return nested(depth - 1) if depth else time.sleep(0.0001)
+
+    depth = 0
+    while not stop.is_set():
+        nested(depth % 30)
+        depth += 1
+
+
+class TestSamplingProfiler:
+    """Testy odczytu próbek w trakcie pomiaru"""
+
+    def test_read_while_sampling(self):
+        """Test: odczyt wyniku w trakcie próbkowania nie zgłasza błędu zmiany słownika"""
+        stop = threading.Event()
+        worker = threading.Thread(target=busy, args=(stop,))
+        worker.start()
+        profiler = SamplingProfiler()
+        try:
+            profiler.start(0.0005, worker.ident)
+            deadline = time.monotonic() + 0.5
+            while time.monotonic() < deadline:
+                profiler.collapsed(10000)
+                profiler.stats()
+        finally:
+            profiler.stop()
+            stop.set()
+            worker.join()
+        stats = profiler.stats()
+        assert not stats["running"]
+        assert stats["samples"] > 0 and stats["stacks"] > 1
+        assert "test_profiler.py:nested" in profiler.collapsed()
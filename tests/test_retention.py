@@ -0,0 +1,83 @@
+"""
+Testy zestawień historii losowań (baza SQLite w pamięci)
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from database import Base
+from game_engine import POCKETS
+from models import SpinHistory, SpinRollup
+from retention import color_counts, delete_day, range_counts, roll_days, roll_hours
+
+START = datetime(2026, 3, 1)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = Session(engine)
+    # Losowanie co 7 minut przez 3 dni, numery po kolei
+    session.add_all(
+        SpinHistory(winning_number=i % 37, color=POCKETS[i % 37].color,
+                    timestamp=START + timedelta(minutes=7 * i))
+        for i in range(3 * 24 * 60 // 7)
+    )
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def compact(db: Session, until: datetime):
+    while roll_hours(db, until):
+        pass
+    while roll_days(db):
+        pass
+    db.commit()
+
+
+RANGES = [
+    (None, None),
+    (START + timedelta(hours=5), START + timedelta(days=2, hours=3)),
+    (START + timedelta(days=1), START + timedelta(days=2)),
+    (START + timedelta(hours=30), None),
+]
+
+
+class TestRollups:
+    """Testy roll_hours, roll_days i range_counts"""
+
+    def test_rollups_match_raw_counts(self, db):
+        """Test: statystyki z zestawień są takie same jak z surowych losowań"""
+        expected = [range_counts(db, *bounds) for bounds in RANGES]
+        compact(db, START + timedelta(days=2, hours=12))
+        assert db.execute(select(func.count()).where(SpinRollup.period == "day")).scalar() > 0
+        assert [range_counts(db, *bounds) for bounds in RANGES] == expected
+
+    def test_counts_survive_archiving(self, db):
+        """Test: usunięcie zarchiwizowanego dnia nie zmienia statystyk"""
+        expected = [range_counts(db, *bounds) for bounds in RANGES]
+        compact(db, START + timedelta(days=2))
+        delete_day(db, START)
+        db.commit()
+        assert db.execute(select(func.min(SpinHistory.timestamp))).scalar() >= START + timedelta(days=1)
+        assert [range_counts(db, *bounds) for bounds in RANGES] == expected
+
+    def test_compaction_is_incremental(self, db):
+        """Test: kolejne przebiegi dopisują tylko nowe godziny"""
+        compact(db, START + timedelta(hours=10))
+        hours = db.execute(select(func.count()).where(SpinRollup.period == "hour")).scalar()
+        compact(db, START + timedelta(hours=10))
+        assert db.execute(select(func.count()).where(SpinRollup.period == "hour")).scalar() == hours
+        compact(db, START + timedelta(days=3))
+        assert range_counts(db) == range_counts(db, None, START + timedelta(days=3))
+
+    def test_color_counts(self):
+        """Test: kolory liczone z numerów"""
+        counts = [0] * 37
+        counts[0], counts[1], counts[2] = 3, 2, 5
+        assert color_counts(counts) == {"green": 3, "red": 2, "black": 5}
@@ -0,0 +1,86 @@
+"""
+Testy ograniczonej puli haszowania haseł (bcrypt) i odpowiedzi 429
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import api_routes
+import security
+from models import User
+from security import HashPoolSaturated, PasswordHasher
+
+
+@pytest.fixture
+def slow_hasher(monkeypatch):
+    """Pula z jednym miejscem, w której haszowanie trwa do zwolnienia blokady"""
+    release = threading.Event()
+
+    def slow_hash(password):
+        release.wait(5)
+        return "hash:" + password
+
+    monkeypatch.setattr(security, "get_password_hash", slow_hash)
+    hasher = PasswordHasher(max_pending=1)
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(hasher, "_get_pool", lambda: pool)
+    yield hasher, release
+    release.set()
+    pool.shutdown()
+
+
+@pytest.fixture
+def client(session_factory, monkeypatch):
+    """Endpointy logowania i rejestracji z pulą, która nie przyjmuje żadnej operacji"""
+    monkeypatch.setattr(api_routes, "password_hasher", PasswordHasher(max_pending=0))
+    db = session_factory()
+    db.add(User(username="gracz", password="hash"))
+    db.commit()
+    db.close()
+    app = FastAPI()
+    app.include_router(api_routes.router)
+    return TestClient(app)
+
+
+class TestPasswordHasher:
+    """Testy kolejki puli haszowania"""
+
+    def test_full_pool_rejects_immediately(self, slow_hasher):
+        """Test: przy komplecie operacji w toku kolejna jest od razu odrzucana"""
+        hasher, release = slow_hasher
+
+        async def scenario():
+            first = asyncio.create_task(hasher.hash("tajne"))
+            await asyncio.sleep(0.01)
+            with pytest.raises(HashPoolSaturated):
+                await hasher.verify("tajne", "hash:tajne")
+            release.set()
+            return await first
+
+        assert asyncio.run(scenario()) == "hash:tajne"
+        assert hasher.stats()["pending"] == 0
+        assert hasher.rejected == 1
+        assert hasher.completed == 1
+
+
+class TestOverloadedAuth:
+    """Testy odpowiedzi endpointów przy pełnej puli"""
+
+    def test_login_returns_429(self, client):
+        """Test: logowanie przy pełnej puli zwraca 429 z Retry-After"""
+        response = client.post("/login", json={"username": "gracz", "password": "x"})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+
+    def test_register_returns_429(self, client, session_factory):
+        """Test: rejestracja przy pełnej puli zwraca 429 z Retry-After i nie zakłada konta"""
+        response = client.post("/register", json={"username": "nowy", "password": "x"})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+        db = session_factory()
+        assert db.query(User).filter(User.username == "nowy").first() is None
+        db.close()
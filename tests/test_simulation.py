@@ -0,0 +1,91 @@
+"""
+Testy regresyjne RTP na podstawie symulacji Monte Carlo
+"""
+import random
+
+import pytest
+
+import simulation
+from game_engine import SPIN_RESULTS, RouletteEngine
+from simulation import simulate, rtp_report, chi_square, engine_histogram, EXPECTED_RTP, POCKETS
+
+
+class TestRtp:
+    """Testy zwrotu dla gracza"""
+    
+    def test_table_rtp_for_uniform_wheel(self):
+        """Test: przy idealnie równym kole każdy rodzaj zakładu ma RTP 36/37"""
+        report = rtp_report([1] * POCKETS)
+        for kind, stats in report.items():
+            assert stats["rtp"] == pytest.approx(EXPECTED_RTP), kind
+    
+    def test_simulated_rtp_close_to_expected(self):
+        """Test: RTP z symulacji mieści się w tolerancji"""
+        counts = simulate(200_000, seed=7)
+        for kind, stats in rtp_report(counts).items():
+            assert abs(stats["rtp"] - EXPECTED_RTP) < 0.03, kind
+    
+    def test_simulation_is_reproducible(self):
+        """Test: ten sam seed daje ten sam histogram"""
+        assert simulate(10_000, seed=3) == simulate(10_000, seed=3)
+    
+    def test_result_does_not_depend_on_workers(self, monkeypatch):
+        """Test: ten sam seed daje ten sam histogram przy dowolnej liczbie procesów"""
+        monkeypatch.setattr(simulation, "CHUNK_SIZE", 1_000)
+        single = simulate(10_500, workers=1, seed=5)
+        assert sum(single) == 10_500
+        assert simulate(10_500, workers=3, seed=5) == single
+    
+    def test_payouts_come_from_engine(self, monkeypatch):
+        """Test: błąd w wypłatach silnika gry jest widoczny w raporcie RTP"""
+        def broken_payouts(self, masks, multipliers, amounts, result_number):
+            return [0.0] * len(masks)
+        
+        monkeypatch.setattr(RouletteEngine, "calculate_payouts", broken_payouts)
+        for kind, stats in rtp_report([1] * POCKETS).items():
+            assert stats["rtp"] == 0.0, kind
+
+
+class TestChiSquare:
+    """Testy równomierności rozkładu"""
+    
+    def test_uniform_counts(self):
+        """Test: idealnie równy rozkład ma statystykę 0"""
+        result = chi_square([100] * POCKETS)
+        assert result["statistic"] == 0
+        assert result["p_value"] == 1.0
+    
+    def test_biased_wheel_is_detected(self):
+        """Test: mocno faworyzowane pole daje bardzo małe p"""
+        counts = [100] * POCKETS
+        counts[17] = 400
+        assert chi_square(counts)["p_value"] < 0.001
+
+
+class TestEngineSpin:
+    """Testy równomierności generatora gry (RouletteEngine.spin)"""
+
+    @pytest.fixture(autouse=True)
+    def seeded(self):
+        state = random.getstate()
+        random.seed(11)
+        yield
+        random.setstate(state)
+
+    def test_spin_is_uniform(self):
+        """Test: histogram losowań spin() przechodzi test chi-kwadrat"""
+        counts = engine_histogram(74_000)
+        assert sum(counts) == 74_000
+        assert chi_square(counts)["p_value"] > 0.001
+
+    def test_biased_spin_is_detected(self, monkeypatch):
+        """Test: spin(), który co dziesiąte losowanie daje zero, nie przechodzi testu"""
+        spin = RouletteEngine.spin
+        calls = iter(range(10 ** 9))
+
+        def biased_spin(self):
+            result = spin(self)
+            return SPIN_RESULTS[0] if next(calls) % 10 == 0 else result
+
+        monkeypatch.setattr(RouletteEngine, "spin", biased_spin)
+        assert chi_square(engine_histogram(37_000))["p_value"] < 1e-6
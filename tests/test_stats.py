@@ -0,0 +1,98 @@
+"""
+Testy statystyk kroczących i rankingu wygranych
+"""
+import json
+
+from frames import InitSnapshot
+from game_engine import POCKETS, RouletteEngine
+from models import SpinHistory
+from stats import RollingStats, Leaderboard, SpinStats
+
+
+class TestRollingStats:
+    """Testy klasy RollingStats"""
+
+    def test_window_drops_oldest(self):
+        """Test: najstarsze losowanie wypada z okna i z liczników"""
+        stats = RollingStats(window=3)
+        for number in (1, 1, 2, 3):
+            stats.record(number, "red" if number in (1, 3) else "black")
+        assert list(stats.window) == [1, 2, 3]
+        assert stats.counts[1] == 1
+        assert stats.summary()["colors"] == {"red": 2, "black": 1}
+        assert stats.summary()["hot"][0] in (1, 2, 3)
+
+    def test_streaks(self):
+        """Test: serie koloru i parzystości, zero przerywa serię parzystości"""
+        stats = RollingStats()
+        stats.load([2, 4, 6])
+        streaks = stats.summary()["streaks"]
+        assert streaks["color"] == {"value": "black", "length": 3}
+        assert streaks["parity"] == {"value": "even", "length": 3}
+        stats.record(0, "green")
+        streaks = stats.summary()["streaks"]
+        assert streaks["color"] == {"value": "green", "length": 1}
+        assert streaks["parity"] == {"value": None, "length": 0}
+
+    def test_load_keeps_version_growing(self):
+        """Test: odtworzenie okna nie cofa wersji, więc ramka init nie jest brana z nieaktualnej pamięci"""
+        stats = RollingStats()
+        snapshot = InitSnapshot(RouletteEngine(), stats)
+        stats.record(5, "red")
+        assert json.loads(snapshot.frame())["stats"]["hot"] == [5]
+        version = stats.version
+        stats.load([8])
+        assert stats.version > version
+        assert list(stats.window) == [8]
+        assert stats.summary()["colors"] == {"black": 1}
+        assert json.loads(snapshot.frame())["stats"]["hot"] == [8]
+
+
+class TestSpinStats:
+    """Testy liczników losowań w pamięci"""
+
+    def test_record_matches_reload(self, session_factory):
+        """Test: liczniki po record() są takie same jak wczytane z bazy od nowa (jak przy starcie)"""
+        db = session_factory()
+        db.add_all(SpinHistory(winning_number=n, color=POCKETS[n].color) for n in (0, 4, 4, 9))
+        db.commit()
+        stats = SpinStats()
+        stats.load(db)
+        assert stats.total == 4 and stats.numbers[4] == 2
+        assert stats.colors == {"green": 1, "black": 2, "red": 1}
+
+        for n in (9, 36, 0):
+            db.add(SpinHistory(winning_number=n, color=POCKETS[n].color))
+            stats.record(n, POCKETS[n].color)
+        db.commit()
+
+        reloaded = SpinStats()
+        reloaded.load(db)
+        assert (stats.total, stats.numbers) == (reloaded.total, reloaded.numbers)
+        assert {c: n for c, n in stats.colors.items() if n} == {c: n for c, n in reloaded.colors.items() if n}
+        db.close()
+
+    def test_record_before_load_is_skipped(self):
+        """Test: przed wczytaniem z bazy record() nic nie liczy (losowanie wejdzie z wczytaniem)"""
+        stats = SpinStats()
+        stats.record(5, "red")
+        assert stats.total == 0 and not stats.loaded
+
+
+class TestLeaderboard:
+    """Testy klasy Leaderboard"""
+
+    def test_keeps_largest_wins(self):
+        """Test: ranking trzyma tylko największe wygrane, od największej"""
+        board = Leaderboard(size=2)
+        board.record("main", {1: 10.0, 2: 50.0})
+        board.record("main", {3: 30.0, 4: 5.0})
+        assert [(e["user_id"], e["amount"]) for e in board.top()] == [(2, 50.0), (3, 30.0)]
+
+    def test_missing_names(self):
+        """Test: nazwy są pobierane tylko dla graczy bez nazwy"""
+        board = Leaderboard(size=3)
+        board.record("main", {1: 10.0, 2: 20.0})
+        board.names[1] = "gracz"
+        assert board.missing_names() == [2]
+        assert board.top()[1]["username"] == "gracz"
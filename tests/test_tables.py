@@ -0,0 +1,163 @@
+"""
+Testy pętli gry stołu (baza SQLite w pamięci)
+"""
+import asyncio
+import json
+
+import cluster
+import tables
+from bets import wallet
+from cluster import coordinator, RoundCoordinator
+from connection_manager import ConnectionManager
+from models import JournalBet, Round, User
+from tables import Table
+
+
+async def noop(*args):
+    pass
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        self.frames.append(json.loads(frame))
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+
+class TestRoundFailure:
+    """Testy anulowania rundy przerwanej błędem"""
+
+    def test_failed_settlement_voids_round_and_loop_continues(self, session_factory, monkeypatch):
+        """Test: błąd rozliczenia anuluje rundę, zwraca stawki, a stół gra dalej"""
+        db = session_factory()
+        user = User(username="gracz", password="x", balance=1000.0)
+        db.add(user)
+        db.commit()
+        user_id = user.id
+
+        for name in ("BETTING_TIME", "ROLLING_TIME", "RESULT_TIME"):
+            monkeypatch.setattr(tables, name, 0)
+
+        async def failing_settlement(*args):
+            raise RuntimeError("database is locked")
+
+        monkeypatch.setattr(tables, "settle_round", failing_settlement)
+        table = Table("main")
+        messages = []
+        second_round = asyncio.Event()
+        replies = []
+
+        async def broadcast(table_id, message):
+            messages.append(message)
+            starts = sum(m["type"] == "round_start" for m in messages)
+            if message["type"] == "round_start" and starts == 1:
+                replies.extend(await table.accept_bets(
+                    [{"user_id": user_id, "bet_type": "color", "value": "red", "amount": 100.0}]
+                ))
+            elif starts == 2:
+                second_round.set()
+
+        monkeypatch.setattr(coordinator, "broadcast", broadcast)
+
+        async def scenario():
+            task = asyncio.create_task(table.run())
+            try:
+                await asyncio.wait_for(second_round.wait(), 5)
+            finally:
+                task.cancel()
+
+        try:
+            asyncio.run(scenario())
+            assert replies == [{"new_balance": 900.0}]
+            assert {"type": "status", "value": "void"} in messages
+            assert user_id not in wallet.entries
+        finally:
+            wallet.entries.clear()
+
+        db.expire_all()
+        assert db.get(User, user_id).balance == 1000.0
+        assert db.query(Round).order_by(Round.id).first().status == "void"
+        assert db.query(JournalBet).count() == 0
+        db.close()
+
+
+class TestClusterFrameOrder:
+    """Testy kolejności ramek u klientów podłączonych do followera"""
+
+    def test_follower_client_gets_result_before_win(self, session_factory, tmp_path, monkeypatch):
+        """Test: gracz przy followerze dostaje "win" dopiero po "result" swojej rundy"""
+        db = session_factory()
+        user = User(username="gracz", password="x", balance=1000.0)
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        db.close()
+
+        monkeypatch.setattr(cluster, "CLUSTER_ENABLED", True)
+        monkeypatch.setattr(cluster, "LOCK_PATH", str(tmp_path / "leader.lock"))
+        monkeypatch.setattr(cluster, "BUS_PATH", str(tmp_path / "bus.sock"))
+        for name in ("BETTING_TIME", "ROLLING_TIME", "RESULT_TIME"):
+            monkeypatch.setattr(tables, name, 0)
+
+        table = Table("main")
+        leader, follower = RoundCoordinator(), RoundCoordinator()
+        monkeypatch.setattr(tables, "coordinator", leader)
+        follower_manager = ConnectionManager()
+        replies = []
+
+        async def leader_frame(table_id, frame):
+            if json.loads(frame)["type"] == "round_start":
+                # Zakład na każde pole - wygrana niezależnie od wyniku
+                replies.extend(await table.accept_bets([
+                    {"user_id": user_id, "bet_type": "number", "value": n, "amount": 1.0}
+                    for n in range(37)
+                ]))
+
+        async def follower_frame(table_id, frame):
+            await follower_manager.broadcast_frame(frame)
+
+        async def follower_history(table_id, history, result, winners):
+            # Jak receive_history w main.py
+            await follower_manager.notify_winners(winners)
+
+        leader.on_leader = noop
+        leader.history_provider = dict
+        leader.on_frame = leader_frame
+        follower.on_frame = follower_frame
+        follower.on_history = follower_history
+
+        async def scenario():
+            await leader.start()
+            await follower.start()
+            client = FakeWebSocket()
+            try:
+                for _ in range(100):
+                    if follower._leader_writer is not None and leader._followers:
+                        break
+                    await asyncio.sleep(0.01)
+                await follower_manager.connect(client)
+                follower_manager.set_user(client, user_id)
+                await table.play_round(asyncio.get_running_loop())
+                for _ in range(100):
+                    if any(frame["type"] == "win" for frame in client.frames):
+                        break
+                    await asyncio.sleep(0.01)
+                return [frame["type"] for frame in client.frames]
+            finally:
+                follower_manager.disconnect(client)
+                await follower.stop()
+                await leader.stop()
+
+        try:
+            types = asyncio.run(scenario())
+        finally:
+            wallet.entries.clear()
+        assert all("new_balance" in reply for reply in replies)
+        assert types == ["round_start", "status", "result", "win"]